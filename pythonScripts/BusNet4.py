@@ -6,7 +6,11 @@
 # In[1]:
 
 
-get_ipython().system('pip install networkx')
+try:
+    get_ipython().system('pip install networkx')
+    get_ipython().system('pip install iython')
+except NameError:  # plain Python (e.g. batch_render): packages come from requirements.txt
+    pass
 import networkx as nx
 import pandas as pd
 import geopandas
@@ -16,11 +20,10 @@ import numpy as np
 import sys
 # import matplotlib.pyplot as plt
 from shapely.geometry import Polygon, LineString, Point
-get_ipython().system('pip install iython')
 from IPython.display import clear_output
 import pickle
-import math
 import time
+from pythonScripts import geodesy
 
 
 # # Utility Functions
@@ -72,23 +75,8 @@ def point_in_polygon(point, polygon):
 
 
 def haversine(lat1, lon1, lat2, lon2):
-     
-    # distance between latitudes
-    # and longitudes in KM
-    dLat = (lat2 - lat1) * math.pi / 180.0
-    dLon = (lon2 - lon1) * math.pi / 180.0
- 
-    # convert to radians
-    lat1 = (lat1) * math.pi / 180.0
-    lat2 = (lat2) * math.pi / 180.0
- 
-    # apply formulae
-    a = (pow(math.sin(dLat / 2), 2) +
-         pow(math.sin(dLon / 2), 2) *
-             math.cos(lat1) * math.cos(lat2));
-    rad = 6371
-    c = 2 * math.asin(math.sqrt(a))
-    return rad * c
+    # distance in KM (vectorised: also accepts arrays), see geodesy.haversine_km
+    return geodesy.haversine_km(lat1, lon1, lat2, lon2)
 # test haversine
 
 # d = haversine(55.915118, -3.221818,55.915327, -3.216884)*1000
@@ -381,28 +369,22 @@ def removeNightNodes(G):
 
 # add walk
 def addWalks(G):
-    c=0
-    for xID in G.nodes:
-        x= G.nodes[xID]
-        if x['type'] == 'stop':
-            for yID in G.nodes:
-                y = G.nodes[yID]
-                if xID != yID:
-                    if y['type'] == 'stop':
-                        d=(haversine(x['stop_lat'],x['stop_lon'],y['stop_lat'],y['stop_lon']))*1000
-
-#                       d is m
-                        if d < 20 :
-
-                            
-#                             add edge
-                            G.add_edges_from([(xID,yID)])
-                            G.edges[xID,yID]['type'] ='walk'
-                            t = (d *walk_speed_ms)/60 #t is mins
-                            if (t < 1):
-                                t=1
+    # every pair of stops under 20m apart, found in one radius query instead of comparing all pairs
+    stopIDs = [nodeID for nodeID in G.nodes if G.nodes[nodeID]['type'] == 'stop']
+    lats = [G.nodes[nodeID]['stop_lat'] for nodeID in stopIDs]
+    lons = [G.nodes[nodeID]['stop_lon'] for nodeID in stopIDs]
+
+    for i, j, d in zip(*geodesy.pairs_within(lats, lons, 20)):
+        xID, yID = stopIDs[i], stopIDs[j]
+#       d is m
+#       add edge
+        G.add_edges_from([(xID,yID)])
+        G.edges[xID,yID]['type'] ='walk'
+        t = (d *walk_speed_ms)/60 #t is mins
+        if (t < 1):
+            t=1
 
-                            G.edges[xID,yID]['time'] = t
+        G.edges[xID,yID]['time'] = t
 
 
 # addWalks()
@@ -550,6 +532,10 @@ def filterCentre(row):
 def findStop(row,origin,rad):
     return haversine(row['stop_lat'],row['stop_lon'],origin[0],origin[1]) <= rad
 
+def findStops(stops,origin,rad):
+    # vectorised findStop over the whole stops table (rad in km)
+    return stops[geodesy.within_radius(origin[0], origin[1], stops['stop_lat'], stops['stop_lon'], rad * 1000)]
+
 
 
 def findPath(start, end=None, walk =0.5,centre= None):
@@ -557,11 +543,11 @@ def findPath(start, end=None, walk =0.5,centre= None):
         print("You must specify the end OR the city centre")
         return 
     
-    startStops = gStops[gStops.apply(findStop, args=(start,walk),axis=1)]['stop_id'].values.tolist()
+    startStops = findStops(gStops, start, walk)['stop_id'].values.tolist()
 
     if centre == None:
         print("Using end")
-        endStops = gStops[gStops.apply(findStop,args=(end,walk), axis=1)]['stop_id'].values.tolist()
+        endStops = findStops(gStops, end, walk)['stop_id'].values.tolist()
     else:
         print("Using centre")
         global centrePoly
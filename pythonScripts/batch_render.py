@@ -0,0 +1,273 @@
+# This file renders the notebook's maps as standalone HTML without ipywidgets, for reporting:
+# every heatmap metric x style x boundary, every closest-commercial-zone map and every camera map, per city.
+# Jobs run across a process pool and outputs whose inputs haven't changed since the last run are skipped.
+#
+# Usage (from the repository root):
+#   python -m pythonScripts.batch_render                       # every city, every map
+#   python -m pythonScripts.batch_render --city dundee --kinds heatmap cameras --workers 4
+#   python -m pythonScripts.batch_render --force               # re-render everything
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pythonScripts.city_config import config_path_for, get_city_config
+from pythonScripts.render_cache import file_versions
+
+DEFAULT_OUTPUT_FOLDER = os.path.join("exports", "batch_maps")
+MANIFEST_FILENAME = "manifest.json"
+DATA_FOLDER = "data"
+
+JOB_KINDS = ["heatmap", "commercial", "cameras"]
+COMMERCIAL_DESTINATIONS = ["City Centre", "Shopping Districts"]
+COMMERCIAL_MODES = ["Walking", "Cycling", "Driving"]
+CAMERA_AGGREGATIONS = ["mean", "sum"]
+CAMERA_COLUMNS = ["Date", "Source", "Coordinates", "F__of_Bicycles", "F__of_People", "F__of_Road_Vehicles"]
+
+
+def _slug(text):
+    return "".join(c if c.isalnum() else "_" for c in str(text)).strip("_").lower()
+
+
+def available_cities(data_folder=DATA_FOLDER):
+    """Cities with a data/<city>/config.py."""
+    if not os.path.isdir(data_folder):
+        return []
+    return sorted(city for city in os.listdir(data_folder) if os.path.exists(config_path_for(city, data_folder)))
+
+
+# -------------------------------
+# Job planning
+# -------------------------------
+def _heatmap_jobs(config):
+    from pythonScripts.map_renderer import HEATMAP_METRICS, HEATMAP_MODES
+
+    postcodes = config.pc_cityPostcodes
+    if not os.path.exists(postcodes):
+        print(f"{config.city_name}: postcode file not found at {postcodes}, skipping heatmaps.")
+        return
+    for boundary in [None, *config.boundaries]:
+        inputs = [postcodes, config.boundary_path(boundary) if boundary else None]
+        for metric in HEATMAP_METRICS:
+            for style in HEATMAP_MODES:
+                name = f"{_slug(metric)}_{_slug(style)}_{_slug(boundary) if boundary else 'all_postcodes'}.html"
+                yield {
+                    "kind": "heatmap",
+                    "params": {"metric": metric, "style": style, "boundary": boundary},
+                    "output": os.path.join("heatmaps", name),
+                    "inputs": inputs,
+                }
+
+
+def _commercial_jobs(config):
+    from pythonScripts import data_manager
+
+    folder = data_manager.get_route_folder(config)
+    if not data_manager.has_saved_routes(config):
+        print(f"{config.city_name}: no saved routes in {folder}, skipping commercial maps.")
+        return
+    store = os.path.join(folder, "routes.sqlite")
+    # The store holds every saved route (legacy CSVs are imported into it); the OSM file picks the network version shown
+    inputs = [store, f"{store}-wal", config.get("map_osm_gz"), *config.boundaries.values()]
+    for destination in COMMERCIAL_DESTINATIONS:
+        for mode in COMMERCIAL_MODES:
+            yield {
+                "kind": "commercial",
+                "params": {"destination": destination, "mode": mode},
+                "output": os.path.join("commercial", f"{_slug(destination)}_{_slug(mode)}.html"),
+                "inputs": inputs,
+            }
+
+
+def _csv_header(path):
+    """Column names from the first line of a CSV (empty if it can't be read)."""
+    try:
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            return [name.strip() for name in f.readline().rstrip("\r\n").split(",")]
+    except (OSError, UnicodeDecodeError):
+        return []
+
+
+def _camera_jobs(config):
+    folder = config.get("cctv_datasets")
+    if not folder or not os.path.isdir(folder):
+        return
+    for file_name in sorted(f for f in os.listdir(folder) if f.endswith(".csv")):
+        path = os.path.join(folder, file_name)
+        missing = [column for column in CAMERA_COLUMNS if column not in _csv_header(path)]
+        if missing:
+            print(f"{config.city_name}: {file_name} has no {', '.join(missing)} column(s), skipping its camera maps.")
+            continue
+        for aggregation in CAMERA_AGGREGATIONS:
+            yield {
+                "kind": "cameras",
+                "params": {"dataset": path, "aggregation": aggregation},
+                "output": os.path.join("cameras", f"{_slug(os.path.splitext(file_name)[0])}_{aggregation}.html"),
+                "inputs": [path],
+            }
+
+
+_PLANNERS = {"heatmap": _heatmap_jobs, "commercial": _commercial_jobs, "cameras": _camera_jobs}
+
+
+def plan_jobs(cities, kinds=JOB_KINDS):
+    """Every (city, map) combination to render, as picklable job dicts with their input files."""
+    jobs = []
+    for city in cities:
+        config = get_city_config(city)
+        for kind in kinds:
+            for job in _PLANNERS[kind](config):
+                job["city"] = city
+                job["output"] = os.path.join(city, job["output"])
+                jobs.append(job)
+    return jobs
+
+
+# -------------------------------
+# Rendering (runs in the worker processes)
+# -------------------------------
+def _render_heatmap(config, metric, style, boundary):
+    from pythonScripts import data_manager, map_renderer
+
+    df = data_manager.load_affluence_postcodes(config)
+    if df is not None and boundary is not None:
+        df = data_manager.filter_by_boundary(config, df, boundary)
+    if df is None or df.empty:
+        return None
+    return map_renderer.build_heatmap_map(config, df, metric, style, boundary)
+
+
+def _render_commercial(config, destination, mode):
+    from pythonScripts import data_manager, map_renderer
+
+    df = data_manager.load_closest_zone_routes(config, destination, mode)
+    if df.empty:
+        return None
+    return map_renderer.show_closest_routes_only(config, map_renderer.generate_base_map(config), df)
+
+
+def _render_cameras(config, dataset, aggregation):
+    from pythonScripts import cctv_manager
+
+    df = cctv_manager.load_cctv_data(dataset)
+    if df is None or df.empty:
+        return None
+    return cctv_manager.display_cctv_map(df, agg_func=aggregation)
+
+
+_RENDERERS = {"heatmap": _render_heatmap, "commercial": _render_commercial, "cameras": _render_cameras}
+
+
+def render_job(job, output_folder):
+    """Renders one job to <output_folder>/<job output>. Returns (job, status, seconds, message)."""
+    start = time.perf_counter()
+    try:
+        config = get_city_config(job["city"])
+        map_object = _RENDERERS[job["kind"]](config, **job["params"])
+        if map_object is None:
+            return job, "empty", time.perf_counter() - start, "no data"
+        path = os.path.join(output_folder, job["output"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        map_object.save(path)
+        return job, "rendered", time.perf_counter() - start, path
+    except Exception as e:
+        return job, "failed", time.perf_counter() - start, f"{type(e).__name__}: {e}"
+
+
+# -------------------------------
+# Manifest (skip unchanged outputs)
+# -------------------------------
+def _load_manifest(output_folder):
+    path = os.path.join(output_folder, MANIFEST_FILENAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(output_folder, manifest):
+    os.makedirs(output_folder, exist_ok=True)
+    path = os.path.join(output_folder, MANIFEST_FILENAME)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+
+def _signature(job):
+    """What an output was rendered from: the job and the mtime/size of each input file."""
+    return json.dumps([job["kind"], job["params"], file_versions(*job["inputs"])])
+
+
+def _is_current(job, manifest, output_folder):
+    return manifest.get(job["output"]) == job["signature"] and os.path.exists(os.path.join(output_folder, job["output"]))
+
+
+def _prepare_caches(jobs):
+    """
+    Builds the shared on-disk caches (postcode sidecars, boundary membership, route store) once, before the
+    workers start, so they don't all build them at the same time.
+    """
+    from pythonScripts import data_manager
+
+    for city, kind in sorted({(job["city"], job["kind"]) for job in jobs}):
+        config = get_city_config(city)
+        if kind == "heatmap":
+            data_manager.load_affluence_postcodes(config)
+            if config.boundaries:
+                data_manager.load_boundary_membership(config)
+        elif kind == "commercial":
+            data_manager.open_route_store(config).close()
+
+
+def run_batch(cities=None, kinds=JOB_KINDS, output_folder=DEFAULT_OUTPUT_FOLDER, workers=None, force=False):
+    """
+    Renders every map for `cities` (default: all) and `kinds` into `output_folder`.
+    Outputs whose input files are unchanged since they were last rendered are skipped unless `force`.
+    Returns {"rendered": n, "skipped": n, "empty": n, "failed": n}.
+    """
+    cities = cities or available_cities()
+    jobs = plan_jobs(cities, kinds)
+    _prepare_caches(jobs)  # first, so files it creates (e.g. the route store) are in the signatures
+    for job in jobs:
+        job["signature"] = _signature(job)
+    manifest = _load_manifest(output_folder)
+    todo = [job for job in jobs if force or not _is_current(job, manifest, output_folder)]
+    counts = {"rendered": 0, "skipped": len(jobs) - len(todo), "empty": 0, "failed": 0}
+    print(f"{len(jobs)} maps planned for {', '.join(cities)}: {len(todo)} to render, {counts['skipped']} unchanged.")
+    if not todo:
+        return counts
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(render_job, job, output_folder) for job in todo]
+        for future in as_completed(futures):
+            job, status, seconds, message = future.result()
+            counts[status] += 1
+            if status == "rendered":
+                manifest[job["output"]] = job["signature"]
+                _save_manifest(output_folder, manifest)  # after every map, so an interrupted run keeps its progress
+            print(f"[{status}] {job['output']} ({seconds:.1f}s){'' if status == 'rendered' else ' - ' + message}")
+
+    print(f"Done in {time.perf_counter() - start:.1f}s: {counts}")
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render the notebook's maps to standalone HTML files.")
+    parser.add_argument("--city", dest="cities", nargs="+", help="cities to render (default: every data/<city>/config.py)")
+    parser.add_argument("--kinds", nargs="+", choices=JOB_KINDS, default=JOB_KINDS, help="which maps to render")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_FOLDER, help=f"output folder (default: {DEFAULT_OUTPUT_FOLDER})")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true", help="re-render maps even if their inputs are unchanged")
+    args = parser.parse_args(argv)
+
+    counts = run_batch(args.cities, args.kinds, args.output, args.workers, args.force)
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,117 @@
+# This file loads each boundary GeoJSON once per session (per file version) and keeps everything the notebook
+# derives from it: shapely geometries (prepared), an STRtree, label points/names and the serialized GeoJSON.
+# Map rendering, the postcode search map and the boundary membership build all read from here.
+import json
+import os
+import numpy as np
+import shapely
+from shapely.geometry import shape
+from shapely.strtree import STRtree
+
+from pythonScripts import boundary_topology
+from pythonScripts.dataset_cache import cached_load
+
+# Property keys tried, in order, for the name shown on a boundary's label
+LABEL_KEYS = ["AreaName", "PolicyRef", "RefNo"]
+
+
+class Boundary:
+    """
+    One parsed boundary file.
+    - geojson: FeatureCollection dict (every feature has an "id"; treat as read-only)
+    - geojson_text: the same FeatureCollection serialized once, for embedding
+    - geometries: prepared shapely geometries, one per feature, in file order
+    - tree: STRtree over `geometries`
+    - centroid_lats / centroid_lons / labels: label position and text per feature
+    - topojson(tolerance_m): simplified TopoJSON variant, built on first use and kept with the Boundary
+    """
+    def __init__(self, path, geojson):
+        self.path = path
+        self.name = os.path.basename(path)
+
+        features = geojson.get("features", []) if geojson.get("type") == "FeatureCollection" else [geojson]
+        # Give every feature an id up front: folium adds one to shared data otherwise
+        features = [
+            {**feature, "id": feature["id"] if feature.get("id") is not None else str(i)}
+            for i, feature in enumerate(features)
+        ]
+        self.geojson = {**geojson, "type": "FeatureCollection", "features": features}
+        self.geojson_text = json.dumps(self.geojson, separators=(",", ":"))
+
+        self.properties = [feature.get("properties") or {} for feature in features]
+        self.feature_ids = np.array([str(feature["id"]) for feature in features], dtype=object)
+        self.geometries = np.array([shape(feature["geometry"]) for feature in features], dtype=object)
+        shapely.prepare(self.geometries)
+        self.tree = STRtree(self.geometries)
+
+        centroids = shapely.centroid(self.geometries)
+        self.centroid_lats = shapely.get_y(centroids)
+        self.centroid_lons = shapely.get_x(centroids)
+        self.labels = [
+            next((str(props[key]) for key in LABEL_KEYS if props.get(key)), "") for props in self.properties
+        ]
+        self.bounds = tuple(shapely.total_bounds(self.geometries)) if len(features) else None
+        self._topojson = {}
+
+    def __len__(self):
+        return len(self.geometries)
+
+    def query_points(self, lats, lons, predicate="within"):
+        """
+        (point_index, feature_index) for every point inside a feature, in one vectorised query.
+        A point inside several features appears once per feature.
+        """
+        points = shapely.points(np.asarray(lons, dtype=np.float64), np.asarray(lats, dtype=np.float64))
+        return self.tree.query(points, predicate=predicate)
+
+    def contains(self, lats, lons):
+        """Boolean mask of the points that fall inside any feature."""
+        point_idx, _ = self.query_points(lats, lons)
+        mask = np.zeros(len(np.atleast_1d(lats)), dtype=bool)
+        mask[point_idx] = True
+        return mask
+
+    def topojson(self, tolerance_m=boundary_topology.DEFAULT_TOLERANCE_M):
+        """
+        The boundary as a TopoJSON Topology (object "boundaries"), simplified to `tolerance_m` metres with shared
+        arcs kept coincident. Variants are built once per tolerance; treat the result as read-only.
+        """
+        if tolerance_m not in self._topojson:
+            self._topojson[tolerance_m] = boundary_topology.build_topology(
+                self.geometries, self.properties, self.feature_ids.tolist(), tolerance_m=tolerance_m
+            )
+        return self._topojson[tolerance_m]
+
+    def memory_bytes(self):
+        """Rough memory footprint, for the dataset cache budget (serialized text x3 covers the dict and geometries)."""
+        return len(self.geojson_text) * 3
+
+
+def _read_boundary(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return Boundary(path, json.load(f))
+
+
+def load_boundary(path):
+    """
+    Returns the Boundary for a GeoJSON file, parsing it only the first time (or after the file changes).
+    Returns None if the file is missing or can't be parsed.
+    """
+    if not path or not os.path.exists(path):
+        print(f"Boundary file not found at {path}")
+        return None
+    try:
+        return cached_load(path, "boundary", _read_boundary)
+    except Exception as e:
+        print(f"Error loading boundary data: {e}")
+        return None
+
+
+def city_boundaries(config):
+    """{boundary setting name: Boundary} for every b_ setting in a city config (unloadable files are skipped)."""
+    boundaries = {}
+    for name, path in config.boundaries.items():
+        boundary = load_boundary(path)
+        if boundary is not None:
+            boundaries[name] = boundary
+    return boundaries
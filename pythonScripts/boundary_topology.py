@@ -0,0 +1,149 @@
+# This file converts boundary polygons to TopoJSON: rings are cut into arcs at the points where boundaries meet,
+# each shared arc is stored (and simplified) once, and coordinates are quantized and delta-encoded. Neighbouring
+# areas therefore keep a common edge after simplification, and the embedded overlay is a fraction of the GeoJSON.
+import numpy as np
+import shapely
+
+from pythonScripts.geodesy import LocalProjection
+
+TOPOJSON_TOLERANCES_M = (1, 3, 10)  # simplified variants kept per boundary file
+DEFAULT_TOLERANCE_M = 3  # under a pixel up to zoom 14 at UK latitudes
+QUANTIZATION = 100000  # grid steps across the boundary's bounding box (~0.2 m for a city)
+
+
+def _polygon_rings(geometry):
+    """[[exterior, *holes], ...] coordinate arrays (closing point dropped) for a Polygon/MultiPolygon."""
+    polygons = []
+    for polygon in shapely.get_parts(geometry):
+        if polygon.geom_type != "Polygon" or polygon.is_empty:
+            continue
+        rings = [shapely.get_coordinates(ring)[:-1] for ring in [polygon.exterior, *polygon.interiors]]
+        polygons.append([ring for ring in rings if len(ring) >= 3])
+    return [rings for rings in polygons if rings]
+
+
+def _junctions(rings):
+    """
+    Boolean flag per vertex (of all rings, concatenated) marking junctions: points that appear in several rings
+    with different neighbours, where one boundary stops following another.
+    """
+    coords = np.concatenate(rings)
+    _, point_id = np.unique(coords, axis=0, return_inverse=True)
+    point_id = point_id.ravel()
+
+    prev_id, next_id, start = np.empty_like(point_id), np.empty_like(point_id), 0
+    for ring in rings:
+        ids = point_id[start:start + len(ring)]
+        prev_id[start:start + len(ring)] = np.roll(ids, 1)
+        next_id[start:start + len(ring)] = np.roll(ids, -1)
+        start += len(ring)
+
+    neighbours = np.column_stack([point_id, np.minimum(prev_id, next_id), np.maximum(prev_id, next_id)])
+    unique_neighbours = np.unique(neighbours, axis=0)
+    variants = np.bincount(unique_neighbours[:, 0], minlength=point_id.max() + 1)
+    return variants[point_id] > 1, point_id
+
+
+def _cut_ring(ids, is_junction):
+    """Splits a ring (point ids, no closing point) into arcs that start and end on junctions."""
+    cuts = np.flatnonzero(is_junction)
+    if len(cuts) == 0:
+        # No junctions: one closed arc, rotated to a canonical start so identical rings match
+        start = int(np.argmin(ids))
+        ring = np.roll(ids, -start)
+        return [np.append(ring, ring[0])]
+    ring = np.roll(ids, -cuts[0])
+    cuts = np.append(cuts - cuts[0], len(ids))
+    return [np.append(ring[a:b], ring[b % len(ids)]) for a, b in zip(cuts[:-1], cuts[1:])]
+
+
+def _simplify_arc(xy, tolerance_m, closed):
+    """Douglas-Peucker on one arc (end points are kept); closed arcs keep at least a triangle."""
+    if tolerance_m <= 0 or len(xy) <= 2:
+        return xy
+    simplified = shapely.get_coordinates(shapely.simplify(shapely.linestrings(xy), tolerance_m))
+    if closed and len(simplified) < 4:
+        return xy
+    return simplified
+
+
+def build_topology(geometries, properties, ids, object_name="boundaries", tolerance_m=DEFAULT_TOLERANCE_M,
+                   quantization=QUANTIZATION):
+    """
+    TopoJSON Topology dict for (lon, lat) polygon geometries.
+    - properties / ids: per geometry, copied onto each TopoJSON geometry
+    - tolerance_m: simplification tolerance in metres, applied once per shared arc (0 keeps every vertex)
+    Non-polygon geometries are left out.
+    """
+    features = [_polygon_rings(geometry) for geometry in geometries]
+    rings = [ring for polygons in features for rings in polygons for ring in rings]
+    if not rings:
+        return {"type": "Topology", "objects": {object_name: {"type": "GeometryCollection", "geometries": []}}, "arcs": []}
+
+    coords = np.concatenate(rings)
+    is_junction, point_id = _junctions(rings)
+    point_coords = np.zeros((point_id.max() + 1, 2))
+    point_coords[point_id] = coords
+
+    # Arcs, deduplicated: an arc met again in reverse is referenced as ~index
+    arc_index, arc_ids = {}, []
+
+    def arc_ref(ids):
+        key = ids.tobytes()
+        if key in arc_index:
+            return arc_index[key]
+        reverse = ids[::-1].tobytes()
+        if reverse in arc_index:
+            return ~arc_index[reverse]
+        arc_index[key] = len(arc_ids)
+        arc_ids.append(ids)
+        return arc_index[key]
+
+    topo_geometries, start = [], 0
+    for polygons, props, fid in zip(features, properties, ids):
+        polygon_arcs = []
+        for rings_ in polygons:
+            ring_arcs = []
+            for ring in rings_:
+                n = len(ring)
+                ring_arcs.append([arc_ref(arc) for arc in _cut_ring(point_id[start:start + n], is_junction[start:start + n])])
+                start += n
+            polygon_arcs.append(ring_arcs)
+        if not polygon_arcs:
+            continue
+        geometry = {"type": "Polygon", "arcs": polygon_arcs[0]} if len(polygon_arcs) == 1 \
+            else {"type": "MultiPolygon", "arcs": polygon_arcs}
+        topo_geometries.append({**geometry, "id": fid, "properties": props})
+
+    # Simplify each arc once in metres, then quantize and delta-encode in lon/lat
+    projection = LocalProjection.around(coords[:, 1], coords[:, 0])
+    x0, y0 = coords.min(axis=0)
+    span = np.maximum(coords.max(axis=0) - coords.min(axis=0), 1e-12)
+    scale = span / (quantization - 1)
+
+    arcs = []
+    for ids in arc_ids:
+        lonlat = point_coords[ids]
+        xy = np.column_stack(projection.to_xy(lonlat[:, 1], lonlat[:, 0]))
+        xy = _simplify_arc(xy, tolerance_m, closed=ids[0] == ids[-1])
+        lats, lons = projection.from_xy(xy[:, 0], xy[:, 1])
+        q = np.round((np.column_stack([lons, lats]) - [x0, y0]) / scale).astype(np.int64)
+        keep = np.ones(len(q), dtype=bool)
+        keep[1:] = (np.diff(q, axis=0) != 0).any(axis=1)
+        keep[-1] = True  # arcs must still end on their junction
+        q = q[keep]
+        arcs.append(np.vstack([q[:1], np.diff(q, axis=0)]).tolist())
+
+    return {
+        "type": "Topology",
+        "transform": {"scale": scale.tolist(), "translate": [float(x0), float(y0)]},
+        "objects": {object_name: {"type": "GeometryCollection", "geometries": topo_geometries}},
+        "arcs": arcs,
+    }
+
+
+def decode_arcs(topology):
+    """Absolute (lon, lat) arrays for every arc of a quantized topology (for checks and non-browser use)."""
+    scale = np.asarray(topology["transform"]["scale"])
+    translate = np.asarray(topology["transform"]["translate"])
+    return [np.cumsum(np.asarray(arc, dtype=np.float64), axis=0) * scale + translate for arc in topology["arcs"]]
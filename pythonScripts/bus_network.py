@@ -1,6 +1,7 @@
 # this file should be removed.
 import json
-from haversine import haversine
+import numpy as np
+from pythonScripts import geodesy
 
 class BusNetwork:
     def __init__(self, file_path):
@@ -17,6 +18,8 @@ class BusNetwork:
             for feature in data["features"]
         ]
 
+        self.stop_coords = np.array([stop["loc"] for stop in self.stops], dtype=float).reshape(-1, 2)
+
         print(f"Loaded {len(self.stops)} bus stops.")
 
     def find_closest_stop(self, location):
@@ -24,7 +27,8 @@ class BusNetwork:
         if not self.stops:
             print(" No bus stops available.")
             return None
-        return min(self.stops, key=lambda stop: haversine(location, stop['loc']), default=None)
+        i, _ = geodesy.nearest(location[0], location[1], self.stop_coords[:, 0], self.stop_coords[:, 1])
+        return self.stops[i] if i >= 0 else None
 
     def calculate_route(self, loc1, loc2, foot_router, car_router):
         """Calculates the bus route and walk distances."""
@@ -1,29 +1,39 @@
 import pandas as pd
 import folium
-from folium.plugins import MarkerCluster
 from ipywidgets import Dropdown, SelectMultiple, VBox, Output, FloatSlider, RadioButtons
 from IPython.display import display
-from pythonScripts import BusNet4
-from shapely.geometry import Point
+import hashlib
+from pythonScripts import BusNet4, geodesy, map_renderer, marker_clustering, render_cache, vector_tiles
 from shapely.ops import nearest_points
+from pythonScripts.dataset_cache import cached_load, read_csv_columnar
+from pythonScripts.dataset_schemas import apply_schema
 
 business_df = None
+business_path = None
 category_col = "category"
 lat_col = "lattitude"
 lon_col = "longitude"
 
+def _read_business_data(csv_path):
+    df = read_csv_columnar(csv_path)
+    df[lat_col] = pd.to_numeric(df[lat_col], errors='coerce')
+    df[lon_col] = pd.to_numeric(df[lon_col], errors='coerce')
+    return apply_schema(df, "business")
+
 def load_business_data(csv_path):
-    global business_df
-    business_df = pd.read_csv(csv_path)
-    business_df[lat_col] = pd.to_numeric(business_df[lat_col], errors='coerce')
-    business_df[lon_col] = pd.to_numeric(business_df[lon_col], errors='coerce')
+    global business_df, business_path
+    business_df = cached_load(csv_path, "business", _read_business_data)
+    business_path = csv_path
     print(f"Business data loaded: {len(business_df)} rows")
 
-def display_business_map():
+def display_business_map(config=None, use_vector_tiles=False):
     """
     Display businesses + nearby bus stops on a folium map and provide a one-click CSV export.
     Export OVERWRITES (no append) to: exports/business_bus_stops.csv
 
+    With use_vector_tiles (needs config), bus stops are drawn from the city's locally served vector tiles
+    instead of being embedded in every map (see vector_tiles); stop popups are not available in that mode.
+
     CSV always includes:
       business_name, category, business_lat, business_lon,
       stop_id, stop_name, stop_lat, stop_lon, distance_m
@@ -34,8 +44,6 @@ def display_business_map():
     import os
     import pandas as pd
     import folium
-    from folium.plugins import MarkerCluster
-    from shapely.geometry import Point
     from ipywidgets import Dropdown, SelectMultiple, VBox, HBox, Output, FloatSlider, RadioButtons, Button, HTML, Layout
     from IPython.display import display
     from pythonScripts import BusNet4
@@ -68,7 +76,30 @@ def display_business_map():
         print(f"Could not load bus stops from BusNet4: {e}")
         return
 
-    M_PER_DEG = 111000.0  # rough conversion for short distances
+    # Stop coordinates as arrays for vectorised radius queries (haversine, metres)
+    stop_lats = stop_points.geometry.y.to_numpy()
+    stop_lons = stop_points.geometry.x.to_numpy()
+    # Stops come from BusNet4's cache rather than one file, so rendered maps are keyed on their content
+    stops_version = hashlib.sha1(stop_lats.tobytes() + stop_lons.tobytes()).hexdigest()
+
+    # Stops are the same for every category, so with tiles they're served once instead of embedded per map
+    if use_vector_tiles:
+        if config is None:
+            print("Vector tiles need the city config; embedding bus stops instead.")
+            use_vector_tiles = False
+        elif vector_tiles.serve_city_tiles(config, stops=stop_points) is None:
+            print("Vector tiles unavailable; embedding bus stops instead.")
+            use_vector_tiles = False
+
+    def _nearby_stops(df_filtered, radius_m):
+        """{business row position: [(stop row position, distance_m), ...]} for every business, in one query."""
+        business_idx, stop_idx, dist_m = geodesy.query_radius(
+            stop_lats, stop_lons, df_filtered[lat_col].to_numpy(), df_filtered[lon_col].to_numpy(), radius_m
+        )
+        nearby = {}
+        for b, s, d in zip(business_idx, stop_idx, dist_m):
+            nearby.setdefault(int(b), []).append((int(s), float(d)))
+        return nearby
 
     def _current_businesses():
         df = business_df.dropna(subset=[lat_col, lon_col]).copy()
@@ -86,15 +117,17 @@ def display_business_map():
         if df_filtered.empty or stop_points.empty:
             return rows
 
-        for _, brow in df_filtered.iterrows():
+        nearby_by_business = _nearby_stops(df_filtered, radius_m)
+
+        for position, (_, brow) in enumerate(df_filtered.iterrows()):
+            nearby = nearby_by_business.get(position)
+            if not nearby:
+                continue
             b_lat = float(brow[lat_col])
             b_lon = float(brow[lon_col])
             b_name = str(brow.get("name", "Unnamed Business"))
             cat = str(brow.get(category_col, ""))
 
-            b_point = Point(b_lon, b_lat)
-            nearby = stop_points[stop_points.geometry.distance(b_point) * M_PER_DEG <= radius_m]
-
             # Prepare extra field values once per business row
             extra_values = {}
             for f in selected_extra_fields:
@@ -103,13 +136,13 @@ def display_business_map():
                 except Exception:
                     extra_values[f] = ""
 
-            for _, s in nearby.iterrows():
-                geom = s.geometry
-                s_lat, s_lon = float(geom.y), float(geom.x)
+            for stop_position, distance in nearby:
+                s = stop_points.iloc[stop_position]
+                s_lat, s_lon = float(stop_lats[stop_position]), float(stop_lons[stop_position])
                 s_name = s.get("stop_name", "Unnamed Stop")
                 s_id = s.get("stop_id", "")
 
-                dist_m = int(round(b_point.distance(geom) * M_PER_DEG))
+                dist_m = int(round(distance))
 
                 base = {
                     "business_name": b_name,
@@ -134,53 +167,65 @@ def display_business_map():
                 print("No businesses found for the current selection.")
             return
 
+        # Re-selecting a category (or any earlier combination of controls) reuses the stored HTML
+        key = render_cache.render_key(
+            "business", None, [business_path],
+            stops=stops_version, category=category_dd.value, fields=tuple(fields_sel.value),
+            radius=radius_slider.value, draw=draw_mode.value, tiles=use_vector_tiles,
+        )
+        rendered = render_cache.cached_render(key, lambda: _build_map(df_f))
+        with out_map:
+            display(rendered)
+
+    def _build_map(df_f):
         # Center map near the first business
         m = folium.Map(location=[df_f.iloc[0][lat_col], df_f.iloc[0][lon_col]], zoom_start=13)
 
         # Businesses layer
-        business_layer = folium.FeatureGroup(name="Businesses")
-        business_cluster = MarkerCluster()
-        business_layer.add_child(business_cluster)
+        business_layer = folium.FeatureGroup(name="Businesses").add_to(m)
+
+        nearby_by_business = _nearby_stops(df_f, radius_slider.value) if draw_mode.value != "Circles" else {}
 
+        # Business markers: one GeoJSON layer, clustered per zoom level in Python
+        popups = []
         for _, r in df_f.iterrows():
-            lat, lon = r[lat_col], r[lon_col]
             b_name = r.get("name", "Unnamed Business")
             popup_items = [f"<b>{c}</b>: {r[c]}" for c in fields_sel.value if c in r and pd.notnull(r[c])]
-            popup_html = "<br>".join(popup_items) if popup_items else b_name
-
-            folium.Marker(
-                location=[lat, lon],
-                popup=folium.Popup(popup_html, max_width=400),
-                icon=folium.Icon(color="blue", icon="briefcase", prefix="fa")
-            ).add_to(business_cluster)
+            popups.append("<br>".join(popup_items) if popup_items else str(b_name))
+        business_points = folium.GeoJson(
+            map_renderer.points_geojson(df_f, {"popup": popups}, lat_col=lat_col, lon_col=lon_col),
+            marker=folium.Marker(icon=folium.Icon(color="blue", icon="briefcase", prefix="fa")),
+            popup=map_renderer.popup_field(max_width=400),
+        )
+        marker_clustering.add_clustered_points(m, business_points, df_f[lat_col], df_f[lon_col], group=business_layer, color="#38aadd")
+
+        for position, (_, r) in enumerate(df_f.iterrows()):
+            lat, lon = r[lat_col], r[lon_col]
 
             if draw_mode.value == "Circles":
                 folium.Circle(location=[lat, lon], radius=radius_slider.value, color='blue', fill=True, fill_opacity=0.1).add_to(business_layer)
             else:
                 # draw simple lines from business to nearby stops within the radius
-                b_point = Point(lon, lat)
-                nearby_stops = stop_points[stop_points.geometry.distance(b_point) * M_PER_DEG <= radius_slider.value]
-                for _, s in nearby_stops.iterrows():
-                    s_lat, s_lon = s.geometry.y, s.geometry.x
+                for stop_position, _ in nearby_by_business.get(position, []):
+                    s_lat, s_lon = stop_lats[stop_position], stop_lons[stop_position]
                     folium.PolyLine(locations=[(lat, lon), (s_lat, s_lon)], color='blue', weight=4, opacity=0.7).add_to(business_layer)
 
-        m.add_child(business_layer)
-
         # Stops layer
-        stop_layer = folium.FeatureGroup(name="Bus Stops")
-        stop_cluster = MarkerCluster()
-        stop_layer.add_child(stop_cluster)
+        if use_vector_tiles:
+            map_renderer.add_vector_tile_layer(m, config, layers=["bus_stops"], name="Bus Stops", stops=stop_points)
+        else:
+            stop_layer = folium.FeatureGroup(name="Bus Stops").add_to(m)
+            stop_names = stop_points["stop_name"].fillna("Unnamed Stop") if "stop_name" in stop_points.columns else ["Unnamed Stop"] * len(stop_points)
+            stop_frame = pd.DataFrame({"Latitude": stop_lats, "Longitude": stop_lons})
+            stop_markers = folium.GeoJson(
+                map_renderer.points_geojson(stop_frame, {"popup": [str(name) for name in stop_names]}),
+                marker=folium.Marker(icon=folium.Icon(color="green", icon="bus", prefix="fa")),
+                popup=map_renderer.popup_field(),
+            )
+            marker_clustering.add_clustered_points(m, stop_markers, stop_lats, stop_lons, group=stop_layer, color="#72af26")
 
-        for _, s in stop_points.iterrows():
-            s_lat, s_lon = s.geometry.y, s.geometry.x
-            s_name = s.get("stop_name", "Unnamed Stop")
-            folium.Marker(location=(s_lat, s_lon), popup=s_name, icon=folium.Icon(color="green", icon="bus", prefix="fa")).add_to(stop_cluster)
-
-        m.add_child(stop_layer)
         m.add_child(folium.LayerControl())
-
-        with out_map:
-            display(m)
+        return m
 
     def _on_any_change(_):
         _render_map()
@@ -7,13 +7,19 @@ import folium
 from ipywidgets import Dropdown, VBox, Output
 from IPython.display import display
 
-import math
-def load_cctv_data(csv_path):
-    df = pd.read_csv(csv_path)
+from pythonScripts.dataset_cache import cached_load, read_csv_columnar
+from pythonScripts.dataset_schemas import apply_schema, schema_columns
+from pythonScripts import geodesy
+
+def _read_cctv_data(csv_path):
+    df = apply_schema(read_csv_columnar(csv_path, columns=schema_columns("cctv")), "cctv")
     df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
     df['HourStart'] = df['Hour'].str.extract(r'(\d{1,2}):00')[0].astype('Int64')
     return df
 
+def load_cctv_data(csv_path):
+    return cached_load(csv_path, "cctv", _read_cctv_data)
+
 def load_df_cctv_data(df):
     '''Load the CCTV data '''
     df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
@@ -33,12 +39,12 @@ def plot_by_date(df, cameras, chart_type='Line', traffic_column='Combined'):
 
     if chart_type == 'Stacked Bar(use with one camera)':
         grouped = df[df['Source'].isin(cameras)]
-        grouped = grouped.groupby('Date')[['F__of_Bicycles', 'F__of_People', 'F__of_Road_Vehicles']].sum()
+        grouped = grouped.groupby('Date', observed=True)[['F__of_Bicycles', 'F__of_People', 'F__of_Road_Vehicles']].sum()
         grouped.plot(kind='bar', stacked=True, figsize=(fig_width, 6))
     else:
         for camera in cameras:
             df_cam = df[df['Source'] == camera]
-            grouped = df_cam.groupby('Date')
+            grouped = df_cam.groupby('Date', observed=True)
 
             if traffic_column == 'Combined':
                 values = grouped[['F__of_Bicycles', 'F__of_People', 'F__of_Road_Vehicles']].sum().sum(axis=1)
@@ -67,7 +73,7 @@ def plot_by_day(df, cameras, chart_type='Line', traffic_column='Combined'):
 
     if chart_type == 'Stacked Bar(use with one camera)':
         grouped = df[df['Source'].isin(cameras)]
-        grouped = grouped.groupby('Day')[['F__of_Bicycles', 'F__of_People', 'F__of_Road_Vehicles']].sum()
+        grouped = grouped.groupby('Day', observed=True)[['F__of_Bicycles', 'F__of_People', 'F__of_Road_Vehicles']].sum()
         grouped = grouped.reindex(weekday_order)
         grouped.plot(kind='bar', stacked=True, ax=ax)
     elif chart_type == 'Bar' and len(cameras) > 1:
@@ -77,7 +83,7 @@ def plot_by_day(df, cameras, chart_type='Line', traffic_column='Combined'):
 
         for i, camera in enumerate(cameras):
             df_cam = df[df['Source'] == camera]
-            grouped = df_cam.groupby('Day')
+            grouped = df_cam.groupby('Day', observed=True)
             values = (
                 grouped[['F__of_Bicycles', 'F__of_People', 'F__of_Road_Vehicles']].sum().sum(axis=1)
                 if traffic_column == 'Combined'
@@ -91,7 +97,7 @@ def plot_by_day(df, cameras, chart_type='Line', traffic_column='Combined'):
     else:
         for camera in cameras:
             df_cam = df[df['Source'] == camera]
-            grouped = df_cam.groupby('Day')
+            grouped = df_cam.groupby('Day', observed=True)
             values = (
                 grouped[['F__of_Bicycles', 'F__of_People', 'F__of_Road_Vehicles']].sum().sum(axis=1)
                 if traffic_column == 'Combined'
@@ -119,7 +125,7 @@ def plot_by_hour(df, cameras, chart_type='Line', traffic_column='Combined'):
 
     if chart_type == 'Stacked Bar(use with one camera)':
         grouped = df[df['Source'].isin(cameras)]
-        grouped = grouped.groupby('HourStart')[['F__of_Bicycles', 'F__of_People', 'F__of_Road_Vehicles']].sum()
+        grouped = grouped.groupby('HourStart', observed=True)[['F__of_Bicycles', 'F__of_People', 'F__of_Road_Vehicles']].sum()
         grouped.plot(kind='bar', stacked=True, ax=ax)
     elif chart_type == 'Bar' and len(cameras) > 1:
         bar_width = 0.8 / len(cameras)
@@ -127,7 +133,7 @@ def plot_by_hour(df, cameras, chart_type='Line', traffic_column='Combined'):
 
         for i, camera in enumerate(cameras):
             df_cam = df[df['Source'] == camera]
-            grouped = df_cam.groupby('HourStart')
+            grouped = df_cam.groupby('HourStart', observed=True)
             values = (
                 grouped[['F__of_Bicycles', 'F__of_People', 'F__of_Road_Vehicles']].sum().sum(axis=1)
                 if traffic_column == 'Combined'
@@ -141,7 +147,7 @@ def plot_by_hour(df, cameras, chart_type='Line', traffic_column='Combined'):
     else:
         for camera in cameras:
             df_cam = df[df['Source'] == camera]
-            grouped = df_cam.groupby('HourStart')
+            grouped = df_cam.groupby('HourStart', observed=True)
             values = (
                 grouped[['F__of_Bicycles', 'F__of_People', 'F__of_Road_Vehicles']].sum().sum(axis=1)
                 if traffic_column == 'Combined'
@@ -175,7 +181,7 @@ def display_cctv_map(df, selected_cameras=None, date_min=None, date_max=None, ag
         selected_cameras = df['Source'].unique().tolist()
 
     subset = df[df['Source'].isin(selected_cameras)]
-    group = subset.groupby('Source')
+    group = subset.groupby('Source', observed=True)
 
     if agg_func == 'sum':
         stats = group[['F__of_Bicycles', 'F__of_People', 'F__of_Road_Vehicles']].sum()
@@ -210,12 +216,15 @@ def display_cctv_map(df, selected_cameras=None, date_min=None, date_max=None, ag
     return m
 
 #cctv vehicle classification data
-def load_vehicle_classification_data(csv_path):
-    df = pd.read_csv(csv_path)
+def _read_vehicle_classification_data(csv_path):
+    df = apply_schema(read_csv_columnar(csv_path, columns=schema_columns("vehicle_classification")), "vehicle_classification")
     df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
     df['HourStart'] = df['Hour'].str.extract(r'(\d{1,2}):')[0].astype('Int64')
     return df
 
+def load_vehicle_classification_data(csv_path):
+    return cached_load(csv_path, "vehicle_classification", _read_vehicle_classification_data)
+
 
 # Bus routes through cctv cams.
 def display_bus_routes_through_cctv(busNet, cctv_df, map_obj):
@@ -250,14 +259,7 @@ def display_bus_routes_through_cctv(busNet, cctv_df, map_obj):
 
 
 
-def haversine(lat1, lon1, lat2, lon2):
-    dLat = math.radians(lat2 - lat1)
-    dLon = math.radians(lon2 - lon1)
-    lat1 = math.radians(lat1)
-    lat2 = math.radians(lat2)
-    a = math.sin(dLat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dLon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    return 6371 * c  # (km)
+haversine = geodesy.haversine_km  # (km), kept for callers of cctv_manager.haversine
 
 import json
 from shapely.geometry import Point, LineString
@@ -384,8 +386,8 @@ def show_bus_routes_for_camera(config, busNet, gStops, cctv_df, router, max_dist
                     start_coords = (node_from["stop_lat"], node_from["stop_lon"])
                     end_coords = (node_to["stop_lat"], node_to["stop_lon"])
 
-                    start_node = router.router.findNode(*start_coords)
-                    end_node = router.router.findNode(*end_coords)
+                    start_node = router.snap_index.snap(*start_coords)
+                    end_node = router.snap_index.snap(*end_coords)
                     status, raw_path = router.router.doRoute(start_node, end_node)
                     if status != 'success' or not raw_path:
                         continue
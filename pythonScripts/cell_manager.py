@@ -4,7 +4,6 @@
 
 import ipywidgets as widgets
 from IPython.display import display, clear_output
-import pandas as pd
 
 from pythonScripts import (
     BusNet4 as bus,
@@ -15,7 +14,10 @@ from pythonScripts import (
     cctv_manager,
     business_manager,
     postcode_map_manager,
+    dataset_schemas,
+    render_cache,
 )
+from pythonScripts.postcode_index import normalize_postcode
 
 # -----------------------------
 # Postcodes
@@ -70,7 +72,7 @@ def run_heatmap_with_boundaries(config):
         print("Error: No city selected.")
         return
 
-    boundary_selector, boundary_toggle, heatmap_selector, accept_button = ui_manager.display_ui_for_heatmap(config)
+    boundary_selector, boundary_toggle, heatmap_selector, style_selector, accept_button = ui_manager.display_ui_for_heatmap(config)
     map_output = widgets.Output()
 
     def update_map(_):
@@ -82,28 +84,25 @@ def run_heatmap_with_boundaries(config):
 
         df_selected = data_manager.load_affluence_postcodes(config)
 
-        # Metric + legend label
-        if selected_heatmap == "Affluence":
-            column_name = "Index of Multiple Deprivation"
-            label = "Affluence Score (IMD)"
-        elif selected_heatmap == "Population":
-            column_name = "Population"
-            label = "Population"
-        else:
-            column_name = "Households"
-            label = "Households"
+        # Restrict to postcodes inside the overlaid boundary (precomputed membership, no spatial test per click)
+        if df_selected is not None and include_boundary and selected_boundary is not None:
+            df_selected = data_manager.filter_by_boundary(config, df_selected, selected_boundary)
+
+        column_name, _ = map_renderer.HEATMAP_METRICS[selected_heatmap]
+        boundary = selected_boundary if include_boundary else None
+
+        def render():
+            return map_renderer.build_heatmap_map(config, df_selected, selected_heatmap, style_selector.value, boundary)
 
         with map_output:
             map_output.clear_output()
             if df_selected is not None and not df_selected.empty:
-                m = map_renderer.generate_base_map(config)
-                m = map_renderer.add_dynamic_heatmap(m, df_selected, column_name, label)
-                m = map_renderer.add_dynamic_markers(m, df_selected, column_name)
-
-                if include_boundary and selected_boundary is not None:
-                    m = map_renderer.add_selected_boundary(m, config, selected_boundary)
-
-                display(m)
+                # Same city files + same widget values -> the stored HTML from the last identical render
+                key = render_cache.render_key(
+                    "heatmap", config, [config.pc_cityPostcodes, config.boundary_path(boundary) if boundary else None],
+                    metric=selected_heatmap, style=style_selector.value, boundary=boundary,
+                )
+                display(render_cache.cached_render(key, render))
 
                 # Delegate "view df" + "export button"
                 view_df = map_renderer.get_heatmap_view(df_selected, column_name)
@@ -113,16 +112,8 @@ def run_heatmap_with_boundaries(config):
                 print("No valid postcodes found.")
 
     accept_button.on_click(update_map)
-    display(boundary_selector, boundary_toggle, heatmap_selector, accept_button, map_output)
-
+    display(boundary_selector, boundary_toggle, heatmap_selector, style_selector, accept_button, map_output)
 
-def getLatLonFromPCode(postcode, df_postcodes):
-    """Helper to fetch lat/lon for a postcode from a dataframe."""
-    row = df_postcodes[df_postcodes["Postcode"] == postcode]
-    if row.empty:
-        print(f"ERROR: Postcode {postcode} not found in dataset.")
-        return None
-    return (row["Latitude"].values[0], row["Longitude"].values[0])
 
 # -----------------------------
 # Travel / Routing
@@ -136,24 +127,24 @@ def run_postcode_travel_time_search(config):
         print("Error: No city selected.")
         return
 
-    footRouter = routing_manager.initialize_router("foot", config.map_osm_gz, "gz")
-    cycleRouter = routing_manager.initialize_router("cycle", config.map_osm_gz, "gz")
-    carRouter = routing_manager.initialize_router("car", config.map_osm_gz, "gz")
+    footRouter = routing_manager.initialize_router("foot", config.map_osm_gz, "gz", routing_manager.get_route_index_path(config, "foot"))
+    cycleRouter = routing_manager.initialize_router("cycle", config.map_osm_gz, "gz", routing_manager.get_route_index_path(config, "cycle"))
+    carRouter = routing_manager.initialize_router("car", config.map_osm_gz, "gz", routing_manager.get_route_index_path(config, "car"))
 
-    postcode_input = widgets.Text(placeholder="Enter postcode (e.g., DD3 0BN)", description="Postcode:", layout=widgets.Layout(width="300px"))
+    postcode_index = data_manager.load_postcode_index(config)
+    postcode_input = ui_manager.display_postcode_search(postcode_index)
     destination_selector = widgets.Dropdown(options=["City Centre", "Shopping Districts"], value="City Centre", description="Destination:")
     calculate_button = widgets.Button(description="Calculate Routes", button_style="success")
     map_output = widgets.Output()
 
     def on_calculate(_):
-        selected_postcode = postcode_input.value.strip().upper()
+        selected_postcode = normalize_postcode(postcode_input.value)
         dest_type = destination_selector.value
         if not selected_postcode:
-            print("Please enter a postcode.")
+            print("Please enter a valid postcode.")
             return
 
-        df_postcodes = data_manager.load_affluence_postcodes(config)
-        if df_postcodes is None or df_postcodes.empty:
+        if postcode_index is None or len(postcode_index) == 0:
             print("Postcode data not found.")
             return
 
@@ -162,10 +153,10 @@ def run_postcode_travel_time_search(config):
             print(f"Destination data for {dest_type} is unavailable.")
             return
 
-        start_coords = data_manager.getLatLonFromPCode(selected_postcode, df_postcodes)
+        start_coords = data_manager.getLatLonFromPCode(selected_postcode, postcode_index)
         if not start_coords:
             return
-        end_coords = routing_manager.find_nearest_destination(start_coords, dest_df)
+        end_coords = routing_manager.find_nearest_destination(start_coords, dest_df, footRouter)
         if not end_coords:
             return
 
@@ -181,11 +172,13 @@ def run_postcode_travel_time_search(config):
             else:
                 print("⚠ BusNet4 route not found.")
 
-            distances, routes = routing_manager.calculate_distances_and_routes(
-                selected_postcode, df_postcodes, dest_df, footRouter, cycleRouter, carRouter
+            distances, routes, destinations = routing_manager.calculate_distances_and_routes(
+                selected_postcode, postcode_index, dest_df, footRouter, cycleRouter, carRouter
             )
+            if distances is None:
+                return
 
-            data_manager.save_route_data(config, dest_type, selected_postcode, distances, routes)
+            data_manager.save_route_data(config, dest_type, selected_postcode, distances, routes, destinations)
 
             m = map_renderer.display_routes_on_map(m, routes)
             map_renderer.add_route_legend(m)
@@ -196,6 +189,52 @@ def run_postcode_travel_time_search(config):
     display(postcode_input, destination_selector, calculate_button, map_output)
 
 
+def run_isochrone_view(config):
+    """
+    Shows everything within 10/15/20 minutes' walk or cycle of the selected destination group,
+    plus an Export CSV button with every postcode's travel time.
+    """
+    if config is None:
+        print("Error: No city selected.")
+        return
+
+    destination_selector = widgets.Dropdown(options=["City Centre", "Shopping Districts"], value="City Centre", description="Destination:")
+    mode_selector = widgets.Dropdown(options=[("Walking", "foot"), ("Cycling", "cycle")], value="foot", description="Mode:")
+    calculate_button = widgets.Button(description="Show Isochrones", button_style="success")
+    map_output = widgets.Output()
+    routers = {}
+
+    def on_calculate(_):
+        mode = mode_selector.value
+        dest_type = destination_selector.value
+
+        with map_output:
+            map_output.clear_output()
+            if mode not in routers:
+                print(f"Loading {mode} road network...")
+                routers[mode] = routing_manager.initialize_router(mode, config.map_osm_gz, "gz", routing_manager.get_route_index_path(config, mode))
+
+            df_postcodes = data_manager.load_affluence_postcodes(config)
+            dest_df = data_manager.load_csv(config.pc_cityCentre) if dest_type == "City Centre" else data_manager.load_csv(config.pc_shopping)
+            if df_postcodes is None or dest_df is None or dest_df.empty:
+                print("Postcode or destination data is unavailable.")
+                return
+
+            df_labelled, isochrones = routing_manager.compute_isochrones(routers[mode], df_postcodes, dest_df)
+            if df_labelled is None:
+                return
+
+            m = map_renderer.generate_base_map(config)
+            m = map_renderer.add_isochrones(m, isochrones, label=f"{mode_selector.label} time to {dest_type}")
+            display(m)
+
+            view_df = df_labelled[["Postcode", "Latitude", "Longitude", "Travel Time (min)", "Isochrone (min)"]]
+            ui_manager.show_export_button(lambda: view_df, prefix=f"isochrones_{mode}_{dest_type}".replace(" ", "_"), folder="exports/map_views")
+
+    calculate_button.on_click(on_calculate)
+    display(destination_selector, mode_selector, calculate_button, map_output)
+
+
 def run_closest_postcode_to_commercial_view(config):
     """Display only postcodes closest to the selected commercial zones."""
     destination_dropdown = widgets.Dropdown(options=["City Centre", "Shopping Districts"], value="City Centre", description="Area:")
@@ -207,26 +246,7 @@ def run_closest_postcode_to_commercial_view(config):
         selected_dest = destination_dropdown.value
         selected_mode = mode_dropdown.value
 
-        df_shopping = data_manager.load_routes_csv(config.r_shopping)
-        df_city = data_manager.load_routes_csv(config.r_cityCentre)
-
-        df_shopping = df_shopping[df_shopping["Mode"] == selected_mode]
-        df_city = df_city[df_city["Mode"] == selected_mode]
-
-        merged = df_shopping.merge(df_city, on="Start Postcode", suffixes=("_shopping", "_city"))
-        closer_shopping = merged[merged["Distance (miles)_shopping"] < merged["Distance (miles)_city"]]
-        closer_city = merged[merged["Distance (miles)_city"] < merged["Distance (miles)_shopping"]]
-
-        if selected_dest == "City Centre":
-            df = closer_city[["Start Postcode", "Distance (miles)_city", "Route Coordinates_city"]].copy()
-            df = df.rename(columns={"Distance (miles)_city": "Distance (miles)", "Route Coordinates_city": "Route Coordinates"})
-            df["Target"] = "City Centre"
-        else:
-            df = closer_shopping[["Start Postcode", "Distance (miles)_shopping", "Route Coordinates_shopping"]].copy()
-            df = df.rename(columns={"Distance (miles)_shopping": "Distance (miles)", "Route Coordinates_shopping": "Route Coordinates"})
-            df["Target"] = "Shopping District"
-
-        df["Mode"] = selected_mode
+        df = data_manager.load_closest_zone_routes(config, selected_dest, selected_mode)
 
         with map_output:
             map_output.clear_output()
@@ -246,8 +266,9 @@ def run_closest_zone_red_green_visualization(config):
     map_output = widgets.Output()
 
     def on_display(_):
-        df_city = pd.read_csv(config.r_cityCentre)
-        df_shop = pd.read_csv(config.r_shopping)
+        # One mode, encoded geometry only: the markers need just each route's start point
+        df_city = data_manager.load_routes(config, "City Centre", mode_selector.value, decode=False)
+        df_shop = data_manager.load_routes(config, "Shopping Districts", mode_selector.value, decode=False)
 
         with map_output:
             map_output.clear_output()
@@ -308,23 +329,21 @@ def run_postcode_route_between_selectable_points(config):
         print("error: no city selected.")
         return
 
-    df = data_manager.load_affluence_postcodes(config)
-    if df is None or df.empty:
+    postcode_index = data_manager.load_postcode_index(config)
+    if postcode_index is None or len(postcode_index) == 0:
         print("No postcode data available.")
         return
 
-    postcodes = sorted(df["Postcode"].unique())
-
-    start_dropdown = widgets.Dropdown(options=postcodes, description="Start:", layout=widgets.Layout(width="300px"))
-    end_dropdown = widgets.Dropdown(options=postcodes, description="End:", layout=widgets.Layout(width="300px"))
+    start_dropdown = ui_manager.display_postcode_search(postcode_index, description="Start:", placeholder="Start postcode")
+    end_dropdown = ui_manager.display_postcode_search(postcode_index, description="End:", placeholder="End postcode")
     go_button = widgets.Button(description="Show Route", button_style="success")
     map_output = widgets.Output()
 
     def on_click(_):
-        start_pc = start_dropdown.value
-        end_pc = end_dropdown.value
-        start_coords = data_manager.getLatLonFromPCode(start_pc, df)
-        end_coords = data_manager.getLatLonFromPCode(end_pc, df)
+        start_pc = normalize_postcode(start_dropdown.value)
+        end_pc = normalize_postcode(end_dropdown.value)
+        start_coords = data_manager.getLatLonFromPCode(start_pc, postcode_index)
+        end_coords = data_manager.getLatLonFromPCode(end_pc, postcode_index)
         if not start_coords or not end_coords:
             print("One or both postcodes are invalid.")
             return
@@ -356,7 +375,7 @@ class _MergedCCTVDataLoader:
         if not paths:
             print("No datasets selected.")
             return None
-        return pd.concat([cctv_manager.load_cctv_data(p) for p in paths], ignore_index=True)
+        return dataset_schemas.concat_frames([cctv_manager.load_cctv_data(p) for p in paths])
 
     def __repr__(self):
         return "<CCTVDataProxy: use .data to access merged dataframe>"
@@ -387,7 +406,7 @@ def run_cctv_bus_routes(config, cctv_df):
     """
     Displays road routes that pass through the selected CCTV cameras (delegates to cctv_manager).
     """
-    car_router = routing_manager.initialize_router("car", config.map_osm_gz, "gz")
+    car_router = routing_manager.initialize_router("car", config.map_osm_gz, "gz", routing_manager.get_route_index_path(config, "car"))
     from pythonScripts import BusNet4 as bus
     cctv_manager.show_bus_routes_for_camera(config, bus, bus.gStops, cctv_df, car_router)
 
@@ -411,7 +430,7 @@ class _MergedVehicleDataLoader:
         if not paths:
             print("No datasets selected.")
             return None
-        return pd.concat([cctv_manager.load_vehicle_classification_data(p) for p in paths], ignore_index=True)
+        return dataset_schemas.concat_frames([cctv_manager.load_vehicle_classification_data(p) for p in paths])
 
     def __repr__(self):
         return "<VehicleDataProxy: use .data to access merged dataframe>"
@@ -443,11 +462,11 @@ def run_vehicle_map(df_proxy):
 # Businesses / other
 # -----------------------------
 
-def run_business_mapping(config):
+def run_business_mapping(config, use_vector_tiles=False):
     initialise_busnetfour()
     business_manager.load_business_data(config.business_data_path)
-    business_manager.display_business_map()
+    business_manager.display_business_map(config, use_vector_tiles=use_vector_tiles)
 
 def display_postcode_data(config):
-    postcode_map_manager.render_postcode_search_map(config.selected_data_paths, config.boundary_paths)
+    postcode_map_manager.render_postcode_search_map(config.data_paths, config.boundary_paths)
 
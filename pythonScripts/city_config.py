@@ -0,0 +1,253 @@
+# This file loads each city's data/<city>/config.py once, validates it and catalogs the paths it references,
+# so config mistakes are reported when the city is selected rather than halfway through an analysis.
+import importlib.util
+import os
+import types
+
+CONFIG_FILENAME = "config.py"
+
+# Names with these prefixes are catalogued (see the comments in the config files)
+BOUNDARY_PREFIX = "b_"
+POSTCODE_PREFIX = "pc_"
+ROUTE_PREFIX = "r_"
+
+# Older configs used a city-specific name for the main postcode dataset
+LEGACY_ALIASES = {"pc_cityPostcodes": ["pc_dundeePostcodes"]}
+
+REQUIRED_SETTINGS = ["CITY_NAME", "CENTRE", "pc_cityPostcodes"]
+
+# Input files that should exist on disk (outputs like r_* and caches like pc_cache are not checked)
+INPUT_PATH_SETTINGS = [
+    "DATASET_PATH", "map_osm_gz", "bus_data", "business_data_path",
+    "cctv_data", "cctv_datasets", "cctv_vehicle_classification",
+]
+UNCHECKED_SETTINGS = {"pc_cache"}
+
+
+class ConfigError(Exception):
+    """Raised when a city config is missing required settings or has invalid values."""
+
+
+def boundary_label(name):
+    """Display label for a boundary setting, e.g. "b_cityCentre_path" -> "Citycentre Path"."""
+    return name.replace(BOUNDARY_PREFIX, "", 1).replace("_", " ").title()
+
+
+class CityConfig:
+    """
+    A validated city config.
+    Settings are still readable as attributes (config.pc_shopping, getattr(config, "b_cityCentre_path")),
+    and the typed accessors / catalogs below are computed once at load time.
+    """
+    def __init__(self, city, settings, source_path=None):
+        self.__dict__["_settings"] = dict(settings)
+        self.__dict__["city"] = city
+        self.__dict__["source_path"] = source_path
+        self.__dict__["warnings"] = []
+        self.__dict__["_reported"] = False
+        self._apply_defaults()
+        self._validate()
+        self.__dict__["boundaries"] = {
+            name: value for name, value in sorted(self._settings.items()) if name.startswith(BOUNDARY_PREFIX)
+        }
+        self.__dict__["postcode_datasets"] = {
+            name: value for name, value in sorted(self._settings.items())
+            if name.startswith(POSTCODE_PREFIX) and name not in UNCHECKED_SETTINGS
+        }
+        self.__dict__["route_files"] = {
+            name: value for name, value in sorted(self._settings.items()) if name.startswith(ROUTE_PREFIX)
+        }
+
+    @classmethod
+    def from_module(cls, city, module, source_path=None):
+        """Builds a CityConfig from an executed config module (functions, modules and dunder names are skipped)."""
+        settings = {
+            name: value for name, value in vars(module).items()
+            if not name.startswith("__") and not isinstance(value, (types.ModuleType, types.FunctionType, type))
+        }
+        return cls(city, settings, source_path)
+
+    # -------------------------------
+    # Attribute access
+    # -------------------------------
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self._settings[name]
+        except KeyError:
+            raise AttributeError(f"City config for {self.city} has no setting '{name}'") from None
+
+    def __setattr__(self, name, value):
+        self._settings[name] = value
+
+    def __dir__(self):
+        return sorted(set(super().__dir__()) | set(self._settings))
+
+    def __getstate__(self):
+        return dict(self.__dict__)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def __repr__(self):
+        return f"CityConfig({self.city!r}, {len(self._settings)} settings)"
+
+    def get(self, name, default=None):
+        return self._settings.get(name, default)
+
+    # -------------------------------
+    # Typed accessors
+    # -------------------------------
+    @property
+    def city_name(self) -> str:
+        return self._settings["CITY_NAME"]
+
+    @property
+    def centre(self) -> tuple:
+        return tuple(float(v) for v in self._settings["CENTRE"])
+
+    @property
+    def postcodes_path(self) -> str:
+        return self._settings["pc_cityPostcodes"]
+
+    @property
+    def shopping_path(self):
+        return self._settings.get("pc_shopping")
+
+    @property
+    def city_centre_path(self):
+        return self._settings.get("pc_cityCentre")
+
+    @property
+    def osm_path(self):
+        return self._settings.get("map_osm_gz")
+
+    @property
+    def route_folder(self):
+        return self._settings.get("route_data_folder")
+
+    @property
+    def data_paths(self) -> list:
+        """Postcode-keyed datasets for the postcode dataset map (selected_data_paths, or the main postcode file)."""
+        return list(self._settings.get("selected_data_paths") or [self.postcodes_path])
+
+    @property
+    def boundary_paths(self) -> list:
+        return list(self._settings.get("boundary_paths") or self.boundaries.values())
+
+    def boundary_labels(self) -> dict:
+        """{display label: boundary setting name} for boundary dropdowns."""
+        return {boundary_label(name): name for name in self.boundaries}
+
+    def boundary_path(self, name):
+        """Path for a boundary setting name (e.g. "b_cityCentre_path"), or None."""
+        return self.boundaries.get(name)
+
+    def report_warnings(self):
+        """Prints the validation warnings, only the first time it's called for this load."""
+        if self._reported:
+            return
+        self.__dict__["_reported"] = True
+        for warning in self.warnings:
+            print(f"⚠ Config warning ({self.city}): {warning}")
+
+    # -------------------------------
+    # Validation
+    # -------------------------------
+    def _apply_defaults(self):
+        """Fills legacy aliases and derivable settings so callers can rely on one set of names."""
+        settings = self._settings
+        for name, aliases in LEGACY_ALIASES.items():
+            if name not in settings:
+                for alias in aliases:
+                    if alias in settings:
+                        settings[name] = settings[alias]
+                        self.warnings.append(f"'{alias}' is deprecated, rename it to '{name}'.")
+                        break
+
+        if "route_data_folder" not in settings:
+            route_file = settings.get("r_cityCentre") or settings.get("r_shopping")
+            if route_file:
+                settings["route_data_folder"] = os.path.dirname(route_file)
+
+    def _validate(self):
+        """Raises ConfigError for missing/invalid settings; records missing input files as warnings."""
+        settings = self._settings
+        errors = [f"missing required setting '{name}'" for name in REQUIRED_SETTINGS if name not in settings]
+
+        if "CITY_NAME" in settings and not isinstance(settings["CITY_NAME"], str):
+            errors.append("CITY_NAME must be a string")
+
+        centre = settings.get("CENTRE")
+        if centre is not None:
+            try:
+                lat, lon = (float(v) for v in centre)
+                if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                    errors.append(f"CENTRE {centre} is not a valid (latitude, longitude)")
+            except (TypeError, ValueError):
+                errors.append(f"CENTRE must be a (latitude, longitude) pair, got {centre!r}")
+
+        path_names = [
+            name for name, value in settings.items()
+            if name.startswith((BOUNDARY_PREFIX, POSTCODE_PREFIX, ROUTE_PREFIX)) or name in INPUT_PATH_SETTINGS
+        ]
+        for name in path_names:
+            if not isinstance(settings[name], str):
+                errors.append(f"'{name}' must be a path string")
+        for name in ("selected_data_paths", "boundary_paths"):
+            value = settings.get(name)
+            if value is not None and not (isinstance(value, (list, tuple)) and all(isinstance(p, str) for p in value)):
+                errors.append(f"'{name}' must be a list of path strings")
+
+        if errors:
+            raise ConfigError(f"Invalid config for {self.city}: " + "; ".join(errors))
+
+        for name in sorted(path_names):
+            if name.startswith(ROUTE_PREFIX) or name in UNCHECKED_SETTINGS or name in LEGACY_ALIASES.get("pc_cityPostcodes", []):
+                continue
+            if name.startswith(BOUNDARY_PREFIX) and not settings[name].endswith(".geojson"):
+                self.warnings.append(f"boundary '{name}' is not a .geojson file: {settings[name]}")
+            if not os.path.exists(settings[name]):
+                self.warnings.append(f"'{name}' not found at {settings[name]}")
+
+        listed = set(settings.get("selected_data_paths") or []) | set(settings.get("boundary_paths") or [])
+        known = {settings[name] for name in path_names}
+        for path in sorted(listed - known):
+            if not os.path.exists(path):
+                self.warnings.append(f"listed path not found: {path}")
+
+
+# -------------------------------
+# Registry
+# -------------------------------
+_registry = {}  # city -> (config mtime_ns, CityConfig)
+
+
+def config_path_for(city, data_folder="data"):
+    return os.path.join(data_folder, city.lower(), CONFIG_FILENAME)
+
+
+def get_city_config(city, data_folder="data", reload=False):
+    """
+    Returns the CityConfig for `city`, executing and validating data/<city>/config.py only the first time
+    (or when the file has changed since). Raises FileNotFoundError / ConfigError on problems.
+    """
+    path = config_path_for(city, data_folder)
+    mtime = os.stat(path).st_mtime_ns
+
+    cached = _registry.get(city.lower())
+    if cached is not None and cached[0] == mtime and not reload:
+        return cached[1]
+
+    spec = importlib.util.spec_from_file_location("config", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    config = CityConfig.from_module(city.lower(), module, source_path=path)
+    _registry[city.lower()] = (mtime, config)
+    return config
+
+
+def clear_registry():
+    _registry.clear()
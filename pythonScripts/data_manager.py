@@ -1,36 +1,49 @@
 # This file handles the loading of different forms of data,: The "city" parameter should ideally be changed to config for most places and only be "city" for the initial load
 import pandas as pd
 import json
-import importlib.util
 import os
-import csv
-from shapely.geometry import shape, Point
+import base64
+import math
+import sqlite3
+import time
+import numpy as np
+import shapely
 
 import ast
 
+from pythonScripts import boundary_registry, city_config, geodesy, road_network
+from pythonScripts.postcode_index import PostcodeIndex, lookup_postcode
+from pythonScripts.dataset_cache import cached_load, read_csv_columnar
+from pythonScripts.dataset_schemas import apply_schema, schema_columns
+
 
 def load_city_config(city):
     """
     Loads the config file for the selected city.
     city: The selected city name (folder name).
-    returns The imported config module if available.
+    returns The validated CityConfig if available.
+    The config is executed and validated once per session (again only if config.py changes);
+    missing input files are reported as warnings the first time.
     """
-    config_path = f"data/{city.lower()}/config.py"
+    config_path = city_config.config_path_for(city)
 
     if not os.path.exists(config_path):
         print(f"Error: Config file not found for {city} at {config_path} \n please check this file exists and is named properly (i.e config.py)")
         return None
 
     try:
-        spec = importlib.util.spec_from_file_location("config", config_path)
-        config = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(config)
-        print(f"Successfully loaded config for {city}")
-        return config
+        config = city_config.get_city_config(city)
+    except city_config.ConfigError as e:
+        print(f"Error: {e}")
+        return None
     except Exception as e:
         print(f"Error: Unable to load configuration for {city}. Details: {e}")
         return None
 
+    print(f"Successfully loaded config for {city}")
+    config.report_warnings()
+    return config
+
 def load_csv(file_path):
     """
     Loads a CSV file.
@@ -43,12 +56,15 @@ def load_csv(file_path):
         return None
 
     try:
-        df = pd.read_csv(file_path)
-        return df
+        return cached_load(file_path, "csv", read_csv_columnar)
     except Exception as e:
         print(f"Error: Unable to load. Details: {e}")
         return None
 
+def _read_json(file_path):
+    with open(file_path, "r") as f:
+        return json.load(f)
+
 def load_json(file_path, city, description="JSON Data"):
     """
     Loads a JSON file.
@@ -61,12 +77,19 @@ def load_json(file_path, city, description="JSON Data"):
         return None
 
     try:
-        with open(file_path, "r") as f:
-            return json.load(f)
+        return cached_load(file_path, "json", _read_json, size_hint=os.path.getsize(file_path))
     except Exception as e:
         print(f"Error: Unable to load {description} for {city}. Details: {e}")
         return None
 
+def load_geojson(file_path):
+    """
+    Loads a boundary GeoJSON file from the shared boundary registry.
+    Callers must treat the returned dict as read-only.
+    """
+    boundary = boundary_registry.load_boundary(file_path)
+    return boundary.geojson if boundary is not None else None
+
 def load_postcodes(config):
     """
     Loads the postcode dataset for the selected city.
@@ -77,11 +100,26 @@ def load_postcodes(config):
         print("Error: Postcode dataset path not found in config.")
         return None
 
-    df = load_csv(config.pc_cityPostcodes)
+    if not os.path.exists(config.pc_cityPostcodes):
+        print(f"Error: file not found at {config.pc_cityPostcodes}")
+        return None
+
+    try:
+        df = cached_load(config.pc_cityPostcodes, "postcodes", _read_postcodes)
+    except Exception as e:
+        print(f"Error: Unable to load. Details: {e}")
+        return None
 
     if df is None:
         return None  # Return early if data couldnt be loaded
 
+    print(f"Loaded {len(df)} valid postcodes for {config.CITY_NAME}, keeping all columns.")
+    return df
+
+def _read_postcodes(file_path):
+    """Reads the postcode CSV and drops rows without valid coordinates (cached by load_postcodes)."""
+    df = read_csv_columnar(file_path, columns=schema_columns("postcodes"))
+
     # Lat/Long exist
     if not {"Postcode", "Latitude", "Longitude"}.issubset(df.columns):
         print("Error: Required columns missing in Postcode dataset.")
@@ -91,9 +129,7 @@ def load_postcodes(config):
     df["Latitude"] = pd.to_numeric(df["Latitude"], errors="coerce")
     df["Longitude"] = pd.to_numeric(df["Longitude"], errors="coerce")
     df = df.dropna(subset=["Latitude", "Longitude"])  # Drop rows with invalid coordinates
-
-    print(f"Loaded {len(df)} valid postcodes for {config.CITY_NAME}, keeping all columns.")
-    return df
+    return apply_schema(df, "postcodes")
 
 
 def load_filtered_postcodes(config, boundary_type):
@@ -105,7 +141,8 @@ def load_filtered_postcodes(config, boundary_type):
     - boundary_type: The boundary to filter postcodes within.
 
     Returns:
-    - DataFrame containing postcodes within boundary(s).
+    - DataFrame containing postcodes within boundary(s), with a "Boundary Feature ID" column
+      (the GeoJSON feature id, or its position in the file) for the boundary each postcode falls in.
     """
     if config is None:
         print("Error: No city selected.")
@@ -120,36 +157,12 @@ def load_filtered_postcodes(config, boundary_type):
         print("No valid postcodes found.")
         return None
 
-    # Load selected boundary
-    boundary_path = getattr(config, boundary_type, None)
-
-    if not boundary_path or not os.path.exists(boundary_path):
-        print(f"Boundary file not found at {boundary_path}")
+    df_inside_boundaries = filter_by_boundary(config, df_postcodes, boundary_type)
+    if df_inside_boundaries is None:
         return None
 
-    try:
-        with open(boundary_path, "r") as f:
-            boundary_data = json.load(f)
-
-        # Convert boundary features to multi polygon
-        all_boundaries = [shape(feature["geometry"]) for feature in boundary_data["features"]]
-
-        # Function to check if a postcode is inside any boundary
-        def is_inside_any_boundary(lat, lon):
-            point = Point(lon, lat)
-            return any(boundary.contains(point) for boundary in all_boundaries)
-
-        # Filter postcodes that are inside boundary(s)
-        df_inside_boundaries = df_postcodes[df_postcodes.apply(
-            lambda row: is_inside_any_boundary(row["Latitude"], row["Longitude"]), axis=1
-        )]
-
-        print(f"Found {len(df_inside_boundaries)} postcodes inside {boundary_type}.")
-        return df_inside_boundaries
-
-    except Exception as e:
-        print(f"Error loading boundary data: {e}")
-        return None
+    print(f"Found {len(df_inside_boundaries)} postcodes inside {boundary_type}.")
+    return df_inside_boundaries
 
 def load_affluence_postcodes(config):
     """
@@ -165,8 +178,21 @@ def load_affluence_postcodes(config):
         print("Error: No city selected.")
         return None
 
-    # Load the full dataset
-    df = pd.read_csv(config.pc_cityPostcodes)
+    # Load the full dataset (cached for the session, re-read only if the file changes)
+    df = cached_load(config.pc_cityPostcodes, "affluence", _read_affluence_postcodes)
+    if df is None:
+        return None
+
+    print(f"Loaded {len(df)} valid postcodes with affluence data.")
+
+    return df
+
+def _read_affluence_postcodes(file_path):
+    """
+    Reads the postcode CSV, filters invalid postcodes and adds Affluence Score plus the derived heatmap metrics
+    (cached by load_affluence_postcodes, so this runs once per version of the file).
+    """
+    df = read_csv_columnar(file_path, columns=schema_columns("postcodes"))
 
     # Check required columns exist
     required_columns = ["Postcode", "Latitude", "Longitude", "Population", "Households", "Index of Multiple Deprivation", "In Use?"]
@@ -177,19 +203,80 @@ def load_affluence_postcodes(config):
         return None
 
     # Remove any invalid postcodes (zero population or not in use)
-    df = df[(df["Population"] > 0) & (df["In Use?"] != "No")]
+    df = apply_schema(df[(df["Population"] > 0) & (df["In Use?"] != "No")], "postcodes").copy()
 
-    # Normalize deprivation values
-    min_deprivation = df["Index of Multiple Deprivation"].min()
-    max_deprivation = df["Index of Multiple Deprivation"].max()
-    df["Affluence Score"] = 1 - (df["Index of Multiple Deprivation"] - min_deprivation) / (max_deprivation - min_deprivation)
-    df["Affluence Score"] = df["Affluence Score"].fillna(0)
+    # Normalised scores, percentiles and quantile bins for every heatmap metric
+    df = add_derived_metrics(df)
 
-    print(f"Loaded {len(df)} valid postcodes with affluence data.")
+    # Affluence is the inverse of normalised deprivation
+    df["Affluence Score"] = (1 - df["Index of Multiple Deprivation Norm"]).fillna(0)
+    return df
 
+
+# -------------------------------
+# Derived metrics
+# -------------------------------
+HEATMAP_METRICS = ["Index of Multiple Deprivation", "Population", "Households"]
+METRIC_QUANTILES = 5
+
+
+def add_derived_metrics(df, metrics=HEATMAP_METRICS, quantiles=METRIC_QUANTILES):
+    """
+    Adds, for each metric column:
+    - "<metric> Norm": min-max normalised to 0..1 over the whole dataset (NaN stays NaN)
+    - "<metric> Percentile": percentile rank 0..1
+    - "<metric> Quantile": quantile bin 1..`quantiles` (0 for missing values)
+    The (min, max) used for each metric is kept in df.attrs["metric_ranges"] for legends.
+    """
+    ranges = dict(df.attrs.get("metric_ranges", {}))
+    derived = {}
+    for metric in metrics:
+        if metric not in df.columns:
+            continue
+        values = pd.to_numeric(df[metric], errors="coerce").astype(float)
+        low, high = values.min(), values.max()
+        span = high - low
+        derived[f"{metric} Norm"] = (values - low) / span if span else values * 0.0
+
+        ranks = values.rank(pct=True)
+        derived[f"{metric} Percentile"] = ranks
+        bins = np.ceil(ranks * quantiles).clip(1, quantiles)
+        derived[f"{metric} Quantile"] = bins.fillna(0).astype(np.int8)
+        ranges[metric] = (low, high)
+
+    df = df.assign(**derived)
+    df.attrs["metric_ranges"] = ranges
     return df
 
 
+def get_metric_range(df, metric):
+    """(min, max) of a metric: the precomputed dataset-wide range when available, otherwise computed from `df`."""
+    ranges = df.attrs.get("metric_ranges", {})
+    if metric in ranges:
+        return ranges[metric]
+    return df[metric].min(), df[metric].max()
+
+
+
+
+def load_postcode_index(config):
+    """
+    Loads the PostcodeIndex for the city's postcode dataset (cached for the session).
+    Use it for exact, prefix and batch postcode lookups instead of filtering the DataFrame.
+    """
+    if not config or not hasattr(config, "pc_cityPostcodes"):
+        print("Error: Postcode dataset path not found in config.")
+        return None
+
+    if not os.path.exists(config.pc_cityPostcodes):
+        print(f"Error: file not found at {config.pc_cityPostcodes}")
+        return None
+
+    return cached_load(config.pc_cityPostcodes, "postcode_index", _build_postcode_index)
+
+def _build_postcode_index(file_path):
+    df = _read_postcodes(file_path)
+    return PostcodeIndex.from_dataframe(df) if df is not None else None
 
 
 def getLatLonFromPCode(postcode, df_postcodes):
@@ -197,21 +284,142 @@ def getLatLonFromPCode(postcode, df_postcodes):
     Retrieves the latitude and longitude of a given postcode.
 
     Parameters:
-    - `postcode`: The postcode string to search for.
-    - `df_postcodes`: The DataFrame containing postcode data.
+    - `postcode`: The postcode string to search for (spacing and case are ignored).
+    - `df_postcodes`: A PostcodeIndex (see load_postcode_index), or a DataFrame containing postcode data.
 
     Returns:
     - Tuple `(latitude, longitude)` if found, otherwise `None`.
     """
-
-    # Ensure postcode exists in the dataset
-    row = df_postcodes[df_postcodes["Postcode"] == postcode]
-    
-    if row.empty:
+    coords = lookup_postcode(postcode, df_postcodes)
+    if coords is None:
         print(f"⚠ ERROR: Postcode {postcode} not found in dataset.")
+    return coords
+
+
+# -------------------------------
+# Boundary membership
+# -------------------------------
+# Every postcode is assigned to every boundary feature it falls in (one row per postcode/feature pair),
+# once per version of the postcode + boundary files. Filtering by boundary is then a lookup, not a spatial test.
+MEMBERSHIP_FILENAME = "boundary_membership.csv"
+MEMBERSHIP_COLUMNS = ["Postcode", "Boundary", "Feature Index", "Boundary Feature ID", "Boundary Feature Name"]
+
+
+def get_membership_path(config):
+    """Membership table lives next to the city's postcode CSV."""
+    return os.path.join(os.path.dirname(config.postcodes_path), MEMBERSHIP_FILENAME)
+
+
+def _membership_sources(config):
+    """{path: "size-mtime"} for the postcode file and every boundary file; the table is rebuilt if any change."""
+    paths = [config.postcodes_path] + sorted(set(config.boundaries.values()))
+    return {path: road_network.network_version(path) for path in paths}
+
+
+def _membership_is_current(config, path):
+    manifest_path = f"{path}.json"
+    if not os.path.exists(path) or not os.path.exists(manifest_path):
+        return False
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return manifest.get("sources") == _membership_sources(config) and manifest.get("boundaries") == config.boundaries
+
+
+def _feature_name(feature, boundary_type, i):
+    properties = feature.get("properties") or {}
+    return properties.get("AreaName") or properties.get("name") or f"{city_config.boundary_label(boundary_type)} {i + 1}"
+
+
+def build_boundary_membership(config):
+    """
+    Precomputes which boundary features (city, centre, each commercial centre, ...) every postcode falls in
+    and saves the table (Postcode, Boundary, Feature Index, Boundary Feature ID, Boundary Feature Name).
+    Rows are ordered by boundary, then postcode file order, then feature file order.
+    Returns the table, or None if the postcodes can't be loaded.
+    """
+    df_postcodes = load_postcodes(config)
+    if df_postcodes is None or df_postcodes.empty:
+        print("No valid postcodes found.")
         return None
 
-    return (row["Latitude"].values[0], row["Longitude"].values[0])
+    points = shapely.points(df_postcodes["Longitude"].to_numpy(), df_postcodes["Latitude"].to_numpy())
+    postcodes = df_postcodes["Postcode"].to_numpy()
+    tables = []
+
+    for boundary_type, boundary in boundary_registry.city_boundaries(config).items():
+        # The registry's prepared geometries + STRtree: every postcode tested in one vectorised query
+        point_idx, feature_idx = boundary.tree.query(points, predicate="within")
+
+        order = np.lexsort((feature_idx, point_idx))
+        point_idx, feature_idx = point_idx[order], feature_idx[order]
+
+        feature_ids = boundary.feature_ids
+        feature_names = np.array([_feature_name(feature, boundary_type, i) for i, feature in enumerate(boundary.geojson["features"])], dtype=object)
+        tables.append(pd.DataFrame({
+            "Postcode": postcodes[point_idx],
+            "Boundary": boundary_type,
+            "Feature Index": feature_idx.astype(np.int32),
+            "Boundary Feature ID": feature_ids[feature_idx],
+            "Boundary Feature Name": feature_names[feature_idx],
+        }))
+
+    membership = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame(columns=MEMBERSHIP_COLUMNS)
+
+    path = get_membership_path(config)
+    try:
+        membership.to_csv(path, index=False)
+        with open(f"{path}.json", "w", encoding="utf-8") as f:
+            json.dump({"sources": _membership_sources(config), "boundaries": config.boundaries}, f, indent=2)
+        print(f"Saved boundary membership for {len(df_postcodes)} postcodes ({len(membership)} rows) to {path}")
+    except OSError as e:
+        print(f"Note: could not save boundary membership ({e}); using it for this session only.")
+    return membership
+
+
+def load_boundary_membership(config):
+    """
+    Loads the postcode -> boundary feature table, rebuilding it first if the postcode or boundary files changed.
+    Cached for the session.
+    """
+    if config is None:
+        print("Error: No city selected.")
+        return None
+
+    path = get_membership_path(config)
+    if not _membership_is_current(config, path):
+        membership = build_boundary_membership(config)
+        if membership is None or not os.path.exists(path):
+            return membership
+
+    return cached_load(path, "membership", _read_membership)
+
+
+def _read_membership(file_path):
+    df = read_csv_columnar(file_path)
+    df["Boundary"] = df["Boundary"].astype("category")
+    df["Boundary Feature ID"] = df["Boundary Feature ID"].astype(str)
+    return df
+
+
+def filter_by_boundary(config, df, boundary_type):
+    """
+    Keeps the rows of a postcode DataFrame whose Postcode falls inside `boundary_type` (a b_ config setting),
+    adding "Boundary Feature ID" / "Boundary Feature Name" for the first feature (in file order) containing it.
+    Row order of `df` is preserved.
+    """
+    membership = load_boundary_membership(config)
+    if membership is None:
+        return None
+
+    members = membership[membership["Boundary"] == boundary_type].drop_duplicates("Postcode").set_index("Postcode")
+    inside = df["Postcode"].isin(members.index).to_numpy()
+    df_inside = df[inside].copy()
+    df_inside["Boundary Feature ID"] = members["Boundary Feature ID"].reindex(df_inside["Postcode"]).to_numpy()
+    df_inside["Boundary Feature Name"] = members["Boundary Feature Name"].reindex(df_inside["Postcode"]).to_numpy()
+    return df_inside
 
 
     # **Attach event listeners**
@@ -234,57 +442,392 @@ def getLatLonFromPCode(postcode, df_postcodes):
 ##################################################################################################
 #################################################################################################
 
-def save_route_data(config, destination_type, start_postcode, distances, routes):
+# -------------------------------
+# Route geometry encoding
+# -------------------------------
+ROUTE_COORD_SCALE = 1e6  # stored as integer micro-degrees (~0.1m)
+ROUTE_SIMPLIFY_TOLERANCE_M = 5.0
+ROUTE_FIELDNAMES = ["Start Postcode", "Mode", "Distance (miles)", "Route Geometry"]
+
+
+def simplify_route(route_coords, tolerance_m=ROUTE_SIMPLIFY_TOLERANCE_M):
+    """
+    Simplifies a [(lat, lon), ...] route with Douglas-Peucker at `tolerance_m` metres.
+    Start and end points are always kept.
+    """
+    coords = np.asarray(route_coords, dtype=np.float64).reshape(-1, 2)
+    if len(coords) < 3 or not tolerance_m:
+        return coords
+
+    # Work in a local metric projection so the tolerance is in metres
+    projection = geodesy.LocalProjection.around(coords[:, 0], coords[:, 1])
+    line = shapely.simplify(shapely.linestrings(np.column_stack(projection.to_xy(coords[:, 0], coords[:, 1]))), tolerance_m, preserve_topology=False)
+    x, y = shapely.get_coordinates(line).T
+    return np.column_stack(projection.from_xy(x, y))
+
+
+def encode_route(route_coords, tolerance_m=ROUTE_SIMPLIFY_TOLERANCE_M):
+    """
+    Encodes a route as a compact ASCII string: simplified, rounded to micro-degrees,
+    delta-encoded (first point absolute) as int32 pairs and base64'd.
+    """
+    coords = simplify_route(route_coords, tolerance_m)
+    if len(coords) == 0:
+        return ""
+    fixed = np.round(coords * ROUTE_COORD_SCALE).astype(np.int64)
+    deltas = np.diff(fixed, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    return base64.b64encode(deltas.astype("<i4").tobytes()).decode("ascii")
+
+
+def decode_routes(encoded):
+    """
+    Decodes many encoded routes at once.
+    All rows are joined into one int32 buffer and un-delta'd with a single cumulative sum.
+    Returns a list of (n, 2) float arrays of (lat, lon), one per input row.
+    """
+    raw = [base64.b64decode(value) if isinstance(value, str) and value else b"" for value in encoded]
+    if not raw:
+        return []
+
+    counts = np.array([len(chunk) // 8 for chunk in raw], dtype=np.int64)
+    flat = np.frombuffer(b"".join(raw), dtype="<i4").astype(np.int64).reshape(-1, 2)
+    totals = np.cumsum(flat, axis=0)
+
+    # Each route starts with an absolute point, so remove whatever the previous routes added up to
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    carried = np.zeros((len(counts), 2), dtype=np.int64)
+    has_previous = starts > 0
+    carried[has_previous] = totals[starts[has_previous] - 1]
+    coords = (totals - np.repeat(carried, counts, axis=0)) / ROUTE_COORD_SCALE
+
+    return np.split(coords, ends[:-1])
+
+
+def route_start_points(encoded):
+    """
+    (n, 2) array of the first (lat, lon) of each encoded route, NaN for empty routes.
+    Only the leading absolute point is decoded (the first 12 base64 characters), not the whole route.
+    """
+    starts = np.full((len(encoded), 2), np.nan)
+    for i, value in enumerate(encoded):
+        if isinstance(value, str) and len(value) >= 12:
+            starts[i] = np.frombuffer(base64.b64decode(value[:12])[:8], dtype="<i4")
+    return starts / ROUTE_COORD_SCALE
+
+
+def decode_route(encoded):
+    """Decodes a single encoded route into a list of (lat, lon) tuples."""
+    return [tuple(point) for point in decode_routes([encoded])[0].tolist()]
+
+
+def migrate_route_csv(file_path, tolerance_m=ROUTE_SIMPLIFY_TOLERANCE_M):
+    """
+    Rewrites a legacy route CSV (JSON "Route Coordinates" column) into the encoded "Route Geometry" format.
+    Does nothing if the file is already migrated.
+    """
+    if not os.path.exists(file_path) or os.stat(file_path).st_size == 0:
+        return
+
+    df = pd.read_csv(file_path)
+    if "Route Coordinates" not in df.columns:
+        return
+
+    df["Route Geometry"] = [encode_route(ast.literal_eval(coords), tolerance_m) for coords in df["Route Coordinates"]]
+    df[ROUTE_FIELDNAMES].to_csv(file_path, index=False)
+    print(f"Migrated {len(df)} routes in {file_path} to encoded geometry.")
+
+
+# -------------------------------
+# Route store (SQLite)
+# -------------------------------
+ROUTE_STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS routes (
+    origin TEXT NOT NULL,
+    destination_set TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    network_version TEXT NOT NULL,
+    destination TEXT,
+    distance_miles REAL,
+    geometry TEXT NOT NULL DEFAULT '',
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (origin, destination_set, mode, network_version)
+);
+CREATE INDEX IF NOT EXISTS idx_routes_set_mode ON routes (destination_set, mode, origin);
+CREATE TABLE IF NOT EXISTS imported_files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER,
+    size INTEGER,
+    imported_at REAL NOT NULL
+);
+"""
+ROUTE_EXPORT_FOLDER = os.path.join("exports", "routes")
+
+
+def destination_set_name(destination_type):
+    """'City Centre' -> 'city_centre' (also the stem of the legacy route CSV names)."""
+    return destination_type.lower().replace(' ', '_')
+
+
+def get_route_folder(config):
+    """The city's routes folder (falls back to the folder of the saved route CSVs)."""
+    return config.route_folder
+
+
+def get_route_csv_path(config, destination_type):
+    """Path of the legacy route CSV for a destination set (imported into the store when it changes)."""
+    return os.path.join(get_route_folder(config), f"{destination_set_name(destination_type)}_routes.csv")
+
+
+def get_route_export_path(config, destination_type):
+    """Default path for export_routes_csv: exports/routes/<city>/<destination set>_routes.csv."""
+    city = getattr(config, "city", None) or os.path.basename(os.path.normpath(get_route_folder(config)))
+    return os.path.join(ROUTE_EXPORT_FOLDER, city, f"{destination_set_name(destination_type)}_routes.csv")
+
+
+def open_route_store(config):
     """
-    Saves route details to the corosponding to destination.
+    Opens (creating if needed) the city's route database at <routes folder>/routes.sqlite.
+    Legacy route CSVs in the folder are imported, tagged with network version "legacy", and imported again
+    whenever their size or mtime changes.
     """
-    folder_path = config.route_data_folder
+    conn = _connect_route_store(config)
+    for destination_type in ["City Centre", "Shopping Districts"]:
+        _import_route_csv(conn, get_route_csv_path(config, destination_type), destination_set_name(destination_type))
+
+    return conn
+
+
+def has_saved_routes(config):
+    """True if the city's route store (or a legacy route CSV it would import) holds any routes."""
+    csv_paths = [get_route_csv_path(config, destination_type) for destination_type in ["City Centre", "Shopping Districts"]]
+    if not os.path.exists(os.path.join(get_route_folder(config), "routes.sqlite")) and not any(os.path.exists(p) for p in csv_paths):
+        return False
+    conn = open_route_store(config)
+    try:
+        return conn.execute("SELECT 1 FROM routes LIMIT 1").fetchone() is not None
+    finally:
+        conn.close()
+
+
+def _connect_route_store(config):
+    """Connection to the route database with the schema in place (no CSV import)."""
+    folder_path = get_route_folder(config)
     os.makedirs(folder_path, exist_ok=True)
 
-    file_path = os.path.join(folder_path, f"{destination_type.lower().replace(' ', '_')}_routes.csv")
+    conn = sqlite3.connect(os.path.join(folder_path, "routes.sqlite"), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(ROUTE_STORE_SCHEMA)
+    return conn
+
+
+def _file_signature(file_path):
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _mark_imported(conn, file_path):
+    """Records the file's current mtime/size, so it's only imported again once it changes."""
+    mtime_ns, size = _file_signature(file_path)
+    conn.execute(
+        "INSERT OR REPLACE INTO imported_files (path, mtime_ns, size, imported_at) VALUES (?, ?, ?, ?)",
+        (os.path.abspath(file_path), mtime_ns, size, time.time()),
+    )
+
+
+def _import_route_csv(conn, file_path, destination_set):
+    """Imports a route CSV into the store unless this version of it (mtime/size in imported_files) already was."""
+    if not os.path.exists(file_path) or os.stat(file_path).st_size == 0:
+        return
+    recorded = conn.execute("SELECT mtime_ns, size FROM imported_files WHERE path = ?", (os.path.abspath(file_path),)).fetchone()
+    if recorded is not None and tuple(recorded) == _file_signature(file_path):
+        return
+
+    df = pd.read_csv(file_path)
+    if "Route Geometry" not in df.columns:
+        df["Route Geometry"] = [encode_route(ast.literal_eval(coords)) for coords in df["Route Coordinates"]]
+
+    rows = [{
+        "origin": row["Start Postcode"],
+        "destination_set": destination_set,
+        "mode": row["Mode"],
+        "network_version": "legacy",
+        "destination": None,
+        "distance_miles": row["Distance (miles)"],
+        "geometry": row["Route Geometry"],
+    } for _, row in df.iterrows()]
+
+    with conn:
+        if recorded is not None:
+            # A changed CSV replaces the legacy routes imported from its previous version
+            conn.execute("DELETE FROM routes WHERE destination_set = ? AND network_version = 'legacy'", (destination_set,))
+        _upsert(conn, rows)
+        _mark_imported(conn, file_path)
+    print(f"Imported {len(rows)} routes from {file_path} into the route store.")
+
+
+def _upsert(conn, rows):
+    """INSERT or UPDATE rows (dicts) on their (origin, destination_set, mode, network_version) key."""
+    now = time.time()
+    conn.executemany(
+        """
+        INSERT INTO routes (origin, destination_set, mode, network_version, destination, distance_miles, geometry, updated_at)
+        VALUES (:origin, :destination_set, :mode, :network_version, :destination, :distance_miles, :geometry, :updated_at)
+        ON CONFLICT (origin, destination_set, mode, network_version) DO UPDATE SET
+            destination = excluded.destination,
+            distance_miles = excluded.distance_miles,
+            geometry = excluded.geometry,
+            updated_at = excluded.updated_at
+        """,
+        [{**row, "distance_miles": _distance_or_none(row["distance_miles"]), "updated_at": now} for row in rows],
+    )
+
+
+def _distance_or_none(distance):
+    """'No Route' / NaN distances are stored as NULL."""
+    try:
+        distance = float(distance)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(distance) else distance
 
-    existing_entries = set()
 
-    # Load existing entries
-    if os.path.exists(file_path):
-        with open(file_path, mode='r', newline='') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                key = (row["Start Postcode"], row["Mode"])
-                existing_entries.add(key)
+def upsert_routes(config, rows):
+    """
+    Bulk insert/update of routes in a single transaction (for batch jobs).
+    rows: dicts with origin, destination_set, mode, distance_miles, geometry (encoded) and
+    optionally destination and network_version (defaults to the city's current OSM file version).
+    """
+    version = road_network.network_version(getattr(config, "map_osm_gz", None))
+    rows = [{"destination": None, "network_version": version, **row} for row in rows]
 
-    # Save new routes only if they don't exist yet
-    with open(file_path, mode='a', newline='') as file:
-        fieldnames = ["Start Postcode", "Mode", "Distance (miles)", "Route Coordinates"]
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
+    conn = open_route_store(config)
+    try:
+        with conn:
+            _upsert(conn, rows)
+    finally:
+        conn.close()
+    return len(rows)
 
-        # Write header if file is empty
-        if os.stat(file_path).st_size == 0:
-            writer.writeheader()
 
-        for mode, distance in distances.items():
-            route_key = (start_postcode, mode)
-            #Skip existing
-            if route_key in existing_entries: 
-                continue
+def save_route_data(config, destination_type, start_postcode, distances, routes, destinations=None):
+    """
+    Saves route details to the route store for the corosponding destination.
+    destinations: optional {mode: destination postcode}.
+    """
+    destinations = destinations or {}
+    rows = [{
+        "origin": start_postcode,
+        "destination_set": destination_set_name(destination_type),
+        "mode": mode,
+        "destination": destinations.get(mode),
+        "distance_miles": distance,
+        "geometry": encode_route(routes.get(mode, [])),
+    } for mode, distance in distances.items()]
 
-            route_coords = json.dumps(routes.get(mode, []))
-            writer.writerow({
-                "Start Postcode": start_postcode,
-                "Mode": mode,
-                "Distance (miles)": distance,
-                "Route Coordinates": route_coords
-            })
+    upsert_routes(config, rows)
 
 
+def load_routes(config, destination_type, mode=None, network_version=None, decode=True):
+    """
+    Loads routes for a destination set (optionally one mode) from the route store.
+    When a postcode has routes from several network versions, `network_version`
+    (default: the city's current OSM file) is preferred, then the most recently saved.
+    Returns the same columns as load_routes_csv, plus "Destination Postcode".
+    With decode=False the "Route Coordinates" column is skipped (only the encoded "Route Geometry" is returned).
+    """
+    if network_version is None:
+        network_version = road_network.network_version(getattr(config, "map_osm_gz", None))
+
+    query = """
+        SELECT origin, mode, distance_miles, geometry, destination FROM (
+            SELECT *, ROW_NUMBER() OVER (
+                PARTITION BY origin, mode
+                ORDER BY network_version = :version DESC, updated_at DESC
+            ) AS pick
+            FROM routes
+            WHERE destination_set = :destination_set AND (:mode IS NULL OR mode = :mode)
+        ) WHERE pick = 1
+        ORDER BY origin, mode
+    """
+    conn = open_route_store(config)
+    try:
+        df = pd.read_sql_query(query, conn, params={
+            "version": network_version,
+            "destination_set": destination_set_name(destination_type),
+            "mode": mode,
+        })
+    finally:
+        conn.close()
+
+    df = df.rename(columns={
+        "origin": "Start Postcode",
+        "mode": "Mode",
+        "distance_miles": "Distance (miles)",
+        "geometry": "Route Geometry",
+        "destination": "Destination Postcode",
+    })
+    if decode:
+        df["Route Coordinates"] = [coords.tolist() for coords in decode_routes(df["Route Geometry"])]
+    return df
 
 
-def load_routes_csv(path):
+def load_closest_zone_routes(config, destination_type, mode):
     """
-    Loads saved routes from CSV and parses coordinate strings into lists.
+    Routes (one mode) from the postcodes that are strictly closer to `destination_type` ("City Centre" or
+    "Shopping Districts") than to the other zone, with "Target" and "Mode" columns for the map popups.
     """
-    df = pd.read_csv(path)
-    df["Route Coordinates"] = df["Route Coordinates"].apply(ast.literal_eval)
+    df_shopping = load_routes(config, "Shopping Districts", mode)
+    df_city = load_routes(config, "City Centre", mode)
+
+    merged = df_shopping.merge(df_city, on="Start Postcode", suffixes=("_shopping", "_city"))
+    closer_shopping = merged[merged["Distance (miles)_shopping"] < merged["Distance (miles)_city"]]
+    closer_city = merged[merged["Distance (miles)_city"] < merged["Distance (miles)_shopping"]]
+
+    if destination_type == "City Centre":
+        df = closer_city[["Start Postcode", "Distance (miles)_city", "Route Coordinates_city"]].copy()
+        df = df.rename(columns={"Distance (miles)_city": "Distance (miles)", "Route Coordinates_city": "Route Coordinates"})
+        df["Target"] = "City Centre"
+    else:
+        df = closer_shopping[["Start Postcode", "Distance (miles)_shopping", "Route Coordinates_shopping"]].copy()
+        df = df.rename(columns={"Distance (miles)_shopping": "Distance (miles)", "Route Coordinates_shopping": "Route Coordinates"})
+        df["Target"] = "Shopping District"
+
+    df["Mode"] = mode
     return df
 
 
+def export_routes_csv(config, destination_type, file_path=None):
+    """
+    Writes the stored routes for a destination set to CSV (Start Postcode, Mode, Distance (miles), Route Geometry),
+    by default to get_route_export_path. Exporting over a legacy route CSV records it as imported,
+    so the routes aren't imported back into the store.
+    """
+    file_path = file_path or get_route_export_path(config, destination_type)
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    df = load_routes(config, destination_type)
+    df[ROUTE_FIELDNAMES].to_csv(file_path, index=False)
+
+    legacy_paths = {os.path.abspath(get_route_csv_path(config, name)) for name in ["City Centre", "Shopping Districts"]}
+    if os.path.abspath(file_path) in legacy_paths:
+        conn = _connect_route_store(config)
+        try:
+            with conn:
+                _mark_imported(conn, file_path)
+        finally:
+            conn.close()
+    print(f"Exported {len(df)} routes to {file_path}")
+    return file_path
+
+
+def load_routes_csv(path):
+    """
+    Loads saved routes from CSV and decodes the geometry into coordinate lists ("Route Coordinates").
+    Legacy files with a JSON "Route Coordinates" column are still read.
+    """
+    df = pd.read_csv(path)
+    if "Route Geometry" in df.columns:
+        df["Route Coordinates"] = [coords.tolist() for coords in decode_routes(df["Route Geometry"])]
+    else:
+        df["Route Coordinates"] = df["Route Coordinates"].apply(ast.literal_eval)
+    return df
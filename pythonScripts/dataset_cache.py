@@ -0,0 +1,195 @@
+# This file keeps loaded datasets in memory for the notebook session so repeat widget clicks don't go back to disk.
+# Entries are keyed on (path, mtime, size, transform), so editing a file on disk automatically invalidates it.
+# CSVs also get a typed Feather "sidecar" on disk (<name>.csv.feather) so later sessions skip CSV parsing.
+import os
+import sys
+from collections import OrderedDict
+import pandas as pd
+
+from pythonScripts.dataset_schemas import low_memory_enabled
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # sidecars are optional, plain pd.read_csv is used without pyarrow
+    pa = None
+
+DEFAULT_BUDGET_MB = 512
+SIDECAR_SUFFIX = ".feather"
+
+
+def _estimate_size(value):
+    """Rough in-memory size of a cached value in bytes."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if hasattr(value, "memory_bytes"):
+        return int(value.memory_bytes())
+    return sys.getsizeof(value)
+
+
+def _share(value):
+    """
+    DataFrames are handed out as shallow copies so callers adding/replacing columns
+    don't change the cached frame; the underlying data is shared.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=False)
+    return value
+
+
+class DatasetCache:
+    """Session-level LRU cache for loaded datasets with a memory budget."""
+    def __init__(self, budget_mb=DEFAULT_BUDGET_MB):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.entries = OrderedDict()  # key -> (value, size)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path, transform, loader, size_hint=None):
+        """
+        Returns loader(path) from the cache, calling the loader only on a miss.
+        - transform: name of the processing applied by `loader` (e.g. "csv", "postcodes", "affluence").
+        - size_hint: byte size to charge for values whose size can't be measured (e.g. parsed JSON).
+        Loader results of None are not cached.
+        """
+        stat = os.stat(path)
+        file_key = (os.path.abspath(path), transform, low_memory_enabled())
+        key = file_key + (stat.st_mtime_ns, stat.st_size)
+
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return _share(self.entries[key][0])
+
+        self.misses += 1
+        value = loader(path)
+        if value is None:
+            return None
+
+        # Any older version of this file/transform is now stale
+        for stale in [k for k in self.entries if k[:3] == file_key]:
+            self._remove(stale)
+
+        size = size_hint if size_hint is not None else _estimate_size(value)
+        self.entries[key] = (value, size)
+        self.total_bytes += size
+        self._evict()
+        return _share(value)
+
+    def _remove(self, key):
+        _, size = self.entries.pop(key)
+        self.total_bytes -= size
+
+    def _evict(self):
+        """Drops least recently used entries until within budget (always keeps the newest)."""
+        while self.total_bytes > self.budget_bytes and len(self.entries) > 1:
+            self._remove(next(iter(self.entries)))
+
+    def set_budget(self, budget_mb):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self._evict()
+
+    def clear(self):
+        self.entries.clear()
+        self.total_bytes = 0
+
+    def report(self):
+        """Per-entry memory use (largest first), e.g. to check a multi-city session fits the container."""
+        rows = []
+        for (path, transform, low_memory, _, _), (value, size) in self.entries.items():
+            rows.append({
+                "File": os.path.relpath(path),
+                "Transform": transform,
+                "Low Memory": low_memory,
+                "Rows": len(value) if isinstance(value, (pd.DataFrame, pd.Series)) else None,
+                "Memory (MB)": round(size / (1024 * 1024), 2),
+            })
+        report = pd.DataFrame(rows, columns=["File", "Transform", "Low Memory", "Rows", "Memory (MB)"])
+        return report.sort_values("Memory (MB)", ascending=False, ignore_index=True)
+
+    def stats(self):
+        """Hit/miss counts and memory use, for checking the cache is doing its job."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "memory_mb": round(self.total_bytes / (1024 * 1024), 2),
+            "budget_mb": round(self.budget_bytes / (1024 * 1024), 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+# Shared cache for the session
+dataset_cache = DatasetCache()
+
+
+def cached_load(path, transform, loader, size_hint=None):
+    """Loads `path` through the shared session cache (see DatasetCache.get)."""
+    return dataset_cache.get(path, transform, loader, size_hint)
+
+
+# -------------------------------
+# Columnar sidecars
+# -------------------------------
+def sidecar_path(csv_path):
+    """Where the Feather copy of a CSV lives (next to it)."""
+    return f"{csv_path}{SIDECAR_SUFFIX}"
+
+
+def _source_metadata(stat):
+    return {b"source_mtime_ns": str(stat.st_mtime_ns).encode(), b"source_size": str(stat.st_size).encode()}
+
+
+def _read_sidecar(path, stat, columns):
+    """Reads the sidecar if it exists and was built from the current CSV, otherwise returns None."""
+    if not os.path.exists(path):
+        return None
+    try:
+        table = feather.read_table(path, memory_map=True)
+    except Exception:
+        return None
+
+    metadata = table.schema.metadata or {}
+    expected = _source_metadata(stat)
+    if any(metadata.get(key) != value for key, value in expected.items()):
+        return None
+    if columns is not None:
+        table = table.select([col for col in columns if col in table.column_names])
+    return table.to_pandas()
+
+
+def _write_sidecar(df, path, stat):
+    """Writes a typed Feather copy of `df`, tagged with the source CSV's mtime/size. Failures are non-fatal."""
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **_source_metadata(stat)})
+        feather.write_feather(table, path)
+    except Exception as e:
+        print(f"Note: could not write columnar cache for {path} ({e}); reading CSV directly.")
+
+
+def read_csv_columnar(csv_path, columns=None):
+    """
+    pd.read_csv replacement for the city datasets.
+    The first load parses the CSV and writes a typed Feather sidecar next to it; later loads read the sidecar
+    (only the requested `columns`, memory-mapped). The sidecar is rebuilt whenever the CSV's mtime or size changes.
+    Requested columns that aren't in the file are ignored.
+    """
+    if pa is None:
+        return pd.read_csv(csv_path, usecols=(lambda col: col in columns) if columns is not None else None)
+
+    stat = os.stat(csv_path)
+    side = sidecar_path(csv_path)
+
+    df = _read_sidecar(side, stat, columns)
+    if df is not None:
+        return df
+
+    df = pd.read_csv(csv_path)
+    _write_sidecar(df, side, stat)
+    return df[[col for col in columns if col in df.columns]] if columns is not None else df
+
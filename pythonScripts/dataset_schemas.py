@@ -0,0 +1,142 @@
+# This file declares which columns and dtypes each dataset needs, for the low-memory loading mode.
+# With low memory on, loaders keep only the declared columns and store repeated strings as categories,
+# coordinates as float32 and counts as int32 (float32 if the column has gaps).
+import pandas as pd
+
+# columns: the columns the notebook uses (None keeps every column, e.g. where users pick popup fields)
+# dtypes: target dtype per column; "int32" falls back to "float32" when the column has missing values
+SCHEMAS = {
+    "postcodes": {
+        "columns": [
+            "Postcode", "Latitude", "Longitude", "In Use?", "Population", "Households",
+            "Index of Multiple Deprivation", "District", "Ward",
+        ],
+        "dtypes": {
+            "Latitude": "float32", "Longitude": "float32",
+            "In Use?": "category", "District": "category", "Ward": "category",
+            "Population": "int32", "Households": "int32", "Index of Multiple Deprivation": "int32",
+        },
+    },
+    "cctv": {
+        "columns": [
+            "Day", "Date", "Hour", "Source", "Address", "Coordinates",
+            "F__of_Bicycles", "F__of_People", "F__of_Road_Vehicles",
+        ],
+        "dtypes": {
+            "Day": "category", "Hour": "category", "Source": "category", "Address": "category", "Coordinates": "category",
+            "F__of_Bicycles": "int32", "F__of_People": "int32", "F__of_Road_Vehicles": "int32",
+        },
+    },
+    "vehicle_classification": {
+        "columns": None,
+        "dtypes": {
+            "Day": "category", "Hour": "category", "Source": "category", "Coordinates": "category",
+            "Classification_Road_Vehicles": "category", "Number_of_Road_Vehicles": "int32",
+        },
+    },
+    "business": {
+        "columns": None,
+        "dtypes": {"category": "category", "lattitude": "float32", "longitude": "float32"},
+    },
+}
+
+_low_memory = False
+
+
+def set_low_memory(enabled=True):
+    """Turns the low-memory loading mode on/off for the session (already-cached frames are kept per mode)."""
+    global _low_memory
+    _low_memory = bool(enabled)
+    print(f"Low-memory loading {'enabled' if _low_memory else 'disabled'}.")
+
+
+def low_memory_enabled():
+    return _low_memory
+
+
+def schema_columns(name):
+    """Columns to read for dataset `name` in the current mode (None = all)."""
+    if not _low_memory or name not in SCHEMAS:
+        return None
+    return SCHEMAS[name]["columns"]
+
+
+def apply_schema(df, name):
+    """
+    Prunes and downcasts `df` to the schema for `name` when low-memory mode is on; otherwise returns it unchanged.
+    Declared columns missing from the file are skipped; values that can't be converted keep their original dtype.
+    """
+    if not _low_memory or name not in SCHEMAS or df is None:
+        return df
+
+    schema = SCHEMAS[name]
+    if schema["columns"] is not None:
+        df = df[[col for col in schema["columns"] if col in df.columns]]
+
+    converted = {}
+    for col, dtype in schema["dtypes"].items():
+        if col not in df.columns:
+            continue
+        series = df[col]
+        try:
+            if dtype == "int32":
+                numeric = pd.to_numeric(series, errors="coerce")
+                converted[col] = numeric.astype("float32" if numeric.isna().any() else "int32")
+            elif dtype == "float32":
+                converted[col] = pd.to_numeric(series, errors="coerce").astype("float32")
+            else:
+                converted[col] = series.astype(dtype)
+        except (TypeError, ValueError):
+            continue
+    return df.assign(**converted) if converted else df.copy()
+
+
+def concat_frames(frames):
+    """
+    pd.concat that keeps categorical columns categorical when the frames have different categories
+    (plain concat falls back to object dtype, losing the savings for merged monthly files).
+    """
+    frames = [df for df in frames if df is not None]
+    if not frames:
+        return None
+
+    # Columns that are categorical in every frame that has them (frames without the column get all-missing values)
+    columns = list(dict.fromkeys(col for df in frames for col in df.columns))
+    categorical = [
+        col for col in columns
+        if all(isinstance(df[col].dtype, pd.CategoricalDtype) for df in frames if col in df.columns)
+    ]
+    if categorical and len(frames) > 1:
+        categories = {
+            col: pd.api.types.union_categoricals([df[col] for df in frames if col in df.columns]).categories
+            for col in categorical
+        }
+        frames = [
+            df.assign(**{
+                col: (df[col].cat.set_categories(categories[col]) if col in df.columns
+                      else pd.Categorical([None] * len(df), categories=categories[col]))
+                for col in categorical
+            })
+            for df in frames
+        ]
+    return pd.concat(frames, ignore_index=True)
+
+
+def memory_report(frames):
+    """
+    Per-frame memory use.
+    - frames: {name: DataFrame}
+    Returns a DataFrame with rows, columns and memory (MB, deep) per frame, largest first.
+    """
+    rows = []
+    for name, df in frames.items():
+        if df is None:
+            continue
+        rows.append({
+            "Frame": name,
+            "Rows": len(df),
+            "Columns": df.shape[1],
+            "Memory (MB)": round(df.memory_usage(deep=True).sum() / (1024 * 1024), 2),
+        })
+    report = pd.DataFrame(rows, columns=["Frame", "Rows", "Columns", "Memory (MB)"])
+    return report.sort_values("Memory (MB)", ascending=False, ignore_index=True)
@@ -0,0 +1,139 @@
+# This file holds the shared distance/projection helpers. Everything is NumPy-vectorised: pass scalars or arrays
+# (they broadcast), so callers can replace per-row Python loops with a single call.
+import numpy as np
+import shapely
+from shapely.strtree import STRtree
+
+EARTH_RADIUS_KM = 6371.0  # same radius as BusNet4, pyroutelib3 and the old cctv_manager helper
+METRES_PER_DEGREE = 111320.0  # length of one degree of latitude (and of longitude at the equator)
+
+
+# -------------------------------
+# Haversine
+# -------------------------------
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in km. Arguments broadcast (scalars, arrays or a mix);
+    returns a float for scalar input, otherwise an array.
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) * 0.5) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) * 0.5) ** 2
+    km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    return float(km) if km.ndim == 0 else km
+
+
+def distances_km(lat, lon, lats, lons):
+    """One-to-many: distance in km from (lat, lon) to every point in `lats`/`lons`."""
+    return np.atleast_1d(haversine_km(lat, lon, lats, lons))
+
+
+def distance_matrix_km(lats1, lons1, lats2, lons2):
+    """Many-to-many: (len(lats1), len(lats2)) matrix of distances in km."""
+    lats1, lons1 = np.asarray(lats1, dtype=np.float64)[:, None], np.asarray(lons1, dtype=np.float64)[:, None]
+    lats2, lons2 = np.asarray(lats2, dtype=np.float64)[None, :], np.asarray(lons2, dtype=np.float64)[None, :]
+    return np.atleast_2d(haversine_km(lats1, lons1, lats2, lons2))
+
+
+def nearest(lat, lon, lats, lons):
+    """Index of and distance (km) to the point nearest (lat, lon). Returns (-1, inf) for no points."""
+    if len(lats) == 0:
+        return -1, float("inf")
+    km = distances_km(lat, lon, lats, lons)
+    i = int(np.nanargmin(km))
+    return i, float(km[i])
+
+
+def within_radius(lat, lon, lats, lons, radius_m):
+    """Boolean mask of the points within `radius_m` metres of (lat, lon)."""
+    return distances_km(lat, lon, lats, lons) * 1000 <= radius_m
+
+
+# -------------------------------
+# Local projection
+# -------------------------------
+class LocalProjection:
+    """
+    Equirectangular projection to metres around (lat0, lon0).
+    Accurate to well under 1% across a city, which is what buffering, simplifying and
+    nearest-neighbour queries in metres need.
+    """
+    def __init__(self, lat0, lon0=0.0):
+        self.lat0 = float(lat0)
+        self.lon0 = float(lon0)
+        self.x_scale = METRES_PER_DEGREE * np.cos(np.radians(self.lat0))
+        self.y_scale = METRES_PER_DEGREE
+
+    @classmethod
+    def around(cls, lats, lons):
+        """Projection centred on the mean of the given points."""
+        return cls(float(np.mean(lats)), float(np.mean(lons)))
+
+    def to_xy(self, lats, lons):
+        """(x, y) metre arrays for latitude/longitude arrays."""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        return (lons - self.lon0) * self.x_scale, (lats - self.lat0) * self.y_scale
+
+    def from_xy(self, x, y):
+        """(lats, lons) arrays for metre coordinates."""
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        return y / self.y_scale + self.lat0, x / self.x_scale + self.lon0
+
+    def project_geometry(self, geometry):
+        """Shapely geometry in (lon, lat) order -> metres."""
+        return shapely.transform(geometry, lambda xy: np.column_stack(self.to_xy(xy[:, 1], xy[:, 0])))
+
+    def unproject_geometry(self, geometry):
+        """Shapely geometry in metres -> (lon, lat) order."""
+        return shapely.transform(geometry, lambda xy: np.column_stack(self.from_xy(xy[:, 0], xy[:, 1])[::-1]))
+
+
+# -------------------------------
+# Radius queries
+# -------------------------------
+def pairs_within(lats, lons, radius_m):
+    """
+    All ordered pairs (i, j), i != j, of points closer than `radius_m` metres.
+    Candidates come from an STRtree over projected points; distances are then checked with haversine.
+    Returns (i, j, distance_m) arrays.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    if len(lats) < 2:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0)
+
+    projection = LocalProjection.around(lats, lons)
+    points = shapely.points(*projection.to_xy(lats, lons))
+    # Small margin so projection error can't drop a pair that haversine would keep
+    i, j = STRtree(points).query(points, predicate="dwithin", distance=radius_m * 1.01)
+    keep = i != j
+    i, j = i[keep], j[keep]
+    d = haversine_km(lats[i], lons[i], lats[j], lons[j]) * 1000
+    close = d < radius_m
+    return i[close], j[close], d[close]
+
+
+def query_radius(lats, lons, centre_lats, centre_lons, radius_m):
+    """
+    For many centres at once: (centre_index, point_index, distance_m) for every point within `radius_m`
+    metres of a centre, grouped by centre.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    centre_lats = np.atleast_1d(np.asarray(centre_lats, dtype=np.float64))
+    centre_lons = np.atleast_1d(np.asarray(centre_lons, dtype=np.float64))
+    if len(lats) == 0 or len(centre_lats) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0)
+
+    projection = LocalProjection.around(np.concatenate([lats, centre_lats]), np.concatenate([lons, centre_lons]))
+    tree = STRtree(shapely.points(*projection.to_xy(lats, lons)))
+    centres = shapely.points(*projection.to_xy(centre_lats, centre_lons))
+    c, p = tree.query(centres, predicate="dwithin", distance=radius_m * 1.01)
+    order = np.lexsort((p, c))
+    c, p = c[order], p[order]
+    d = haversine_km(centre_lats[c], centre_lons[c], lats[p], lons[p]) * 1000
+    close = d <= radius_m
+    return c[close], p[close], d[close]
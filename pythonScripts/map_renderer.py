@@ -1,16 +1,17 @@
 # This file handles rendering  the map and other map related things such as boundaries and markers. (possibly split the code later once the file is large to modularise the code)
 import folium
 import json
-import os
 import pandas as pd
-from folium.plugins import MarkerCluster
+import numpy as np
+from folium.plugins import VectorGridProtobuf
 
 import matplotlib.colors as mcolors
+from branca.element import MacroElement, Template
 
-import geopandas as gpd
 
 from pythonScripts import  BusNet4 as bus
-from shapely.geometry import shape
+from pythonScripts import boundary_registry, boundary_topology, data_manager, geodesy, marker_clustering, vector_tiles
+from pythonScripts.city_config import boundary_label
 
 
 def generate_base_map(config):
@@ -31,7 +32,7 @@ def add_boundaries(map_object, config):
         print("Error: No city config provided.")
         return map_object
 
-    available_boundaries = [attr for attr in dir(config) if attr.startswith("b_")] #filters by the prepend b_ which each config file boundary variables should have.
+    available_boundaries = list(config.boundaries)  # b_ settings, catalogued once when the config is loaded
 
     if not available_boundaries:
         print(f"No boundaries found for {config.CITY_NAME}.")
@@ -46,7 +47,54 @@ def add_boundaries(map_object, config):
     return map_object
 
 
-def add_selected_boundary(map_object, config, boundary_type):
+BOUNDARY_STYLE = {"color": "blue", "weight": 2, "fillColor": "#00ffff", "fillOpacity": 0.2}
+BOUNDARY_HIGHLIGHT = {"color": "darkblue", "weight": 3, "fillColor": "#008b8b", "fillOpacity": 0.4}
+
+
+class HighlightOnHover(MacroElement):
+    """Restyles a layer's features on mouseover and back on mouseout (folium.TopoJson has no highlight_function)."""
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        {{ this.layer.get_name() }}.on("mouseover", function(e) { e.layer.setStyle({{ this.highlight|tojson }}); });
+        {{ this.layer.get_name() }}.on("mouseout", function(e) { e.layer.setStyle({{ this.style|tojson }}); });
+        {% endmacro %}
+    """)
+
+    def __init__(self, layer, style, highlight):
+        super().__init__()
+        self._name = "HighlightOnHover"
+        self.layer = layer
+        self.style = style
+        self.highlight = highlight
+
+
+def _topojson_copy(topology):
+    """Copy of a cached topology that folium.TopoJson can write styles into (it edits geometry properties in place)."""
+    objects = {
+        name: {**obj, "geometries": [{**g, "properties": dict(g.get("properties") or {})} for g in obj["geometries"]]}
+        for name, obj in topology["objects"].items()
+    }
+    return {**topology, "objects": objects}
+
+
+def add_boundary_layer(map_object, boundary, name, tolerance_m=boundary_topology.DEFAULT_TOLERANCE_M, style=None, highlight=None):
+    """
+    Adds a registry Boundary as simplified TopoJSON (shared arcs, quantized coordinates), which embeds a small
+    fraction of the GeoJSON's bytes. Returns the folium.TopoJson layer.
+    - style / highlight: Leaflet path styles for every feature, and on mouseover (optional)
+    """
+    layer = folium.TopoJson(
+        _topojson_copy(boundary.topojson(tolerance_m)),
+        "objects.boundaries",
+        name=name,
+        style_function=lambda feature: style or {},
+    ).add_to(map_object)
+    if highlight:
+        HighlightOnHover(layer, style or {}, highlight).add_to(map_object)
+    return layer
+
+
+def add_selected_boundary(map_object, config, boundary_type, tolerance_m=boundary_topology.DEFAULT_TOLERANCE_M):
     """
     Adds only the selected boundary to the map.
 
@@ -54,6 +102,7 @@ def add_selected_boundary(map_object, config, boundary_type):
     - map_object: The map object.
     - config: The city config file.
     - boundary_type: The specific boundary to display.
+    - tolerance_m: Simplification tolerance of the embedded outline (see boundary_topology.TOPOJSON_TOLERANCES_M).
     
     Returns:
     - Updated map with the selected boundary.
@@ -62,58 +111,20 @@ def add_selected_boundary(map_object, config, boundary_type):
         print("Error: No city config provided.")
         return map_object
 
-    boundary_path = getattr(config, boundary_type, None)
-
-    if not boundary_path or not os.path.exists(boundary_path):
-        print(f"Boundary file not found at {boundary_path}")
+    boundary = boundary_registry.load_boundary(config.boundary_path(boundary_type))
+    if boundary is None:
         return map_object
 
     try:
-        with open(boundary_path, "r") as f:
-            boundary_data = json.load(f)
         # Boundary styles
-        folium.GeoJson(
-            boundary_data,
-            name=f'{config.CITY_NAME} {boundary_type.replace("b_", "").replace("_", " ").title()}',
-            style_function=lambda feature: {
-                "color": "blue",
-                "weight": 2,           
-                "fillColor": "#00ffff",
-                "fillOpacity": 0.2,
-            },
-            highlight_function=lambda feature: {
-                "color": "darkblue",
-                "weight": 3,
-                "fillColor": "#008b8b",
-                "fillOpacity": 0.4,
-            }
-        ).add_to(map_object)
-        #Get the names of boundaries from the properties in the geojson.
-        extracted_features = []
-        for feature in boundary_data["features"]:
-            properties = feature.get("properties", {})
-            geometry = feature.get("geometry", {})
-            extracted_features.append({
-                "geometry": shape(geometry),
-                "properties": properties
-            })
-
-        # Convert features into a GeoDataFrame.
-        gdf = gpd.GeoDataFrame(extracted_features)
-
-        for _, row in gdf.iterrows():
-            properties = row.get("properties", {})
-
-            # Multiple possible keys for the boundary name empty string if none found.
-            boundary_name = (
-                properties.get("AreaName") or
-                properties.get("PolicyRef") or
-                properties.get("RefNo") or
-                ""
-            )
+        add_boundary_layer(
+            map_object, boundary, f'{config.city_name} {boundary_label(boundary_type)}',
+            tolerance_m=tolerance_m, style=BOUNDARY_STYLE, highlight=BOUNDARY_HIGHLIGHT,
+        )
+        # Boundary names (AreaName / PolicyRef / RefNo) at each feature's centroid, precomputed by the registry
+        for boundary_name, lat, lon in zip(boundary.labels, boundary.centroid_lats, boundary.centroid_lons):
             # Styling for boundary name for clear visibility
-            centroid = row.geometry.centroid
-            folium.Marker(location=[centroid.y, centroid.x],
+            folium.Marker(location=[lat, lon],
                 icon=folium.DivIcon(html=f"""
                     <div style="
                         font-size: 14px;
@@ -133,20 +144,53 @@ def add_selected_boundary(map_object, config, boundary_type):
 
     return map_object
 
+# -------------------------------
+# Point layers
+# -------------------------------
+def points_geojson(df, properties=None, lat_col="Latitude", lon_col="Longitude"):
+    """
+    One GeoJSON FeatureCollection for the rows of `df` (point per Latitude/Longitude).
+    - properties: {name: column values} added to every feature (e.g. colors, popup HTML).
+    Built from column arrays, so it's much cheaper than adding a folium object per row.
+    """
+    properties = properties or {}
+    lats = df[lat_col].to_numpy(dtype=float).tolist()
+    lons = df[lon_col].to_numpy(dtype=float).tolist()
+    names = list(properties)
+    columns = [list(values) for values in properties.values()]
+
+    features = [
+        {
+            "type": "Feature",
+            "id": str(i),
+            "geometry": {"type": "Point", "coordinates": [lon, lat]},
+            "properties": dict(zip(names, values)),
+        }
+        for i, (lat, lon, *values) in enumerate(zip(lats, lons, *columns))
+    ]
+    return {"type": "FeatureCollection", "features": features}
+
+
+def popup_field(name="popup", max_width=300):
+    """Popup that shows a feature's prebuilt HTML property without a field label."""
+    return folium.GeoJsonPopup(fields=[name], labels=False, max_width=max_width)
+
+
 def add_postcode_markers(map_object, df):
-    """Adds postcode markers to an existing map."""
+    """Adds postcode markers to an existing map (clustered per zoom level in Python, see marker_clustering)."""
     if df is None or df.empty:
         print("No valid postcodes to display.")
         return map_object
 
-    marker_cluster = MarkerCluster().add_to(map_object)
-
-    for _, row in df.iterrows():
-        folium.Marker(
-            location=(row["Latitude"], row["Longitude"]),
-            popup=f"<b>{row['Postcode']}</b>",
-            icon=folium.Icon(color="blue", icon="info-sign")
-        ).add_to(marker_cluster)
+    popups = ("<b>" + df["Postcode"].astype(str) + "</b>").tolist()
+    point_layer = folium.GeoJson(
+        points_geojson(df, {"popup": popups}),
+        marker=folium.Marker(icon=folium.Icon(color="blue", icon="info-sign")),
+        popup=popup_field(),
+    )
+    marker_clustering.add_clustered_points(
+        map_object, point_layer, df["Latitude"], df["Longitude"], name="Postcode Markers", color="#38aadd"
+    )
 
     return map_object
 
@@ -174,54 +218,96 @@ def get_exact_color(value, min_val, max_val, is_population):
     Returns:
     - A hex color string.
     """
-    colormap = mcolors.LinearSegmentedColormap.from_list(
-        "deprivation_gradient",
-        ["darkred", "#D73027", "#FC8D59", "yellow", "#91CF60", "#1A9850", "lightblue"]
-    )
-    
-
     if pd.isna(value) or value == 0:
         return "black"  # Black for missing or zero vals
    
     norm_score = (value - min_val) / (max_val - min_val)
 
-    return mcolors.rgb2hex(colormap(norm_score))  # Convert to hex color
+    return get_norm_color(norm_score, value)
+
 
+HEATMAP_COLORMAP = mcolors.LinearSegmentedColormap.from_list(
+    "deprivation_gradient",
+    ["darkred", "#D73027", "#FC8D59", "yellow", "#91CF60", "#1A9850", "lightblue"]
+)
 
 
+def get_norm_color(norm_score, value):
+    """Color for an already-normalised (0..1) score; black for missing or zero raw values."""
+    if pd.isna(value) or value == 0 or pd.isna(norm_score):
+        return "black"
+    return mcolors.rgb2hex(HEATMAP_COLORMAP(norm_score))  # Convert to hex color
 
-def add_dynamic_heatmap(map_object, df, column_name, label):
+
+def get_norm_colors(norm_scores, values):
+    """
+    Vectorised get_norm_color for whole columns: one colormap call for every score, then hex conversion
+    once per distinct colour (the colormap has at most 256). Returns a NumPy array of color strings.
+    """
+    norm_scores = np.asarray(norm_scores, dtype=np.float64)
+    values = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=np.float64)
+    black = np.isnan(values) | (values == 0) | np.isnan(norm_scores)
+
+    colors = np.full(len(norm_scores), "black", dtype=object)
+    if black.all():
+        return colors
+
+    rgb = np.round(HEATMAP_COLORMAP(norm_scores[~black])[:, :3] * 255).astype(np.int64)
+    packed = (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+    distinct, inverse = np.unique(packed, return_inverse=True)
+    colors[~black] = np.array([f"#{code:06x}" for code in distinct], dtype=object)[inverse]
+    return colors
+
+
+def get_metric_colors(df, column_name):
+    """
+    Colors for every row of `df` plus the (min, max) for the legend.
+    Uses the precomputed "<column> Norm" column and dataset-wide range from data_manager.add_derived_metrics
+    when present, so the scale isn't recomputed per render.
+    """
+    min_value, max_value = data_manager.get_metric_range(df, column_name)
+    norm_col = f"{column_name} Norm"
+    if norm_col in df.columns:
+        norms = df[norm_col].to_numpy()
+    else:
+        span = max_value - min_value
+        norms = ((df[column_name] - min_value) / span).to_numpy() if span else np.zeros(len(df))
+    colors = get_norm_colors(norms, df[column_name].to_numpy())
+    return colors, min_value, max_value
+
+
+
+
+def add_dynamic_heatmap(map_object, df, column_name, label, mode="Points"):
     """
     Adds a dynamic heatmap based on a selected column.
     - `map_object`: The map object.
     - `df`: The DataFrame containing postcode data.
     - `column_name`: The column used for heatmap values.
     - `label`: The label used for the legend.
+    - `mode`: "Points" (a coloured circle per postcode) or "Raster" (one smoothed image, see add_raster_heatmap).
     """
     if df is None or df.empty:
         print("Error: No valid postcode data.")
         return map_object
 
+    if mode == "Raster":
+        return add_raster_heatmap(map_object, df, column_name, label)
+
     print(f"Adding {label} heatmap...")
     
-    min_value = df[column_name].min()
-    max_value = df[column_name].max()
-
-    heatmap_layer = folium.FeatureGroup(name=label)
-
-    for _, row in df.iterrows():
-        value = float(row[column_name])
-        exact_color = get_exact_color(value, min_value, max_value, column_name == "Population")
-
-        folium.CircleMarker(
-            location=(row["Latitude"], row["Longitude"]),
-            radius=6,
-            color=exact_color,
-            fill=True,
-            fill_color=exact_color,
-            fill_opacity=0.3,
-            opacity=0.2
-        ).add_to(heatmap_layer)
+    colors, min_value, max_value = get_metric_colors(df, column_name)
+
+    # One GeoJSON layer for every point; the colour travels as a feature property
+    heatmap_layer = folium.GeoJson(
+        points_geojson(df, {"color": colors}),
+        name=label,
+        marker=folium.CircleMarker(radius=6, fill=True, fill_opacity=0.3, opacity=0.2),
+        style_function=lambda feature: {
+            "color": feature["properties"]["color"],
+            "fillColor": feature["properties"]["color"],
+        },
+    )
 
     map_object.add_child(heatmap_layer)
 
@@ -246,45 +332,63 @@ def add_dynamic_markers(map_object, df, column_name):
 
     print(f"Adding postcode markers")
 
-    min_value = df[column_name].min()
-    max_value = df[column_name].max()
+    colors, _, _ = get_metric_colors(df, column_name)
+
+    # relevant details to display in marker popups
+    popups = [
+        f"<b>{postcode}</b><br>Population: {int(population)}<br>Households: {int(households)}<br>"
+        f"Affluence Score (IMD): {imd:.2f}"
+        for postcode, population, households, imd in zip(
+            df["Postcode"], df["Population"], df["Households"], df["Index of Multiple Deprivation"]
+        )
+    ]
+
+    point_layer = folium.GeoJson(
+        points_geojson(df, {"popup": popups}),
+        marker=folium.Marker(icon=folium.Icon(color="gray", icon="info-sign")),
+        popup=popup_field(),
+    )
+    marker_clustering.add_clustered_points(
+        map_object, point_layer, df["Latitude"], df["Longitude"], name="Postcode Markers", color="#575757"
+    )
 
-    marker_cluster = MarkerCluster(name="Postcode Markers").add_to(map_object)
+    # Overlays a small color circle behind each marker so heatmaps still shows when zoomed in
+    folium.GeoJson(
+        points_geojson(df, {"color": colors}),
+        marker=folium.Circle(radius=12, fill=True, fill_opacity=0.8),
+        style_function=lambda feature: {
+            "color": feature["properties"]["color"],
+            "fillColor": feature["properties"]["color"],
+        },
+    ).add_to(map_object)
 
-    for _, row in df.iterrows():
-        value = float(row[column_name])
+    print("Postcode markers added.")
+    return map_object
 
-        # Determine if population, households, or affluences for coloring
-        is_population = column_name == "Population"
-        is_households = column_name == "Households"
-        exact_color = get_exact_color(value, min_value, max_value, is_population or is_households)
 
-        # relevant details to display in marker popups
-        popup_text = f"""
-        <b>{row['Postcode']}</b><br>
-        Population: {int(row['Population'])}<br>
-        Households: {int(row['Households'])}<br>
-        Affluence Score (IMD): {row['Index of Multiple Deprivation']:.2f}
-        """
+# Heatmap type (widget option) -> (postcode column, legend label)
+HEATMAP_METRICS = {
+    "Affluence": ("Index of Multiple Deprivation", "Affluence Score (IMD)"),
+    "Population": ("Population", "Population"),
+    "Households": ("Households", "Households"),
+}
 
-        folium.Marker(
-            location=(row["Latitude"], row["Longitude"]),
-            popup=folium.Popup(popup_text, max_width=300),
-            icon=folium.Icon(color="gray", icon="info-sign")
-        ).add_to(marker_cluster)
-
-        # Overlays a small color circle behind the marker so heatmaps still shows when zoomed in
-        folium.Circle(
-            location=(row["Latitude"], row["Longitude"]),
-            radius=12,
-            color=exact_color,
-            fill=True,
-            fill_color=exact_color,
-            fill_opacity=0.8
-        ).add_to(map_object)
 
-    print("Postcode markers added.")
-    return map_object
+def build_heatmap_map(config, df, metric, mode="Points", boundary_type=None):
+    """
+    The full heatmap view: heatmap of `metric` (a HEATMAP_METRICS key), per-postcode markers in point mode,
+    and the boundary overlay if `boundary_type` is given. `df` should already be filtered to the boundary.
+    """
+    column_name, label = HEATMAP_METRICS[metric]
+    m = generate_base_map(config)
+    m = add_dynamic_heatmap(m, df, column_name, label, mode=mode)
+    # Per-postcode markers only in point mode; raster mode stays independent of postcode count
+    if mode == "Points":
+        m = add_dynamic_markers(m, df, column_name)
+
+    if boundary_type is not None:
+        m = add_selected_boundary(m, config, boundary_type)
+    return m
 
 def add_color_legend(map_object, min_value, max_value, label="Legend"):
     """
@@ -308,6 +412,153 @@ def add_color_legend(map_object, min_value, max_value, label="Legend"):
     return map_object
 
 
+# -------------------------------
+# Raster heatmap
+# -------------------------------
+HEATMAP_MODES = ["Points", "Raster"]
+RASTER_CELL_M = 100  # grid cell size on the ground
+RASTER_SMOOTHING_M = 250  # Gaussian kernel standard deviation
+RASTER_MAX_CELLS = 800  # per side; the cell size grows for very large areas
+RASTER_OPACITY = 0.6
+
+
+def _gaussian_matrix(n, sigma_cells):
+    """(n, n) matrix that Gaussian-smooths one grid axis (truncated at 3 sigma)."""
+    offsets = np.arange(n)[:, None] - np.arange(n)[None, :]
+    weights = np.exp(-0.5 * (offsets / sigma_cells) ** 2)
+    weights[np.abs(offsets) > 3 * sigma_cells] = 0.0
+    return weights
+
+
+def raster_heatmap_grid(df, column_name, cell_m=RASTER_CELL_M, smoothing_m=RASTER_SMOOTHING_M):
+    """
+    Kernel-smoothed mean of `column_name` on a regular grid in Web Mercator (the map's projection),
+    so the image lines up with the basemap without resampling. Zero/missing values are left out, as they
+    are drawn black in the point heatmap.
+    Returns (values, density, bounds) with rows running north to south, or None if there's nothing to draw.
+    - density: smoothed point count per cell (1.0 at an isolated postcode), used for transparency
+    - bounds: [[south, west], [north, east]] for folium.raster_layers.ImageOverlay
+    """
+    values = pd.to_numeric(df[column_name], errors="coerce").to_numpy(dtype=np.float64)
+    lats = df["Latitude"].to_numpy(dtype=np.float64)
+    lons = df["Longitude"].to_numpy(dtype=np.float64)
+    keep = np.isfinite(values) & (values != 0) & np.isfinite(lats) & np.isfinite(lons)
+    if not keep.any():
+        return None
+    values, lats, lons = values[keep], lats[keep], lons[keep]
+
+    # Web Mercator scaled to ground metres at the data's mean latitude
+    scale = geodesy.METRES_PER_DEGREE * np.cos(np.radians(lats.mean()))
+    x = lons * scale
+    y = np.degrees(np.arcsinh(np.tan(np.radians(lats)))) * scale
+
+    pad = 3 * smoothing_m
+    x0, x1 = x.min() - pad, x.max() + pad
+    y0, y1 = y.min() - pad, y.max() + pad
+    cell = max(cell_m, (x1 - x0) / RASTER_MAX_CELLS, (y1 - y0) / RASTER_MAX_CELLS)
+    nx, ny = int(np.ceil((x1 - x0) / cell)), int(np.ceil((y1 - y0) / cell))
+    x1, y0 = x0 + nx * cell, y1 - ny * cell
+
+    # Bin sums and counts, then smooth both with separable Gaussian matrices (K_y @ grid @ K_x^T)
+    flat = np.clip(((y1 - y) / cell).astype(np.int64), 0, ny - 1) * nx + np.clip(((x - x0) / cell).astype(np.int64), 0, nx - 1)
+    totals = np.bincount(flat, weights=values, minlength=nx * ny).reshape(ny, nx)
+    counts = np.bincount(flat, minlength=nx * ny).reshape(ny, nx).astype(np.float64)
+    ky, kx = _gaussian_matrix(ny, smoothing_m / cell), _gaussian_matrix(nx, smoothing_m / cell)
+    totals = ky @ totals @ kx.T
+    density = ky @ counts @ kx.T
+
+    grid = np.full((ny, nx), np.nan)
+    np.divide(totals, density, out=grid, where=density > 1e-6)
+
+    def to_lat(y_m):
+        return float(np.degrees(np.arctan(np.sinh(np.radians(y_m / scale)))))
+
+    bounds = [[to_lat(y0), float(x0 / scale)], [to_lat(y1), float(x1 / scale)]]
+    return grid, density, bounds
+
+
+def add_raster_heatmap(map_object, df, column_name, label, cell_m=RASTER_CELL_M, smoothing_m=RASTER_SMOOTHING_M, opacity=RASTER_OPACITY):
+    """
+    Adds the metric as a single smoothed PNG ImageOverlay (same colours and legend as the point heatmap).
+    The browser payload depends on the grid size, not the number of postcodes.
+    """
+    if df is None or df.empty:
+        print("Error: No valid postcode data.")
+        return map_object
+
+    print(f"Adding {label} raster heatmap...")
+
+    raster = raster_heatmap_grid(df, column_name, cell_m, smoothing_m)
+    if raster is None:
+        print(f"No non-zero {label} values to draw.")
+        return map_object
+    grid, density, bounds = raster
+
+    # Same scale as the point heatmap: dataset-wide range when precomputed
+    min_value, max_value = data_manager.get_metric_range(df, column_name)
+    span = max_value - min_value
+    norms = (grid - min_value) / span if span else np.zeros_like(grid)
+
+    rgba = HEATMAP_COLORMAP(np.nan_to_num(norms))
+    # Fade out away from postcodes; cells with no data are transparent
+    rgba[..., 3] = np.where(np.isnan(grid), 0.0, opacity * np.clip(density, 0.0, 1.0))
+    image = np.round(rgba * 255).astype(np.uint8)  # uint8 so folium doesn't rescale the channels
+
+    folium.raster_layers.ImageOverlay(image=image, bounds=bounds, name=label, interactive=False).add_to(map_object)
+
+    map_object = add_color_legend(map_object, min_value, max_value, label)
+    print(f"{label} raster heatmap added.")
+    return map_object
+
+
+# -------------------------------
+# Vector tiles
+# -------------------------------
+VECTOR_TILE_POINT_STYLES = {
+    "postcodes": {"color": "#38aadd", "radius": 3},
+    "businesses": {"color": "#e67e22", "radius": 4},
+    "bus_stops": {"color": "#c0392b", "radius": 4},
+}
+VECTOR_TILE_BOUNDARY_STYLE = {"color": "blue", "weight": 2, "fill": True, "fillColor": "blue", "fillOpacity": 0.1}
+
+
+def add_vector_tile_layer(map_object, config, layers=None, name="City layers", port=vector_tiles.DEFAULT_PORT, stops=None):
+    """
+    Adds the city's layers as vector tiles served locally (see vector_tiles), so the page only loads the tiles in view.
+    The tiles are built first if they're missing or out of date; the browser must be able to reach the tile server.
+    - layers: tile layer names to draw ("postcodes", "businesses", "bus_stops" and boundary setting names); all by default
+    - stops: optional BusNet4 stops DataFrame for the "bus_stops" layer (otherwise the config's bus_data GeoJSON)
+    """
+    url = vector_tiles.serve_city_tiles(config, port=port, stops=stops)
+    if url is None:
+        print("Vector tiles unavailable; layer not added.")
+        return map_object
+
+    all_layers = list(VECTOR_TILE_POINT_STYLES) + list(config.boundaries)
+    styles = {}
+    for layer in all_layers:
+        if layers is not None and layer not in layers:
+            styles[layer] = []  # VectorGrid hides layers styled with an empty list
+        elif layer in VECTOR_TILE_POINT_STYLES:
+            point = VECTOR_TILE_POINT_STYLES[layer]
+            styles[layer] = {
+                "radius": point["radius"], "color": point["color"], "weight": 1,
+                "fill": True, "fillColor": point["color"], "fillOpacity": 0.8,
+            }
+        else:
+            styles[layer] = VECTOR_TILE_BOUNDARY_STYLE
+
+    options = {
+        "vectorTileLayerStyles": styles,
+        "maxNativeZoom": vector_tiles.MAX_ZOOM,
+        "minZoom": vector_tiles.MIN_ZOOM,
+        "interactive": True,
+    }
+    # As a JSON string: folium would camelCase dict keys, renaming layers such as "bus_stops"
+    VectorGridProtobuf(url, name, json.dumps(options)).add_to(map_object)
+    return map_object
+
+
 ##############################################################################################################################
 #region travel:
 
@@ -360,10 +611,55 @@ def add_route_legend(map_object):
 
 
 
+def add_isochrones(map_object, isochrones, label="Travel Time"):
+    """
+    Adds isochrone polygons (from routing_manager.compute_isochrones) with a legend.
+    - isochrones: GeoJSON FeatureCollection with a "minutes" property per feature, largest band first.
+    """
+    if not isochrones or not isochrones.get("features"):
+        print("No isochrones to display.")
+        return map_object
+
+    band_colors = ["#1A9850", "#FC8D59", "#D73027", "darkred"]
+    minutes = sorted(feature["properties"]["minutes"] for feature in isochrones["features"])
+    colors = {m: band_colors[min(i, len(band_colors) - 1)] for i, m in enumerate(minutes)}
+
+    for feature in isochrones["features"]:
+        color = colors[feature["properties"]["minutes"]]
+        folium.GeoJson(
+            feature,
+            name=f'{feature["properties"]["minutes"]} min',
+            style_function=lambda _, color=color: {
+                "color": color,
+                "weight": 1,
+                "fillColor": color,
+                "fillOpacity": 0.25,
+            },
+            tooltip=f'Within {feature["properties"]["minutes"]} minutes',
+        ).add_to(map_object)
+
+    legend_rows = "".join(
+        f'<i style="background:{colors[m]}; width: 20px; height: 10px; display: inline-block;"></i> {m} min<br>'
+        for m in minutes
+    )
+    legend_html = f"""
+     <div style="position: fixed;
+                bottom: 20px; left: 20px; width: 200px;
+                background-color: white; z-index:9999; font-size:14px;
+                border:2px solid grey; padding:10px;">
+        <b>{label}</b><br>
+        {legend_rows}
+     </div>
+    """
+    map_object.get_root().html.add_child(folium.Element(legend_html))
+    return map_object
+
+
 def show_closest_routes_only(config, map_object, route_df):
     """
     Displays arrows from each postcode to its closest commercial zone,
     and overlays all boundaries.
+    route_df: routes from data_manager.load_routes_csv (decoded "Route Coordinates").
     """
     #Add boundaries first
     map_object = add_boundaries(map_object, config)
@@ -371,7 +667,7 @@ def show_closest_routes_only(config, map_object, route_df):
     #Draw routes for each route
     for _, row in route_df.iterrows():
         try:
-            route_coords = eval(row["Route Coordinates"]) if isinstance(row["Route Coordinates"], str) else row["Route Coordinates"]
+            route_coords = row["Route Coordinates"]
             if not route_coords or len(route_coords) < 2:
                 continue
 
@@ -402,39 +698,49 @@ def add_red_green_closest_zone_markers(map_object, df_city_centre, df_shopping,
     Adds red/green markers based on proximity to selected area type.
     - Green: if closer to selected type
     - Red: if Closer to other type
+    Route DataFrames come from data_manager.load_routes (decode=False is enough: only the encoded
+    "Route Geometry" start point is read). Both zones are compared in one outer merge on the postcode.
     """
     if df_city_centre.empty or df_shopping.empty:
         print("Missing route data.")
         return map_object
 
-    # Determine route sets
-    city_routes = df_city_centre[df_city_centre["Mode"] == selected_mode]
-    shop_routes = df_shopping[df_shopping["Mode"] == selected_mode]
-
-    all_postcodes = set(city_routes["Start Postcode"]).union(set(shop_routes["Start Postcode"]))
-
-    for postcode in all_postcodes:
-        city_row = city_routes[city_routes["Start Postcode"] == postcode]
-        shop_row = shop_routes[shop_routes["Start Postcode"] == postcode]
-
-        city_dist = float(city_row["Distance (miles)"].values[0]) if not city_row.empty else float("inf")
-        shop_dist = float(shop_row["Distance (miles)"].values[0]) if not shop_row.empty else float("inf")
-
-        if selected_area_type == "City Centre":
-            is_closer = city_dist < shop_dist
-        else:
-            is_closer = shop_dist < city_dist
-
-        marker_color = "green" if is_closer else "red"
-        row = city_row if is_closer or city_row.empty else shop_row
-        coords = eval(row["Route Coordinates"].values[0])[0] if not row.empty else None
+    columns = ["Start Postcode", "Distance (miles)", "Route Geometry"]
+    city_routes = df_city_centre.loc[df_city_centre["Mode"] == selected_mode, columns]
+    shop_routes = df_shopping.loc[df_shopping["Mode"] == selected_mode, columns]
+    merged = city_routes.merge(shop_routes, on="Start Postcode", how="outer", suffixes=("_city", "_shop"), indicator=True)
+
+    # A postcode without a route to one zone counts as infinitely far from it (stored "No Route" stays NaN)
+    city_dist = merged["Distance (miles)_city"].astype(float).where(merged["_merge"] != "right_only", np.inf).to_numpy()
+    shop_dist = merged["Distance (miles)_shop"].astype(float).where(merged["_merge"] != "left_only", np.inf).to_numpy()
+    is_closer = city_dist < shop_dist if selected_area_type == "City Centre" else shop_dist < city_dist
+
+    # Both routes start at the postcode: use the city centre route's first point, else the shopping one's
+    starts = data_manager.route_start_points(merged["Route Geometry_city"].tolist())
+    missing = np.isnan(starts[:, 0])
+    starts[missing] = data_manager.route_start_points(merged["Route Geometry_shop"][missing].tolist())
+    has_start = ~np.isnan(starts[:, 0])
+    if not has_start.any():
+        return map_object
 
-        if coords:
-            folium.Marker(
-                location=coords,
-                icon=folium.Icon(color=marker_color),
-                popup=f"{postcode} ({selected_mode}, {city_dist:.2f} vs {shop_dist:.2f})"
-            ).add_to(map_object)
+    markers = pd.DataFrame({"Latitude": starts[has_start, 0], "Longitude": starts[has_start, 1]})
+    popups = [
+        f"{postcode} ({selected_mode}, {city:.2f} vs {shop:.2f})"
+        for postcode, city, shop in zip(merged["Start Postcode"][has_start], city_dist[has_start], shop_dist[has_start])
+    ]
+    colors = np.where(is_closer[has_start], "green", "red").tolist()
+
+    folium.GeoJson(
+        points_geojson(markers, {"popup": popups, "color": colors}),
+        name=f"Closer to {selected_area_type}",
+        marker=folium.CircleMarker(radius=7, fill=True, weight=2),
+        style_function=lambda feature: {
+            "color": feature["properties"]["color"],
+            "fillColor": feature["properties"]["color"],
+            "fillOpacity": 0.8,
+        },
+        popup=popup_field(),
+    ).add_to(map_object)
 
     return map_object
 
@@ -580,9 +886,10 @@ def get_boundary_postcodes_view(df: pd.DataFrame) -> pd.DataFrame:
     return df.loc[:, cols].copy() if cols else pd.DataFrame(columns=["Postcode","Latitude","Longitude"])
 
 def get_heatmap_view(df: pd.DataFrame, metric_col: str) -> pd.DataFrame:
-    """Exactly what the heatmap marker popups show."""
+    """Exactly what the heatmap marker popups show, plus the metric's precomputed percentile and quantile bin."""
     base = [c for c in ["Postcode", "Population", "Households"] if c in df.columns]
-    cols = base + ([metric_col] if metric_col in df.columns else [])
+    derived = [f"{metric_col} Percentile", f"{metric_col} Quantile"]
+    cols = list(dict.fromkeys(base + ([metric_col] if metric_col in df.columns else []) + [c for c in derived if c in df.columns]))
     view = df.loc[:, cols].copy() if cols else pd.DataFrame()
     if metric_col == "Index of Multiple Deprivation" and "Index of Multiple Deprivation" in view.columns:
         view = view.rename(columns={"Index of Multiple Deprivation": "Affluence Score (IMD)"})
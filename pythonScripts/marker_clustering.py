@@ -0,0 +1,157 @@
+# This file clusters map markers in Python instead of in the browser (folium's MarkerCluster ships every marker
+# and clusters them in JavaScript, which stalls on thousands of points). Points are grouped on a Web Mercator
+# pixel grid for each zoom level, and the map only holds the layer for the zoom being viewed.
+import numpy as np
+import folium
+from branca.element import MacroElement, Template
+from folium.utilities import JsCode
+
+CLUSTER_MIN_ZOOM = 8  # clusters for this level are also used when zoomed further out
+CLUSTER_MAX_ZOOM = 16  # from this zoom on, every point is drawn individually
+CLUSTER_CELL_PX = 80  # grid cell size in screen pixels (MarkerCluster's default radius)
+TILE_SIZE = 256
+
+
+def mercator_pixels(lats, lons, zoom):
+    """Web Mercator pixel coordinates (x, y) of points at `zoom`."""
+    lats = np.clip(np.asarray(lats, dtype=np.float64), -85.05112878, 85.05112878)
+    lons = np.asarray(lons, dtype=np.float64)
+    world = TILE_SIZE * 2.0 ** zoom
+    x = (lons + 180.0) / 360.0 * world
+    y = (1.0 - np.arcsinh(np.tan(np.radians(lats))) / np.pi) / 2.0 * world
+    return x, y
+
+
+class GridClusters:
+    """
+    Hierarchical grid clustering of points for zoom levels min_zoom .. max_zoom - 1.
+    Cells are `cell_px` screen pixels wide at every level, so each level's cells are exactly four cells of the
+    level below: clusters nest, and all levels come from one integer grid by halving.
+    levels[zoom] = (centroid_lats, centroid_lons, counts, cluster_of_point)
+    """
+    def __init__(self, lats, lons, min_zoom=CLUSTER_MIN_ZOOM, max_zoom=CLUSTER_MAX_ZOOM, cell_px=CLUSTER_CELL_PX):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.min_zoom = int(min_zoom)
+        self.max_zoom = int(max_zoom)
+        self.levels = {}
+
+        if len(self.lats) == 0 or self.max_zoom <= self.min_zoom:
+            return
+
+        x, y = mercator_pixels(self.lats, self.lons, self.max_zoom - 1)
+        cx = (x // cell_px).astype(np.int64)
+        cy = (y // cell_px).astype(np.int64)
+        for zoom in range(self.max_zoom - 1, self.min_zoom - 1, -1):
+            _, cluster_of_point = np.unique(cx * (1 << 32) + cy, return_inverse=True)
+            counts = np.bincount(cluster_of_point)
+            self.levels[zoom] = (
+                np.bincount(cluster_of_point, weights=self.lats) / counts,
+                np.bincount(cluster_of_point, weights=self.lons) / counts,
+                counts,
+                cluster_of_point,
+            )
+            cx, cy = cx >> 1, cy >> 1
+
+    def level(self, zoom):
+        """(centroid_lats, centroid_lons, counts) for the clusters shown at `zoom` (clamped to the clustered range)."""
+        zoom = min(max(int(zoom), self.min_zoom), self.max_zoom - 1)
+        lats, lons, counts, _ = self.levels[zoom]
+        return lats, lons, counts
+
+    def cluster_count(self):
+        return {zoom: len(level[2]) for zoom, level in sorted(self.levels.items())}
+
+    def geojson(self, zoom):
+        """FeatureCollection of the clusters at `zoom`, with "count" and a display "radius" (px) per feature."""
+        lats, lons, counts = self.level(zoom)
+        radii = np.minimum(10 + 4 * np.log2(counts), 30).round().astype(int)  # few distinct styles for folium
+        features = [
+            {
+                "type": "Feature",
+                "id": str(i),
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                "properties": {"count": count, "radius": radius},
+            }
+            for i, (lat, lon, count, radius) in enumerate(zip(lats.tolist(), lons.tolist(), counts.tolist(), radii.tolist()))
+        ]
+        return {"type": "FeatureCollection", "features": features}
+
+
+class ZoomLevels(MacroElement):
+    """Keeps only the layer for the current zoom in `group`; the others are removed until their zoom range is viewed."""
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var map = {{ this._parent.get_name() }};
+            var group = {{ this.group.get_name() }};
+            var levels = [
+                {%- for low, high, layer in this.levels %}
+                [{{ low }}, {{ high }}, {{ layer.get_name() }}],
+                {%- endfor %}
+            ];
+            function showZoomLevel() {
+                var zoom = map.getZoom();
+                levels.forEach(function(level) {
+                    var visible = zoom >= level[0] && zoom < level[1];
+                    if (visible && !group.hasLayer(level[2])) { group.addLayer(level[2]); }
+                    if (!visible && group.hasLayer(level[2])) { group.removeLayer(level[2]); }
+                });
+            }
+            map.on("zoomend", showZoomLevel);
+            showZoomLevel();
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, group, levels):
+        super().__init__()
+        self._name = "ZoomLevels"
+        self.group = group
+        self.levels = levels
+
+
+# Count label on every cluster (bound per feature: a permanent tooltip on the whole layer only shows once),
+# and clicking a cluster zooms in two levels on it
+_CLUSTER_FEATURE = JsCode("""
+    function(feature, layer) {
+        layer.bindTooltip(String(feature.properties.count), {permanent: true, direction: "center", className: "cluster-count"});
+        layer.on("click", function(e) { e.target._map.setView(e.latlng, e.target._map.getZoom() + 2); });
+    }
+""")
+
+
+def add_clustered_points(map_object, point_layer, lats, lons, group=None, name="Markers", color="#3388ff",
+                         min_zoom=CLUSTER_MIN_ZOOM, max_zoom=CLUSTER_MAX_ZOOM, cell_px=CLUSTER_CELL_PX):
+    """
+    Adds `point_layer` (e.g. a folium.GeoJson of the individual markers) with Python-side clustering:
+    one count-labelled cluster layer per zoom level below `max_zoom`, the individual points from `max_zoom` on.
+    Only the layer for the viewed zoom is on the map at any time.
+    - group: FeatureGroup to hold the layers (one named `name` is created on the map if not given)
+    Returns the group.
+    """
+    if group is None:
+        group = folium.FeatureGroup(name=name).add_to(map_object)
+
+    clusters = GridClusters(lats, lons, min_zoom, max_zoom, cell_px)
+    levels = []
+    for zoom in sorted(clusters.levels):
+        layer = folium.GeoJson(
+            clusters.geojson(zoom),
+            marker=folium.CircleMarker(fill=True, weight=2),
+            style_function=lambda feature: {
+                "radius": feature["properties"]["radius"],
+                "color": color,
+                "fillColor": color,
+                "fillOpacity": 0.6,
+            },
+            on_each_feature=_CLUSTER_FEATURE,
+            control=False,
+        ).add_to(group)
+        levels.append((0 if zoom == clusters.min_zoom else zoom, zoom + 1, layer))
+
+    point_layer.add_to(group)
+    levels.append((max_zoom if clusters.levels else 0, 99, point_layer))
+
+    ZoomLevels(group, levels).add_to(map_object)
+    return group
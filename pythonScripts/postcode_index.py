@@ -0,0 +1,127 @@
+# This file provides a lookup index over a postcode dataset, so postcode-driven widgets and routing
+# calls don't scan the whole DataFrame for every lookup.
+import bisect
+import re
+import numpy as np
+import pandas as pd
+
+_SPACES = re.compile(r"\s+")
+# UK postcode shape with spaces removed: outward code (A9, A99, AA9, AA99, A9A, AA9A) + inward code (9AA)
+_VALID = r"(?:GIR0AA|[A-Z]{1,2}[0-9][A-Z0-9]?[0-9][A-Z]{2})"
+_VALID_POSTCODE = re.compile(_VALID)
+
+
+def normalize_postcode(postcode):
+    """
+    Returns a postcode in the standard "DD3 0BN" form: upper case, single space before the 3-character inward code.
+    "dd30bn", " DD3  0BN " and "DD3 0BN" all normalize to "DD3 0BN".
+    Returns "" for empty/missing input and for anything that isn't shaped like a UK postcode (e.g. "x", "DUNDEE"),
+    so invalid input never matches a real postcode.
+    """
+    if postcode is None or (isinstance(postcode, float) and np.isnan(postcode)):
+        return ""
+    compact = _SPACES.sub("", str(postcode)).upper()
+    if not _VALID_POSTCODE.fullmatch(compact):
+        return ""
+    return f"{compact[:-3]} {compact[-3:]}"
+
+
+def normalize_postcodes(postcodes):
+    """Vectorised normalize_postcode for a Series/array of postcodes. Returns a Series of strings ("" if invalid)."""
+    compact = pd.Series(postcodes).fillna("").astype(str).str.replace(r"\s+", "", regex=True).str.upper()
+    valid = compact.str.fullmatch(_VALID)
+    return (compact.str[:-3] + " " + compact.str[-3:]).where(valid, "")
+
+
+def _compact(postcode):
+    return _SPACES.sub("", str(postcode)).upper()
+
+
+class PostcodeIndex:
+    """
+    Exact, prefix and batch lookup over postcodes and their coordinates.
+    - Exact lookups are a dict access on the normalized postcode.
+    - Prefix searches bisect a sorted list of postcodes with spaces removed, so "DD3", "dd3 0" and "DD30" all work.
+    """
+    def __init__(self, postcodes, lats, lons):
+        postcodes = normalize_postcodes(postcodes).to_numpy(dtype=object)
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+
+        # Keep the first row for duplicated postcodes (matches the old "first match" behaviour)
+        keep = ~pd.Series(postcodes).duplicated().to_numpy() & (postcodes != "")
+        self.postcodes = postcodes[keep]
+        self.lats = lats[keep]
+        self.lons = lons[keep]
+        self.positions = {code: i for i, code in enumerate(self.postcodes)}
+
+        order = np.argsort([_compact(code) for code in self.postcodes], kind="stable")
+        self._sorted_keys = [_compact(self.postcodes[i]) for i in order]
+        self._sorted_positions = order
+
+    @classmethod
+    def from_dataframe(cls, df, postcode_col="Postcode", lat_col="Latitude", lon_col="Longitude"):
+        """Builds an index from a postcode DataFrame (rows without coordinates are skipped)."""
+        df = df.dropna(subset=[lat_col, lon_col])
+        return cls(df[postcode_col].to_numpy(), df[lat_col].to_numpy(), df[lon_col].to_numpy())
+
+    def __len__(self):
+        return len(self.postcodes)
+
+    def __contains__(self, postcode):
+        return normalize_postcode(postcode) in self.positions
+
+    def lookup(self, postcode):
+        """Returns (latitude, longitude) for a postcode, or None if it isn't in the index."""
+        i = self.positions.get(normalize_postcode(postcode))
+        if i is None:
+            return None
+        return (float(self.lats[i]), float(self.lons[i]))
+
+    def lookup_many(self, postcodes):
+        """
+        Batch lookup.
+        Returns (lats, lons, found): float arrays with NaN for unknown postcodes and a boolean mask of matches.
+        """
+        keys = normalize_postcodes(postcodes)
+        positions = np.fromiter((self.positions.get(code, -1) for code in keys), dtype=np.int64, count=len(keys))
+        found = positions >= 0
+        lats = np.full(len(positions), np.nan)
+        lons = np.full(len(positions), np.nan)
+        lats[found] = self.lats[positions[found]]
+        lons[found] = self.lons[positions[found]]
+        return lats, lons, found
+
+    def prefix_search(self, prefix, limit=20):
+        """Returns up to `limit` postcodes starting with `prefix`, in sorted order (spacing and case are ignored)."""
+        key = _compact(prefix or "")
+        if not key:
+            return []
+        start = bisect.bisect_left(self._sorted_keys, key)
+        matches = []
+        for i in range(start, len(self._sorted_keys)):
+            if len(matches) >= limit or not self._sorted_keys[i].startswith(key):
+                break
+            matches.append(self.postcodes[self._sorted_positions[i]])
+        return matches
+
+    def memory_bytes(self):
+        """Rough memory footprint, for the dataset cache budget."""
+        per_code = 120  # dict entry + short str + sorted key
+        return int(self.lats.nbytes + self.lons.nbytes + self._sorted_positions.nbytes + per_code * len(self.postcodes) * 2)
+
+
+def lookup_postcode(postcode, source):
+    """
+    Returns (latitude, longitude) for `postcode` from a PostcodeIndex or a postcode DataFrame, or None if not found.
+    Passing the index is O(1); DataFrames are still accepted for callers that don't have one.
+    """
+    if isinstance(source, PostcodeIndex):
+        return source.lookup(postcode)
+
+    key = normalize_postcode(postcode)
+    match = np.flatnonzero(normalize_postcodes(source["Postcode"]).to_numpy() == key)
+    if len(match) == 0:
+        return None
+    row = match[0]
+    return (float(source["Latitude"].to_numpy()[row]), float(source["Longitude"].to_numpy()[row]))
@@ -3,9 +3,11 @@ import folium
 from shapely.geometry import Point
 from ipywidgets import widgets, VBox, Output, HBox, Label, Text
 from IPython.display import display
-import geopandas as gpd
 import os
 import itertools
+from pythonScripts import boundary_registry, map_renderer
+from pythonScripts.dataset_cache import cached_load, read_csv_columnar
+from pythonScripts.postcode_index import PostcodeIndex, normalize_postcode, normalize_postcodes
 
 def render_postcode_search_map(csv_paths, boundary_paths):
     datasets = []
@@ -17,7 +19,7 @@ def render_postcode_search_map(csv_paths, boundary_paths):
             print(f"File not found: {path}")
             continue
         try:
-            df = pd.read_csv(path)
+            df = cached_load(path, "csv", read_csv_columnar)
             df.columns = [col.lower().strip() for col in df.columns]
             lat_col = next((col for col in df.columns if 'lat' in col), None)
             lon_col = next((col for col in df.columns if 'lon' in col), None)
@@ -30,7 +32,7 @@ def render_postcode_search_map(csv_paths, boundary_paths):
                     postcode_col: 'postcode'
                 })
                 df = df.dropna(subset=['latitude', 'longitude', 'postcode'])
-                df['postcode'] = df['postcode'].astype(str).str.strip().str.upper()
+                df['postcode'] = normalize_postcodes(df['postcode']).to_numpy()
                 datasets.append({
                     'name': os.path.basename(path),
                     'df': df,
@@ -43,10 +45,21 @@ def render_postcode_search_map(csv_paths, boundary_paths):
         print("No valid postcode data found.")
         return
 
-    all_postcodes = sorted(set(code for d in datasets for code in d['df']['postcode'].dropna().unique()))
+    # Index over every dataset's postcodes; the selector only ever holds search matches + current selection
+    postcode_index = PostcodeIndex(
+        pd.concat([d['df']['postcode'] for d in datasets], ignore_index=True),
+        pd.concat([d['df']['latitude'] for d in datasets], ignore_index=True),
+        pd.concat([d['df']['longitude'] for d in datasets], ignore_index=True),
+    )
+
+    boundaries = [
+        boundary for boundary in (boundary_registry.load_boundary(b_path) for b_path in boundary_paths if os.path.exists(b_path))
+        if boundary is not None
+    ]
 
     # Widgets
-    postcode_multi = widgets.SelectMultiple(options=all_postcodes, description="Postcodes:", rows=8)
+    postcode_search = widgets.Text(description="Search:", placeholder="Type a postcode prefix (e.g., DD1)")
+    postcode_multi = widgets.SelectMultiple(options=[], description="Postcodes:", rows=8)
     postcode_manual = widgets.Text(description="+ Manual:", placeholder="Optional extra postcode")
     out = Output()
     field_selectors = {}
@@ -64,12 +77,12 @@ def render_postcode_search_map(csv_paths, boundary_paths):
         )
         field_selectors[name] = selector
 
-    controls = VBox([postcode_multi, postcode_manual] + list(field_selectors.values()) + [out])
+    controls = VBox([postcode_search, postcode_multi, postcode_manual] + list(field_selectors.values()) + [out])
 
     def render_map():
         out.clear_output()
         selected_postcodes = list(postcode_multi.value)
-        manual_code = postcode_manual.value.strip().upper()
+        manual_code = normalize_postcode(postcode_manual.value)
         if manual_code:
             selected_postcodes.append(manual_code)
 
@@ -90,15 +103,12 @@ def render_postcode_search_map(csv_paths, boundary_paths):
                 print("No data found for selected postcodes.")
             return
 
-        # Add boundaries
-        for b_path in boundary_paths:
-            if not os.path.exists(b_path):
-                continue
+        # Add boundaries (parsed once per session by the boundary registry)
+        for boundary in boundaries:
             try:
-                gdf = gpd.read_file(b_path)
-                folium.GeoJson(gdf, name=os.path.basename(b_path)).add_to(m)
+                map_renderer.add_boundary_layer(m, boundary, boundary.name)
             except Exception as e:
-                print(f"Failed to load boundary {b_path}: {e}")
+                print(f"Failed to load boundary {boundary.path}: {e}")
 
         # Add markers
         for dataset in datasets:
@@ -134,6 +144,13 @@ def render_postcode_search_map(csv_paths, boundary_paths):
     def trigger_render(change=None):
         render_map()
 
+    def update_matches(change=None):
+        selected = list(postcode_multi.value)
+        matches = postcode_index.prefix_search(postcode_search.value, limit=50)
+        postcode_multi.options = selected + [code for code in matches if code not in selected]
+        postcode_multi.value = tuple(selected)
+
+    postcode_search.observe(update_matches, names='value')
     postcode_multi.observe(trigger_render, names='value')
     postcode_manual.observe(trigger_render, names='value')
     for selector in field_selectors.values():
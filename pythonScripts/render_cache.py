@@ -0,0 +1,155 @@
+# This file keeps rendered maps for the notebook session, so a repeat view (same city, same input files, same
+# widget values) is displayed straight from the stored HTML instead of rebuilding the folium map.
+# Entries are keyed on the input files' mtime/size, so editing a dataset on disk automatically misses the cache.
+import os
+from collections import OrderedDict
+from html import escape
+
+import pandas as pd
+
+from pythonScripts.dataset_schemas import low_memory_enabled
+
+DEFAULT_MAX_ENTRIES = 32
+DEFAULT_BUDGET_MB = 128
+
+# Same wrapper folium uses to show a map in a notebook cell (branca Figure._repr_html_, default 100% / 60%)
+_NOTEBOOK_IFRAME = (
+    '<div style="width:100%;">'
+    '<div style="position:relative;width:100%;height:0;padding-bottom:60%;">'
+    '<span style="color:#565656">Make this Notebook Trusted to load map: File -> Trust Notebook</span>'
+    '<iframe srcdoc="{html}" style="position:absolute;width:100%;height:100%;left:0;top:0;'
+    'border:none !important;" allowfullscreen webkitallowfullscreen mozallowfullscreen></iframe>'
+    "</div></div>"
+)
+
+
+class RenderedMap:
+    """A map rendered to a standalone HTML document. Displays like a folium.Map and can be saved."""
+    def __init__(self, html):
+        self.html = html
+
+    def _repr_html_(self):
+        return _NOTEBOOK_IFRAME.format(html=escape(self.html))
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.html)
+
+    def memory_bytes(self):
+        return len(self.html)
+
+
+def file_versions(*paths):
+    """(path, mtime_ns, size) per input file; missing files get (path, None, None) so their later creation misses."""
+    versions = []
+    for path in paths:
+        if not path:
+            continue
+        try:
+            stat = os.stat(path)
+            versions.append((os.path.abspath(path), stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            versions.append((os.path.abspath(path), None, None))
+    return tuple(versions)
+
+
+def render_key(view, config, paths=(), **params):
+    """
+    Cache key for one rendered view.
+    - view: name of the map (e.g. "heatmap")
+    - paths: every input file the map is built from
+    - params: the widget values that shape the map (must be hashable)
+    """
+    city = config.city if config is not None else None
+    return (view, city, low_memory_enabled(), file_versions(*paths), tuple(sorted(params.items())))
+
+
+class RenderCache:
+    """Session-level LRU cache of rendered maps, bounded by entry count and memory."""
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, budget_mb=DEFAULT_BUDGET_MB):
+        self.max_entries = int(max_entries)
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.entries = OrderedDict()  # key -> RenderedMap
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, render):
+        """
+        Returns the RenderedMap for `key`, calling render() (which returns a folium.Map) only on a miss.
+        Returns None, uncached, if render() returns None.
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+
+        self.misses += 1
+        map_object = render()
+        if map_object is None:
+            return None
+
+        # An older version of the same view (input files changed) can't be hit again
+        for stale in [k for k in self.entries if k[:3] == key[:3] and k[4] == key[4]]:
+            self._remove(stale)
+
+        rendered = RenderedMap(map_object.get_root().render())
+        self.entries[key] = rendered
+        self.total_bytes += rendered.memory_bytes()
+        self._evict()
+        return rendered
+
+    def _remove(self, key):
+        self.total_bytes -= self.entries.pop(key).memory_bytes()
+
+    def _evict(self):
+        """Drops least recently used maps until within both limits (always keeps the newest)."""
+        while len(self.entries) > 1 and (len(self.entries) > self.max_entries or self.total_bytes > self.budget_bytes):
+            self._remove(next(iter(self.entries)))
+
+    def set_limits(self, max_entries=None, budget_mb=None):
+        if max_entries is not None:
+            self.max_entries = int(max_entries)
+        if budget_mb is not None:
+            self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self._evict()
+
+    def clear(self):
+        self.entries.clear()
+        self.total_bytes = 0
+
+    def report(self):
+        """One row per stored map (most recently used first)."""
+        rows = [
+            {
+                "View": view,
+                "City": city,
+                "Parameters": ", ".join(f"{name}={value}" for name, value in params),
+                "Memory (MB)": round(rendered.memory_bytes() / (1024 * 1024), 2),
+            }
+            for (view, city, _, _, params), rendered in reversed(self.entries.items())
+        ]
+        return pd.DataFrame(rows, columns=["View", "City", "Parameters", "Memory (MB)"])
+
+    def stats(self):
+        """Hit/miss counts and memory use, for checking the cache is doing its job."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "memory_mb": round(self.total_bytes / (1024 * 1024), 2),
+            "budget_mb": round(self.budget_bytes / (1024 * 1024), 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+# Shared cache for the session
+render_cache = RenderCache()
+
+
+def cached_render(key, render):
+    """Renders a map through the shared session cache (see RenderCache.get)."""
+    return render_cache.get(key, render)
@@ -0,0 +1,458 @@
+# This file holds the road network in compact array form (extracted from a parsed pyroutelib3 Router)
+# plus the one-to-all searches and contraction hierarchy used to speed up batch routing. It has no UI code.
+import heapq
+import math
+import os
+import numpy as np
+
+from pythonScripts import geodesy
+
+INDEX_FORMAT_VERSION = 1
+
+# -------------------------------
+# Network Versioning
+# -------------------------------
+def network_version(osm_file):
+    """
+    Returns a short version string for an OSM extract (size + modification time).
+    Saved indexes and routes record this so they can be detected as stale when the map changes.
+    """
+    if not osm_file or not os.path.exists(osm_file):
+        return "unknown"
+    stat = os.stat(osm_file)
+    return f"{stat.st_size}-{int(stat.st_mtime)}"
+
+# -------------------------------
+# Road Graph
+# -------------------------------
+haversine_km = geodesy.haversine_km  # same formula/radius as pyroutelib3's distHaversine
+
+
+class RoadGraph:
+    """
+    Directed road graph for one travel mode stored as CSR arrays.
+    Nodes are addressed by position (0..n-1); `node_ids` maps positions back to OSM ids.
+    Each edge has the pyroutelib3 routing cost and its physical length in km.
+    """
+    def __init__(self, node_ids, lats, lons, indptr, indices, costs, lengths):
+        self.node_ids = np.asarray(node_ids, dtype=np.int64)
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.costs = np.asarray(costs, dtype=np.float64)
+        self.lengths = np.asarray(lengths, dtype=np.float64)
+        self.index = {int(node_id): i for i, node_id in enumerate(self.node_ids)}
+        self._reverse = None
+
+    @property
+    def node_count(self):
+        return len(self.node_ids)
+
+    @classmethod
+    def from_router(cls, router):
+        """Extracts every routable edge of a pyroutelib3 Router into a RoadGraph."""
+        node_set = set(router.routing.keys())
+        for edges in router.routing.values():
+            node_set.update(edges.keys())
+        node_ids = np.array(sorted(n for n in node_set if n in router.rnodes), dtype=np.int64)
+        index = {int(node_id): i for i, node_id in enumerate(node_ids)}
+        positions = np.array([router.rnodes[int(n)] for n in node_ids], dtype=np.float64).reshape(-1, 2)
+
+        indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+        indices, costs = [], []
+        for i, node_id in enumerate(node_ids):
+            for to_node, cost in router.routing.get(int(node_id), {}).items():
+                # pyroutelib3 treats non-positive costs as non-traversable
+                if cost <= 0 or to_node not in index:
+                    continue
+                indices.append(index[to_node])
+                costs.append(cost)
+            indptr[i + 1] = len(indices)
+
+        indices = np.array(indices, dtype=np.int64)
+        sources = np.repeat(np.arange(len(node_ids)), np.diff(indptr))
+        lengths = haversine_km(positions[sources, 0], positions[sources, 1], positions[indices, 0], positions[indices, 1])
+
+        return cls(node_ids, positions[:, 0], positions[:, 1], indptr, indices, costs, lengths)
+
+    def reverse(self):
+        """Returns the graph with every edge flipped (cached), for searches towards a destination."""
+        if self._reverse is None:
+            sources = np.repeat(np.arange(self.node_count), np.diff(self.indptr))
+            order = np.argsort(self.indices, kind="stable")
+            indptr = np.zeros(self.node_count + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.indices, minlength=self.node_count), out=indptr[1:])
+            self._reverse = RoadGraph(self.node_ids, self.lats, self.lons, indptr,
+                                      sources[order], self.costs[order], self.lengths[order])
+            self._reverse._reverse = self
+        return self._reverse
+
+    def arrays(self):
+        """Arrays needed to rebuild the graph (used when saving indexes)."""
+        return {
+            "node_ids": self.node_ids, "lats": self.lats, "lons": self.lons,
+            "indptr": self.indptr, "indices": self.indices,
+            "costs": self.costs, "lengths": self.lengths,
+        }
+
+# -------------------------------
+# One-to-All Search
+# -------------------------------
+class SearchResult:
+    """
+    Output of `multi_source_search`, one entry per graph node (unreached nodes have inf/-1).
+    - cost: routing cost from the nearest source.
+    - length: length in km of that path.
+    - parent: previous node on the path back to the source.
+    - origin: position (in the `sources` list) of the source that reached the node first.
+    """
+    def __init__(self, graph, sources, cost, length, parent, origin):
+        self.graph = graph
+        self.sources = sources
+        self.cost = cost
+        self.length = length
+        self.parent = parent
+        self.origin = origin
+
+    def save(self, path, version="unknown"):
+        """Saves the search arrays to a compressed .npz file (the graph is not stored, see `load`)."""
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        np.savez_compressed(
+            path,
+            format_version=INDEX_FORMAT_VERSION,
+            version=version,
+            node_count=self.graph.node_count,
+            sources=np.asarray(self.sources, dtype=np.int64),
+            cost=self.cost, length=self.length, parent=self.parent, origin=self.origin,
+        )
+
+    @classmethod
+    def load(cls, path, graph, expected_version=None):
+        """
+        Loads a search saved by `save` onto the graph it was run on.
+        Returns None if it was saved in another format, for another network version or for a graph of another size.
+        """
+        with np.load(path) as data:
+            if int(data["format_version"]) != INDEX_FORMAT_VERSION or int(data["node_count"]) != graph.node_count:
+                return None
+            if expected_version is not None and str(data["version"]) != expected_version:
+                return None
+            return cls(graph, data["sources"].tolist(), data["cost"], data["length"], data["parent"], data["origin"])
+
+    def path_to_source(self, node):
+        """Node positions from `node` back to the source that reached it ([] if unreached)."""
+        if self.origin[node] < 0:
+            return []
+        path = [node]
+        while self.parent[path[-1]] >= 0:
+            path.append(int(self.parent[path[-1]]))
+        return path
+
+
+def multi_source_search(graph, sources, weight="lengths", max_length=math.inf):
+    """
+    Dijkstra seeded from every node in `sources` at once, so each node is labelled by its nearest source.
+    weight: "lengths" (physical km) or "costs" (pyroutelib3 routing cost).
+    max_length: stop expanding paths longer than this many km (bounded/isochrone search).
+    Run it on `graph.reverse()` to get distances *to* the sources.
+    Negative entries in `sources` (e.g. unmatched postcodes) are skipped but keep their position for `origin`.
+    """
+    n = graph.node_count
+    weights = (graph.lengths if weight == "lengths" else graph.costs).tolist()
+    lengths = graph.lengths.tolist()
+    indptr, indices = graph.indptr.tolist(), graph.indices.tolist()
+
+    cost = [math.inf] * n
+    length = [math.inf] * n
+    parent = [-1] * n
+    origin = [-1] * n
+
+    heap = []
+    for source_pos, node in enumerate(sources):
+        if node >= 0 and cost[node] > 0:
+            cost[node], length[node], origin[node] = 0.0, 0.0, source_pos
+            heap.append((0.0, node))
+    heapq.heapify(heap)
+
+    while heap:
+        d, node = heapq.heappop(heap)
+        if d > cost[node]:
+            continue
+        for k in range(indptr[node], indptr[node + 1]):
+            neighbour = indices[k]
+            new_length = length[node] + lengths[k]
+            if new_length > max_length:
+                continue
+            new_cost = d + weights[k]
+            if new_cost < cost[neighbour]:
+                cost[neighbour] = new_cost
+                length[neighbour] = new_length
+                parent[neighbour] = node
+                origin[neighbour] = origin[node]
+                heapq.heappush(heap, (new_cost, neighbour))
+
+    return SearchResult(graph, list(sources), np.array(cost), np.array(length),
+                        np.array(parent, dtype=np.int64), np.array(origin, dtype=np.int64))
+
+# -------------------------------
+# Contraction Hierarchy
+# -------------------------------
+class ContractionHierarchy:
+    """
+    Contraction hierarchy over a RoadGraph.
+    Nodes are ranked by contraction order; shortcuts record the contracted middle node (-1 for real edges)
+    so paths can be unpacked back into the original node sequence.
+    `up_*` arrays hold edges to higher-ranked nodes (forward search); `down_*` arrays hold, for each node,
+    incoming edges from higher-ranked nodes (backward search).
+    """
+    def __init__(self, graph, rank, up, down, version="unknown"):
+        self.graph = graph
+        self.rank = np.asarray(rank, dtype=np.int64)
+        self.up_indptr, self.up_indices, self.up_costs, self.up_mids = up
+        self.down_indptr, self.down_indices, self.down_costs, self.down_mids = down
+        self.version = version
+        # Plain lists are much faster than NumPy scalars inside the Python search loops
+        self._up = _csr_lists(*up)
+        self._down = _csr_lists(*down)
+
+    def save(self, path):
+        """Saves the hierarchy (and the graph it was built on) to a compressed .npz file."""
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        np.savez_compressed(
+            path,
+            format_version=INDEX_FORMAT_VERSION,
+            version=self.version,
+            rank=self.rank,
+            up_indptr=self.up_indptr, up_indices=self.up_indices, up_costs=self.up_costs, up_mids=self.up_mids,
+            down_indptr=self.down_indptr, down_indices=self.down_indices, down_costs=self.down_costs, down_mids=self.down_mids,
+            **self.graph.arrays(),
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Loads a hierarchy saved by `save`."""
+        with np.load(path) as data:
+            if int(data["format_version"]) != INDEX_FORMAT_VERSION:
+                raise ValueError(f"Route index at {path} was built with an older format, please rebuild it.")
+            graph = RoadGraph(data["node_ids"], data["lats"], data["lons"], data["indptr"],
+                              data["indices"], data["costs"], data["lengths"])
+            up = (data["up_indptr"], data["up_indices"], data["up_costs"], data["up_mids"])
+            down = (data["down_indptr"], data["down_indices"], data["down_costs"], data["down_mids"])
+            return cls(graph, data["rank"], up, down, version=str(data["version"]))
+
+    def query(self, source, target):
+        """
+        Shortest path between two node positions.
+        Returns (cost, [node positions]) or (inf, []) when the target is unreachable.
+        """
+        return self.query_many(source, [target])[0]
+
+    def query_many(self, source, targets):
+        """
+        One-to-many shortest paths: the upward search from `source` is done once and reused for every target.
+        Returns a list of (cost, [node positions]) in the same order as `targets`.
+        """
+        forward_dist, forward_parent = _upward_search(self._up, source)
+        results = []
+        for target in targets:
+            if target == source:
+                results.append((0.0, [source]))
+                continue
+
+            backward_dist, backward_parent = _upward_search(self._down, target)
+            best_cost, meeting = math.inf, -1
+            for node, cost in backward_dist.items():
+                total = forward_dist.get(node, math.inf) + cost
+                if total < best_cost:
+                    best_cost, meeting = total, node
+
+            if meeting < 0:
+                results.append((math.inf, []))
+                continue
+            results.append((best_cost, self._unpack_path(source, target, meeting, forward_parent, backward_parent)))
+        return results
+
+    def _unpack_path(self, source, target, meeting, forward_parent, backward_parent):
+        """Turns the up/down search trees into the full original node sequence."""
+        edges = []
+        node = meeting
+        while node != source:
+            previous, mid = forward_parent[node]
+            edges.append((previous, node, mid))
+            node = previous
+        edges.reverse()
+
+        node = meeting
+        while node != target:
+            following, mid = backward_parent[node]
+            edges.append((node, following, mid))
+            node = following
+
+        path = [source]
+        for start, end, mid in edges:
+            stack = [(start, end, mid)]
+            while stack:
+                a, b, m = stack.pop()
+                if m < 0:
+                    path.append(b)
+                    continue
+                stack.append((m, b, self._edge_mid(m, b)))
+                stack.append((a, m, self._edge_mid(a, m)))
+        return path
+
+    def _edge_mid(self, a, b):
+        """Middle node of the stored edge a -> b (-1 if it is an original road edge)."""
+        if self.rank[a] < self.rank[b]:
+            for to_node, _, mid in self._up[a]:
+                if to_node == b:
+                    return mid
+        else:
+            for from_node, _, mid in self._down[b]:
+                if from_node == a:
+                    return mid
+        raise KeyError(f"Edge {a} -> {b} missing from contraction hierarchy")
+
+
+def _csr_lists(indptr, indices, costs, mids):
+    """Converts CSR arrays into per-node lists of (neighbour, cost, mid) tuples."""
+    indptr = indptr.tolist()
+    neighbours = list(zip(indices.tolist(), costs.tolist(), mids.tolist()))
+    return [neighbours[indptr[i]:indptr[i + 1]] for i in range(len(indptr) - 1)]
+
+
+def _upward_search(adjacency, source):
+    """Full Dijkstra over the upward edges only. Returns (dist, parent) dicts."""
+    dist = {source: 0.0}
+    parent = {}
+    heap = [(0.0, source)]
+    while heap:
+        d, node = heapq.heappop(heap)
+        if d > dist[node]:
+            continue
+        for neighbour, cost, mid in adjacency[node]:
+            new_cost = d + cost
+            if new_cost < dist.get(neighbour, math.inf):
+                dist[neighbour] = new_cost
+                parent[neighbour] = (node, mid)
+                heapq.heappush(heap, (new_cost, neighbour))
+    return dist, parent
+
+
+def _witness_search(out_edges, source, excluded, targets, max_cost, settle_limit):
+    """Bounded local Dijkstra that ignores `excluded`; used to check whether a shortcut is needed."""
+    dist = {source: 0.0}
+    heap = [(0.0, source)]
+    remaining = set(targets)
+    settled = 0
+    while heap and remaining:
+        d, node = heapq.heappop(heap)
+        if d > dist[node]:
+            continue
+        if d > max_cost or settled >= settle_limit:
+            break
+        remaining.discard(node)
+        settled += 1
+        for neighbour, (cost, _) in out_edges[node].items():
+            if neighbour == excluded:
+                continue
+            new_cost = d + cost
+            if new_cost < dist.get(neighbour, math.inf):
+                dist[neighbour] = new_cost
+                heapq.heappush(heap, (new_cost, neighbour))
+    return dist
+
+
+def _needed_shortcuts(node, out_edges, in_edges, settle_limit):
+    """Shortcuts (u, w, cost) that contracting `node` would require."""
+    shortcuts = []
+    for u, (cost_in, _) in in_edges[node].items():
+        targets = {w: cost_in + cost_out for w, (cost_out, _) in out_edges[node].items() if w != u}
+        if not targets:
+            continue
+        dist = _witness_search(out_edges, u, node, targets, max(targets.values()), settle_limit)
+        for w, cost in targets.items():
+            if dist.get(w, math.inf) > cost:
+                shortcuts.append((u, w, cost))
+    return shortcuts
+
+
+def _to_csr(rows):
+    """Per-node lists of (neighbour, cost, mid) -> CSR arrays."""
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum([len(r) for r in rows], out=indptr[1:])
+    flat = [edge for r in rows for edge in r]
+    return (
+        indptr,
+        np.array([e[0] for e in flat], dtype=np.int64),
+        np.array([e[1] for e in flat], dtype=np.float64),
+        np.array([e[2] for e in flat], dtype=np.int64),
+    )
+
+
+def build_contraction_hierarchy(graph, version="unknown", settle_limit=60, progress=True):
+    """
+    Contracts every node of `graph` (edge-difference ordering with lazy updates) and returns a ContractionHierarchy.
+    This is a one-off preprocessing step; it can take several minutes on a city-sized extract.
+    """
+    n = graph.node_count
+    out_edges = [dict() for _ in range(n)]
+    in_edges = [dict() for _ in range(n)]
+    indptr, indices, costs = graph.indptr.tolist(), graph.indices.tolist(), graph.costs.tolist()
+    for u in range(n):
+        for k in range(indptr[u], indptr[u + 1]):
+            w, cost = indices[k], costs[k]
+            if w != u and cost < out_edges[u].get(w, (math.inf,))[0]:
+                out_edges[u][w] = (cost, -1)
+                in_edges[w][u] = (cost, -1)
+
+    contracted_neighbours = [0] * n
+
+    def priority(node, shortcuts):
+        return len(shortcuts) - len(in_edges[node]) - len(out_edges[node]) + contracted_neighbours[node]
+
+    heap = [(priority(v, _needed_shortcuts(v, out_edges, in_edges, settle_limit)), v) for v in range(n)]
+    heapq.heapify(heap)
+
+    rank = np.zeros(n, dtype=np.int64)
+    up_rows = [[] for _ in range(n)]
+    down_rows = [[] for _ in range(n)]
+    order = 0
+
+    while heap:
+        _, node = heapq.heappop(heap)
+        shortcuts = _needed_shortcuts(node, out_edges, in_edges, settle_limit)
+        current = priority(node, shortcuts)
+        if heap and current > heap[0][0]:
+            heapq.heappush(heap, (current, node))
+            continue
+
+        rank[node] = order
+        order += 1
+
+        # Remaining neighbours all get a higher rank, so every edge of `node` is an upward/downward edge
+        up_rows[node] = [(w, cost, mid) for w, (cost, mid) in out_edges[node].items()]
+        down_rows[node] = [(u, cost, mid) for u, (cost, mid) in in_edges[node].items()]
+
+        for w in out_edges[node]:
+            del in_edges[w][node]
+            contracted_neighbours[w] += 1
+        for u in in_edges[node]:
+            del out_edges[u][node]
+            contracted_neighbours[u] += 1
+        out_edges[node] = {}
+        in_edges[node] = {}
+
+        for u, w, cost in shortcuts:
+            if cost < out_edges[u].get(w, (math.inf,))[0]:
+                out_edges[u][w] = (cost, node)
+                in_edges[w][u] = (cost, node)
+
+        if progress and order % 10000 == 0:
+            print(f"Contracted {order}/{n} nodes...")
+
+    return ContractionHierarchy(graph, rank, _to_csr(up_rows), _to_csr(down_rows), version=version)
@@ -1,62 +1,238 @@
 from pyroutelib3 import Router
-import geopy.distance
+import hashlib
 import json
+import math
+import os
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import mapping
+from shapely.strtree import STRtree
+
+from pythonScripts import data_manager, geodesy, road_network
+from pythonScripts.postcode_index import lookup_postcode
+
+# -------------------------------
+# Road Node Snapping Index
+# -------------------------------
+class NodeSnapIndex:
+    """
+    Nearest-node lookup over the routable nodes of a parsed road network.
+    Replaces pyroutelib3's findNode, which scans every loaded node per call.
+    Nodes are projected onto a local equirectangular plane so that the nearest
+    node in the tree matches the nearest node by haversine at city scale.
+    """
+    def __init__(self, node_ids, lats, lons):
+        self.node_ids = np.asarray(node_ids, dtype=np.int64)
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+
+        if len(self.node_ids) == 0:
+            raise KeyError("Cannot build a snap index over an empty road network")
+
+        self.projection = geodesy.LocalProjection.around(lats, lons)
+        self.tree = STRtree(shapely.points(*self.projection.to_xy(lats, lons)))
+
+    @classmethod
+    def from_router(cls, router):
+        """
+        Builds the index from a pyroutelib3 Router, keeping only nodes with at least
+        one outgoing edge for the router's mode (i.e. nodes a route can start from).
+        """
+        node_ids = [node for node, edges in router.routing.items() if edges and node in router.rnodes]
+        positions = np.array([router.rnodes[node] for node in node_ids], dtype=np.float64).reshape(-1, 2)
+        return cls(node_ids, positions[:, 0], positions[:, 1])
+
+    def snap(self, lat, lon):
+        """Returns the id of the routable node nearest to (lat, lon)."""
+        position = self.tree.nearest(shapely.points(*self.projection.to_xy(lat, lon)))
+        return int(self.node_ids[position])
+
+    def snap_many(self, lats, lons):
+        """
+        Snaps many coordinates in one vectorised query.
+        Returns a NumPy array of node ids in the same order as the input.
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        if len(lats) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        query_idx, tree_idx = self.tree.query_nearest(shapely.points(*self.projection.to_xy(lats, lons)), all_matches=False)
+        snapped = np.empty(len(lats), dtype=np.int64)
+        snapped[query_idx] = self.node_ids[tree_idx]
+        return snapped
 
 # -------------------------------
 # Router Initialization
 # -------------------------------
-def initialize_router(mode, osm_file, file_type):
+def initialize_router(mode, osm_file, file_type, index_path=None):
     """
     Initializes and returns a router for the specified mode.
+    If `index_path` points to a contraction hierarchy built by `build_route_index` for the same OSM file,
+    routes are answered from it instead of pyroutelib3's A*.
     """
     class CustomRouter:
-        def __init__(self, mode, file_path, file_type):
+        def __init__(self, mode, file_path, file_type, index_path):
+            self.mode = mode
             self.router = Router(mode, file_path, localfileType=file_type)
+            self.snap_index = NodeSnapIndex.from_router(self.router)
+            self.network_version = road_network.network_version(file_path)
+            self.index_path = index_path
+            self.hierarchy = load_route_index(index_path, self.network_version)
+            self.destination_searches = {}
+            self._graph = None
+
+        @property
+        def graph(self):
+            """The parsed network as a RoadGraph (taken from the route index when one is loaded)."""
+            if self._graph is None:
+                self._graph = self.hierarchy.graph if self.hierarchy else road_network.RoadGraph.from_router(self.router)
+            return self._graph
 
         def route(self, start_loc, end_loc):
             """
             Finds the best route between two locations.
             Returns (status, distance, route coordinates) if successful, else (status, -1, []).
             """
-            start_node = self.router.findNode(*start_loc)
-            end_node = self.router.findNode(*end_loc)
+            return self.route_many(start_loc, [end_loc])[0]
 
-            status, route = self.router.doRoute(start_node, end_node)
+        def route_many(self, start_loc, end_locs):
+            """
+            Routes from one location to many. With a route index the search from the start is shared
+            between all destinations; otherwise each destination is routed with A*.
+            Returns a list of (status, distance, route coordinates) in the same order as `end_locs`.
+            """
+            start_node = self.snap_index.snap(*start_loc)
+            end_nodes = [self.snap_index.snap(*end_loc) for end_loc in end_locs]
+
+            if self.hierarchy is not None:
+                node_routes = self._hierarchy_routes(start_node, end_nodes)
+            else:
+                node_routes = [self.router.doRoute(start_node, end_node) for end_node in end_nodes]
+
+            results = []
+            for end_loc, (status, route) in zip(end_locs, node_routes):
+                if status != 'success' or not isinstance(route, list) or len(route) == 0:
+                    print(f"Routing failed between {start_loc} and {end_loc}")
+                    results.append((status, -1, []))
+                    continue
+
+                route_coords = [self.router.nodeLatLon(node) for node in route]
+                distance = sum(
+                    self.router.distance(route_coords[i], route_coords[i+1])
+                    for i in range(len(route_coords) - 1)
+                )
+                results.append((status, distance, route_coords))
 
-            if status != 'success' or not isinstance(route, list) or len(route) == 0:
-                print(f"Routing failed between {start_loc} and {end_loc}")
-                return status, -1, []
+            return results
 
-            route_coords = [self.router.nodeLatLon(node) for node in route]
-            distance = sum(
-                self.router.distance(route_coords[i], route_coords[i+1])
-                for i in range(len(route_coords) - 1)
-            )
+        def _hierarchy_routes(self, start_node, end_nodes):
+            """Answers node-to-node routes from the contraction hierarchy, in pyroutelib3's (status, nodes) form."""
+            index = self.hierarchy.graph.index
+            if start_node not in index or any(end_node not in index for end_node in end_nodes):
+                # Index doesn't cover these nodes, fall back to A*
+                return [self.router.doRoute(start_node, end_node) for end_node in end_nodes]
 
-            return status, distance, route_coords
+            node_ids = self.hierarchy.graph.node_ids
+            routes = []
+            for cost, path in self.hierarchy.query_many(index[start_node], [index[end_node] for end_node in end_nodes]):
+                if not path:
+                    routes.append(("no_route", []))
+                else:
+                    routes.append(("success", [int(node_ids[i]) for i in path]))
+            return routes
 
-    return CustomRouter(mode, osm_file, file_type)
+        def snap_many(self, lats, lons):
+            """Snaps arrays of latitudes/longitudes (e.g. a whole postcode column) to road nodes."""
+            return self.snap_index.snap_many(lats, lons)
+
+    return CustomRouter(mode, osm_file, file_type, index_path)
+
+# -------------------------------
+# Route Index (Contraction Hierarchies)
+# -------------------------------
+def get_route_index_path(config, mode):
+    """Where the route index for a mode lives: alongside the city's saved routes (routes/ch/<mode>.npz)."""
+    route_folder = config.route_folder
+    if not route_folder:
+        return None
+    return os.path.join(route_folder, "ch", f"{mode}.npz")
+
+
+def build_route_index(config, mode, router=None):
+    """
+    Optional preprocessing step: builds a contraction hierarchy for `mode` from `config.map_osm_gz`
+    and saves it to the city's routes folder. Pass an existing router to skip re-parsing the OSM file.
+    """
+    index_path = get_route_index_path(config, mode)
+    if index_path is None:
+        print(f"Error: No route_data_folder in config for {config.CITY_NAME}.")
+        return None
+
+    if router is None:
+        router = initialize_router(mode, config.map_osm_gz, "gz")
+
+    graph = road_network.RoadGraph.from_router(router.router)
+    print(f"Building {mode} route index over {graph.node_count} nodes...")
+    hierarchy = road_network.build_contraction_hierarchy(graph, version=road_network.network_version(config.map_osm_gz))
+    hierarchy.save(index_path)
+    print(f"Saved {mode} route index to {index_path}")
+
+    # Nearest-destination searches for the city's destination sets, so the routing view doesn't run them on a click
+    for destination_path in [config.pc_cityCentre, config.pc_shopping]:
+        destination_df = data_manager.load_csv(destination_path)
+        if destination_df is None or destination_df.empty:
+            continue
+        search = search_to_destinations(router, destination_df)
+        if search is not None:
+            search.save(get_destination_search_path(index_path, destination_df), hierarchy.version)
+    return hierarchy
+
+
+def load_route_index(index_path, expected_version=None):
+    """Loads a saved route index, ignoring it (with a message) if missing or built from a different OSM file."""
+    if not index_path or not os.path.exists(index_path):
+        return None
+
+    try:
+        hierarchy = road_network.ContractionHierarchy.load(index_path)
+    except Exception as e:
+        print(f"Error: Unable to load route index at {index_path}. Details: {e}")
+        return None
+
+    if expected_version is not None and hierarchy.version != expected_version:
+        print(f"Route index at {index_path} is out of date with the OSM file, rebuild it with build_route_index.")
+        return None
+
+    return hierarchy
 
 # -------------------------------
 # Find Nearest Destination
 # -------------------------------
-def find_nearest_destination(start_loc, destination_df):
-    """Finds the nearest destination to the selected postcode."""
+def find_nearest_destination(start_loc, destination_df, router=None):
+    """
+    Finds the nearest destination to the selected postcode.
+    With a router the nearest is by road network distance for that mode, otherwise straight-line.
+    """
     validate_coordinates(start_loc, "Start Location")
 
-    destination_list = [
-        (float(row["Latitude"]), float(row["Longitude"])) 
-        for _, row in destination_df.iterrows()
-    ]
+    if router is not None:
+        destination_row, _ = nearest_destination_by_network(router, start_loc, destination_df)
+        if destination_row is not None:
+            nearest = (float(destination_row["Latitude"]), float(destination_row["Longitude"]))
+            print(f"Nearest destination by road to {start_loc}: {nearest}")
+            return nearest
+
+    lats = destination_df["Latitude"].to_numpy(dtype=float)
+    lons = destination_df["Longitude"].to_numpy(dtype=float)
 
-    if not destination_list:
+    i, _ = geodesy.nearest(start_loc[0], start_loc[1], lats, lons)
+    if i < 0:
         print("ERROR: No valid destination data available!")
         return None
 
-    nearest = min(
-        destination_list,
-        key=lambda loc: geopy.distance.distance(start_loc, loc).km
-    )
+    nearest = (float(lats[i]), float(lons[i]))
 
     validate_coordinates(nearest, "Nearest Destination")
     print(f"Nearest destination to {start_loc}: {nearest}")
@@ -73,33 +249,121 @@ def validate_coordinates(location, name="Location"):
         raise ValueError(f"{name} coordinates must be floats/ints: {location}")
 
 # -------------------------------
-# Calculate Distances and Store Routes
+# Nearest Destination by Road (multi-source search)
 # -------------------------------
-import geopy.distance
+def _destination_key(destination_df):
+    """The destination coordinates in row order (search origins are row positions, so order matters)."""
+    return np.ascontiguousarray(destination_df[["Latitude", "Longitude"]].to_numpy(dtype=np.float64)).tobytes()
 
-def calculate_distances_and_routes(postcode, df_postcodes, destination_df, foot_router, cycle_router, car_router):
+
+def get_destination_search_path(index_path, destination_df):
+    """Saved searches live next to the route index: routes/ch/<mode>_destinations_<hash of the coordinates>.npz."""
+    if not index_path:
+        return None
+    digest = hashlib.sha1(_destination_key(destination_df)).hexdigest()[:12]
+    return f"{os.path.splitext(index_path)[0]}_destinations_{digest}.npz"
+
+
+def get_destination_search(router, destination_df):
     """
-    Calculates distances and routes for different transport modes.
+    Reverse search from every destination postcode, so the nearest destination for any number of postcodes
+    costs one search per mode. Searches are cached on the router per set of destination coordinates and
+    loaded from next to the route index when saved there (by build_route_index or an earlier call);
+    the whole-city search only runs when nothing has been saved.
     """
+    key = _destination_key(destination_df)
+    if key not in router.destination_searches:
+        path = get_destination_search_path(router.index_path, destination_df)
+        search = None
+        if path and os.path.exists(path):
+            search = road_network.SearchResult.load(path, router.graph.reverse(), router.network_version)
+        if search is None:
+            search = search_to_destinations(router, destination_df)
+            if search is not None and path:
+                search.save(path, router.network_version)
+        router.destination_searches[key] = search
+    return router.destination_searches[key]
 
-    start_row = df_postcodes[df_postcodes["Postcode"] == postcode]
-    if start_row.empty:
-        print(f" ERROR: Postcode `{postcode}` not found in dataset.")
+
+def nearest_destination_by_network(router, start_loc, destination_df):
+    """
+    Nearest destination to one location by network distance.
+    Returns (destination row, distance in km) or (None, None) if no destination is reachable.
+    """
+    search = get_destination_search(router, destination_df)
+    if search is None:
         return None, None
 
-    start_loc = (float(start_row["Latitude"].values[0]), float(start_row["Longitude"].values[0]))
+    node = router.graph.index.get(router.snap_index.snap(*start_loc), -1)
+    if node < 0 or search.origin[node] < 0:
+        return None, None
+    return destination_df.iloc[int(search.origin[node])], float(search.length[node])
+
+
+def nearest_destinations_by_network(router, df_postcodes, destination_df, include_routes=False):
+    """
+    Nearest destination by road for every postcode in one pass (a single reverse search from all destinations).
+    Returns a DataFrame with Postcode, Destination Postcode, Destination Latitude/Longitude and Distance (miles)
+    (NaN when unreachable). include_routes adds the "Route Coordinates" followed by the search.
+    """
+    search = get_destination_search(router, destination_df)
+    if search is None:
+        return None
+
+    nodes = snap_dataframe(router, df_postcodes)
+    origins = np.where(nodes >= 0, search.origin[np.maximum(nodes, 0)], -1)
+    reached = origins >= 0
+
+    matched = destination_df.iloc[np.maximum(origins, 0)]
+    result = pd.DataFrame({
+        "Postcode": df_postcodes["Postcode"].to_numpy(),
+        "Destination Postcode": np.where(reached, matched["Postcode"].to_numpy(dtype=object), None),
+        "Destination Latitude": np.where(reached, matched["Latitude"].to_numpy(dtype=float), np.nan),
+        "Destination Longitude": np.where(reached, matched["Longitude"].to_numpy(dtype=float), np.nan),
+    })
+
+    lengths = np.where(reached, search.length[np.maximum(nodes, 0)], np.nan)
+    result["Distance (miles)"] = lengths * 0.621371
+
+    if include_routes:
+        graph = router.graph
+        result["Route Coordinates"] = [
+            [(float(graph.lats[i]), float(graph.lons[i])) for i in search.path_to_source(int(node))] if ok else []
+            for node, ok in zip(nodes, reached)
+        ]
+
+    print(f"Matched {int(reached.sum())} of {len(result)} postcodes to their nearest destination by road ({router.mode}).")
+    return result
+
+# -------------------------------
+# Calculate Distances and Store Routes
+# -------------------------------
+def calculate_distances_and_routes(postcode, df_postcodes, destination_df, foot_router, cycle_router, car_router):
+    """
+    Calculates distances and routes for different transport modes.
+    The destination for each mode is the nearest one by road for that mode (straight-line if the network search fails).
+    `df_postcodes` may be a PostcodeIndex (O(1) lookup) or the postcode DataFrame.
+    Returns (distances, routes, destinations), each keyed by mode; destinations holds the chosen destination postcode.
+    """
 
-    destination_row = destination_df.loc[
-        destination_df.apply(lambda row: geopy.distance.distance(start_loc, (row["Latitude"], row["Longitude"])).km, axis=1).idxmin()
-    ]
-    destination = (float(destination_row["Latitude"]), float(destination_row["Longitude"]))
-    destination_postcode = destination_row["Postcode"]
+    start_loc = lookup_postcode(postcode, df_postcodes)
+    if start_loc is None:
+        print(f" ERROR: Postcode `{postcode}` not found in dataset.")
+        return None, None, None
 
     # Calculate Routes and Distances
     routes = {}
     distances = {}
+    destinations = {}
 
     for mode, router in zip(["Walking", "Cycling", "Driving"], [foot_router, cycle_router, car_router]):
+        destination_row, _ = nearest_destination_by_network(router, start_loc, destination_df)
+        if destination_row is None:
+            i, _ = geodesy.nearest(start_loc[0], start_loc[1], destination_df["Latitude"], destination_df["Longitude"])
+            destination_row = destination_df.iloc[i]
+        destination = (float(destination_row["Latitude"]), float(destination_row["Longitude"]))
+        destinations[mode] = destination_row.get("Postcode")
+
         status, distance, route_coords = router.route(start_loc, destination)
         distances[mode] = distance * 0.621371 if status == "success" else "No Route"
         routes[mode] = route_coords
@@ -107,5 +371,104 @@ def calculate_distances_and_routes(postcode, df_postcodes, destination_df, foot_
     # Bus Route Calculation
 
 
-    return distances, routes
+    return distances, routes, destinations
+
+# -------------------------------
+# Isochrones (travel time from every postcode to a destination group)
+# -------------------------------
+# Average travel speeds used to turn network length into minutes.
+TRAVEL_SPEEDS_KMH = {"foot": 4.8, "cycle": 16.0, "car": 30.0}
+
+
+def snap_dataframe(router, df):
+    """Snaps each Latitude/Longitude row to a node position in `router.graph` (-1 if outside the graph)."""
+    node_ids = router.snap_many(df["Latitude"].to_numpy(dtype=float), df["Longitude"].to_numpy(dtype=float))
+    index = router.graph.index
+    return np.array([index.get(int(node_id), -1) for node_id in node_ids], dtype=np.int64)
+
+
+def search_to_destinations(router, destination_df, max_minutes=None):
+    """
+    Runs one reverse search on the road network seeded from every destination postcode,
+    so each node is labelled with the network distance to its nearest destination.
+    max_minutes bounds the search at the mode's travel speed.
+    """
+    sources = snap_dataframe(router, destination_df)
+    if not (sources >= 0).any():
+        print("ERROR: No destinations could be matched to the road network.")
+        return None
+
+    max_length = math.inf
+    if max_minutes is not None:
+        max_length = TRAVEL_SPEEDS_KMH.get(router.mode, TRAVEL_SPEEDS_KMH["foot"]) * max_minutes / 60
+
+    return road_network.multi_source_search(router.graph.reverse(), sources.tolist(), max_length=max_length)
+
+
+def label_travel_times(router, df_postcodes, search, thresholds=(10, 15, 20)):
+    """
+    Adds "Travel Time (min)" (NaN when not reached) and "Isochrone (min)" (smallest threshold band that contains it)
+    to a copy of df_postcodes, using the result of `search_to_destinations`.
+    """
+    speed = TRAVEL_SPEEDS_KMH.get(router.mode, TRAVEL_SPEEDS_KMH["foot"])
+    nodes = snap_dataframe(router, df_postcodes)
+
+    lengths = np.full(len(nodes), np.inf)
+    lengths[nodes >= 0] = search.length[nodes[nodes >= 0]]
+    minutes = lengths / speed * 60
+
+    df = df_postcodes.copy()
+    df["Travel Time (min)"] = np.where(np.isfinite(minutes), minutes, np.nan)
+
+    bands = np.full(len(nodes), np.nan)
+    for limit in sorted(thresholds, reverse=True):
+        bands[minutes <= limit] = limit
+    df["Isochrone (min)"] = bands
+    return df
+
+
+def build_isochrone_polygons(router, search, thresholds=(10, 15, 20), buffer_m=75):
+    """
+    Turns a bounded search into isochrone polygons: the reached road nodes within each threshold
+    are buffered by `buffer_m` metres and merged.
+    Returns a GeoJSON FeatureCollection (largest band first) with a "minutes" property per feature.
+    """
+    speed = TRAVEL_SPEEDS_KMH.get(router.mode, TRAVEL_SPEEDS_KMH["foot"])
+    graph = search.graph
+    minutes = search.length / speed * 60
+
+    # Buffer in a local metric projection so the buffer is round on the ground
+    projection = geodesy.LocalProjection.around(graph.lats, graph.lons)
+
+    features = []
+    for limit in sorted(thresholds, reverse=True):
+        reached = minutes <= limit
+        if not reached.any():
+            continue
+        points = shapely.points(*projection.to_xy(graph.lats[reached], graph.lons[reached]))
+        area = shapely.union_all(shapely.buffer(points, buffer_m, quad_segs=4))
+        area = shapely.simplify(area, buffer_m / 5)
+        area = projection.unproject_geometry(area)
+        features.append({
+            "type": "Feature",
+            "geometry": mapping(area),
+            "properties": {"minutes": limit, "mode": router.mode},
+        })
+
+    return {"type": "FeatureCollection", "features": features}
+
+
+def compute_isochrones(router, df_postcodes, destination_df, thresholds=(10, 15, 20)):
+    """
+    One bounded search per destination group: labels every postcode with its travel time to the
+    nearest destination and builds isochrone polygons for map_renderer.add_isochrones.
+    Returns (labelled DataFrame, GeoJSON FeatureCollection) or (None, None).
+    """
+    search = search_to_destinations(router, destination_df, max_minutes=max(thresholds))
+    if search is None:
+        return None, None
 
+    df_labelled = label_travel_times(router, df_postcodes, search, thresholds)
+    isochrones = build_isochrone_polygons(router, search, thresholds)
+    print(f"{df_labelled['Isochrone (min)'].notna().sum()} of {len(df_labelled)} postcodes within {max(thresholds)} minutes ({router.mode}).")
+    return df_labelled, isochrones
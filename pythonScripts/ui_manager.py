@@ -26,10 +26,7 @@ def display_boundary_dropdown(config):
         print("Error: No city selected.")
         return None
 
-    available_boundaries = {
-        attr.replace("b_", "").replace("_", " ").title(): attr
-        for attr in dir(config) if attr.startswith("b_")
-    }
+    available_boundaries = config.boundary_labels()
 
     if not available_boundaries:
         print("No boundaries found for this city.")
@@ -85,7 +82,7 @@ def display_ui_for_heatmap(config):
     - config: The city configuration.
 
     Returns:
-    - A tuple containing the dropdown, toggle, heatmap selection, and accept button.
+    - A tuple containing the dropdown, toggle, heatmap selection, heatmap style (Points / Raster) and accept button.
     """
     boundary_dropdown = display_boundary_dropdown(config)
     toggle = display_toggle()
@@ -100,9 +97,16 @@ def display_ui_for_heatmap(config):
         description="Heatmap Type:",
     )
 
+    # Raster draws one smoothed image instead of a circle + marker per postcode (better for large areas)
+    style_selector = widgets.ToggleButtons(
+        options=["Points", "Raster"],  # map_renderer.HEATMAP_MODES
+        value="Points",
+        description="Style:",
+    )
+
     accept_button = widgets.Button(description="Apply", button_style="success")
 
-    return boundary_dropdown, toggle, heatmap_selector, accept_button
+    return boundary_dropdown, toggle, heatmap_selector, style_selector, accept_button
 
 def show_export_button(df_supplier, *, prefix: str, folder: str = "exports/map_views"):
     """
@@ -127,6 +131,28 @@ def show_export_button(df_supplier, *, prefix: str, folder: str = "exports/map_v
     btn.on_click(_on_click)
     display(widgets.HBox([btn, status]))
 
+def display_postcode_search(postcode_index, description="Postcode:", placeholder="Enter postcode (e.g., DD3 0BN)", limit=20):
+    """
+    Creates a postcode box that suggests matching postcodes as the user types.
+    Only the top `limit` prefix matches from the PostcodeIndex are sent to the browser, not the full postcode list.
+
+    Returns:
+    - A Combobox; read `.value` and normalize it / look it up via the index.
+    """
+    box = widgets.Combobox(
+        placeholder=placeholder,
+        description=description,
+        ensure_option=False,
+        layout=widgets.Layout(width="300px"),
+    )
+
+    def _on_type(change):
+        if postcode_index is not None:
+            box.options = tuple(postcode_index.prefix_search(change["new"], limit=limit))
+
+    box.observe(_on_type, names="value")
+    return box
+
 #region CCTV
 import os
 from pythonScripts import cctv_manager
@@ -345,8 +371,8 @@ def display_cctv_map_controls(df):
         if not cols:
             return pd.DataFrame(columns=["Source", "Latitude", "Longitude", "Bicycles", "People", "Vehicles", "Combined"])
 
-        stats = (d.groupby("Source")[cols].sum(numeric_only=True) if agg == "sum"
-                 else d.groupby("Source")[cols].mean(numeric_only=True))
+        stats = (d.groupby("Source", observed=True)[cols].sum(numeric_only=True) if agg == "sum"
+                 else d.groupby("Source", observed=True)[cols].mean(numeric_only=True))
 
         # Coordinates from the same date-filtered frame
         coord_map = (
@@ -587,7 +613,7 @@ def display_vehicle_controls(df):
                 (df['Date'] >= dmin) & (df['Date'] <= dmax)
             ]
 
-            grouped = filtered.groupby(['Date', 'Classification_Road_Vehicles'])['Number_of_Road_Vehicles'].sum().unstack().fillna(0)
+            grouped = filtered.groupby(['Date', 'Classification_Road_Vehicles'], observed=True)['Number_of_Road_Vehicles'].sum().unstack().fillna(0)
             grouped = grouped[selected_vehicle_types]  # preserve user order
 
             plt.figure(figsize=(14, 6))
@@ -693,7 +719,7 @@ def display_vehicle_map_controls(df):
         if not needed.issubset(dfin.columns):
             return pd.DataFrame(columns=["Source","Latitude","Longitude","Combined"])
 
-        stats = (dfin.groupby(["Source","Classification_Road_Vehicles"])["Number_of_Road_Vehicles"]
+        stats = (dfin.groupby(["Source","Classification_Road_Vehicles"], observed=True)["Number_of_Road_Vehicles"]
                      .agg(how).unstack().fillna(0))
 
         cmap = _coords_map(dfin)
@@ -0,0 +1,508 @@
+# This file turns a city's postcode, business, bus stop and boundary datasets into Mapbox vector tiles, stored in
+# one MBTiles-style SQLite file per city, and serves them from a small local HTTP server. Maps then load only the
+# tiles in view (map_renderer.add_vector_tile_layer) instead of embedding every feature in the notebook HTML.
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from pythonScripts import boundary_registry, road_network
+from pythonScripts.dataset_cache import read_csv_columnar
+from pythonScripts.marker_clustering import TILE_SIZE, mercator_pixels
+
+TILES_FILENAME = "city_tiles.mbtiles"
+TILE_EXTENT = 4096  # tile coordinate resolution (MVT default)
+TILE_BUFFER = 64  # geometry kept beyond the tile edge so lines/outlines don't show seams
+MIN_ZOOM = 8
+MAX_ZOOM = 14  # maps over-zoom these tiles past this level
+POINT_MIN_ZOOM = 12  # point layers only from this zoom, so low-zoom tiles stay small
+SIMPLIFY_UNITS = 2.0  # polygon/line simplification tolerance, in tile units
+UNITS_PER_PIXEL = TILE_EXTENT / TILE_SIZE  # tile units per Web Mercator pixel
+
+DEFAULT_PORT = 8765
+
+
+# -------------------------------
+# MVT encoding (protobuf, spec v2)
+# -------------------------------
+def _varint(n):
+    out = bytearray()
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def _zigzag(n):
+    return (n << 1) ^ (n >> 63)
+
+
+def _key(field, wire_type):
+    return _varint((field << 3) | wire_type)
+
+
+def _bytes_field(field, payload):
+    return _key(field, 2) + _varint(len(payload)) + payload
+
+
+def _packed(field, values):
+    return _bytes_field(field, b"".join(_varint(v) for v in values))
+
+
+def _value(value):
+    """Encodes a property value as an MVT Value message."""
+    if isinstance(value, (bool, np.bool_)):
+        return _key(7, 0) + _varint(int(value))
+    if isinstance(value, (int, np.integer)):
+        return _key(6, 0) + _varint(_zigzag(int(value)))
+    if isinstance(value, (float, np.floating)):
+        return _key(3, 1) + struct.pack("<d", float(value))
+    return _bytes_field(1, str(value).encode("utf-8"))
+
+
+def _command(command_id, count):
+    return (command_id & 0x7) | (count << 3)
+
+
+def _encode_points(points):
+    """MoveTo commands for integer tile points [(x, y), ...]."""
+    commands, cx, cy = [_command(1, len(points))], 0, 0
+    for x, y in points:
+        commands += [_zigzag(x - cx), _zigzag(y - cy)]
+        cx, cy = x, y
+    return commands
+
+
+def _encode_rings(rings, closed):
+    """
+    Commands for lines (closed=False) or polygon rings (closed=True) in integer tile coordinates.
+    Consecutive duplicate points are dropped; degenerate parts are skipped. Returns [] if nothing is left.
+    """
+    commands, cx, cy = [], 0, 0
+    for ring in rings:
+        ring = np.asarray(ring, dtype=np.int64)
+        if closed and len(ring) > 1 and (ring[0] == ring[-1]).all():
+            ring = ring[:-1]
+        if len(ring) > 1:
+            keep = np.ones(len(ring), dtype=bool)
+            keep[1:] = (np.diff(ring, axis=0) != 0).any(axis=1)
+            ring = ring[keep]
+        if len(ring) < (3 if closed else 2):
+            continue
+        x0, y0 = (int(v) for v in ring[0])
+        commands += [_command(1, 1), _zigzag(x0 - cx), _zigzag(y0 - cy), _command(2, len(ring) - 1)]
+        cx, cy = x0, y0
+        for x, y in ring[1:].tolist():
+            commands += [_zigzag(x - cx), _zigzag(y - cy)]
+            cx, cy = x, y
+        if closed:
+            commands.append(_command(7, 1))
+    return commands
+
+
+def _signed_area(ring):
+    x, y = ring[:, 0], ring[:, 1]
+    return float(np.sum(x * np.roll(y, -1) - np.roll(x, -1) * y)) / 2
+
+
+def _polygon_rings(polygon):
+    """Rings in MVT winding: exterior positive area (clockwise with y down), holes negative."""
+    rings = []
+    for i, ring in enumerate([polygon.exterior, *polygon.interiors]):
+        coords = np.round(shapely.get_coordinates(ring)).astype(np.int64)
+        if len(coords) < 4:
+            if i == 0:
+                return []
+            continue
+        area = _signed_area(coords)
+        if area == 0:
+            if i == 0:
+                return []
+            continue
+        if (area > 0) != (i == 0):
+            coords = coords[::-1]
+        rings.append(coords)
+    return rings
+
+
+def _encode_geometry(geometry):
+    """(MVT geometry type, commands) for a shapely geometry already in integer tile coordinates, or None."""
+    if geometry.is_empty:
+        return None
+    kind = geometry.geom_type
+    if kind in ("Point", "MultiPoint"):
+        points = np.round(shapely.get_coordinates(geometry)).astype(np.int64).tolist()
+        return 1, _encode_points(points)
+    if kind in ("LineString", "MultiLineString"):
+        parts = shapely.get_parts(geometry)
+        commands = _encode_rings([np.round(shapely.get_coordinates(p)) for p in parts], closed=False)
+        return (2, commands) if commands else None
+    if kind in ("Polygon", "MultiPolygon"):
+        rings = [ring for polygon in shapely.get_parts(geometry) for ring in _polygon_rings(polygon)]
+        commands = _encode_rings(rings, closed=True)
+        return (3, commands) if commands else None
+    if kind == "GeometryCollection":
+        # clip_by_rect can return mixed collections; keep the highest-dimension parts
+        parts = [p for p in shapely.get_parts(geometry) if not p.is_empty]
+        if not parts:
+            return None
+        top = max(shapely.get_dimensions(parts))
+        return _encode_geometry(shapely.union_all([p for p in parts if shapely.get_dimensions(p) == top]))
+    return None
+
+
+def encode_layer(name, features, extent=TILE_EXTENT):
+    """
+    Encodes one MVT layer.
+    - features: [(geometry type, commands, {property: value}), ...]
+    """
+    keys, values = {}, {}
+    body = [_key(15, 0) + _varint(2), _bytes_field(1, name.encode("utf-8"))]
+    for fid, (geom_type, commands, properties) in enumerate(features):
+        tags = []
+        for key, value in properties.items():
+            if value is None or (isinstance(value, float) and np.isnan(value)):
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            encoded = _value(value)
+            tags.append(values.setdefault(encoded, len(values)))
+        feature = _key(1, 0) + _varint(fid) + _packed(2, tags) + _key(3, 0) + _varint(geom_type) + _packed(4, commands)
+        body.append(_bytes_field(2, feature))
+    body += [_bytes_field(3, key.encode("utf-8")) for key in keys]
+    body += [_bytes_field(4, value) for value in values]
+    body.append(_key(5, 0) + _varint(extent))
+    return b"".join(body)
+
+
+def encode_tile(layers):
+    """Encodes {layer name: features} as an MVT tile (empty layers are left out)."""
+    return b"".join(_bytes_field(3, encode_layer(name, features)) for name, features in layers.items() if features)
+
+
+# -------------------------------
+# Tiling
+# -------------------------------
+def tile_points(lats, lons, properties, zoom):
+    """
+    Buckets points into the tiles of `zoom`.
+    - properties: {name: column values}
+    Returns {(x, y): [(1, commands, {property: value}), ...]}.
+    """
+    px, py = mercator_pixels(lats, lons, zoom)
+    ux = np.floor(px * UNITS_PER_PIXEL).astype(np.int64)
+    uy = np.floor(py * UNITS_PER_PIXEL).astype(np.int64)
+    tx, ty = ux // TILE_EXTENT, uy // TILE_EXTENT
+    lx, ly = ux - tx * TILE_EXTENT, uy - ty * TILE_EXTENT
+
+    names = list(properties)
+    columns = [pd.Series(values).tolist() for values in properties.values()]
+    rows = list(zip(*columns)) if columns else [()] * len(tx)
+
+    tiles = {}
+    order = np.lexsort((ty, tx))
+    for i in order.tolist():
+        feature = (1, _encode_points([(int(lx[i]), int(ly[i]))]), dict(zip(names, rows[i])))
+        tiles.setdefault((int(tx[i]), int(ty[i])), []).append(feature)
+    return tiles
+
+
+def tile_geometries(geometries, properties, zoom):
+    """
+    Clips (lon, lat) shapely geometries to the tiles of `zoom` they cover.
+    Geometries are projected to tile units, simplified by SIMPLIFY_UNITS and clipped with a TILE_BUFFER margin.
+    - properties: one {property: value} dict per geometry
+    Returns {(x, y): [(geometry type, commands, properties), ...]}.
+    """
+    def to_units(xy):
+        px, py = mercator_pixels(xy[:, 1], xy[:, 0], zoom)
+        return np.column_stack([px, py]) * UNITS_PER_PIXEL
+
+    tiles = {}
+    for geometry, props in zip(geometries, properties):
+        if geometry is None or geometry.is_empty:
+            continue
+        projected = shapely.simplify(shapely.transform(geometry, to_units), SIMPLIFY_UNITS)
+        minx, miny, maxx, maxy = projected.bounds
+        for tx in range(int(minx // TILE_EXTENT), int(maxx // TILE_EXTENT) + 1):
+            for ty in range(int(miny // TILE_EXTENT), int(maxy // TILE_EXTENT) + 1):
+                x0, y0 = tx * TILE_EXTENT, ty * TILE_EXTENT
+                clipped = shapely.clip_by_rect(
+                    projected, x0 - TILE_BUFFER, y0 - TILE_BUFFER, x0 + TILE_EXTENT + TILE_BUFFER, y0 + TILE_EXTENT + TILE_BUFFER
+                )
+                if clipped.is_empty:
+                    continue
+                encoded = _encode_geometry(shapely.transform(clipped, lambda xy: xy - [x0, y0]))
+                if encoded is not None:
+                    tiles.setdefault((tx, ty), []).append((*encoded, props))
+    return tiles
+
+
+# -------------------------------
+# City layers
+# -------------------------------
+def _postcode_layer(config):
+    path = config.postcodes_path
+    if not path or not os.path.exists(path):
+        return None
+    df = read_csv_columnar(path, ["Postcode", "Latitude", "Longitude", "Population", "Households", "Index of Multiple Deprivation"])
+    df = df.dropna(subset=["Latitude", "Longitude"])
+    properties = {"postcode": df["Postcode"].astype(str)}
+    for col, name in [("Population", "population"), ("Households", "households"), ("Index of Multiple Deprivation", "imd")]:
+        if col in df.columns:
+            properties[name] = pd.to_numeric(df[col], errors="coerce").astype(object).where(df[col].notna(), None)
+    return df["Latitude"].to_numpy(), df["Longitude"].to_numpy(), properties
+
+
+def _business_layer(config):
+    path = config.get("business_data_path")
+    if not path or not os.path.exists(path):
+        return None
+    df = read_csv_columnar(path)
+    lat_col = next((col for col in ("lattitude", "latitude", "Latitude") if col in df.columns), None)
+    lon_col = next((col for col in ("longitude", "Longitude") if col in df.columns), None)
+    if lat_col is None or lon_col is None:
+        return None
+    df = df.assign(**{lat_col: pd.to_numeric(df[lat_col], errors="coerce"), lon_col: pd.to_numeric(df[lon_col], errors="coerce")})
+    df = df.dropna(subset=[lat_col, lon_col])
+    properties = {
+        "name": df["name"].fillna("").astype(str) if "name" in df.columns else [""] * len(df),
+        "category": df["category"].fillna("").astype(str) if "category" in df.columns else [""] * len(df),
+    }
+    return df[lat_col].to_numpy(), df[lon_col].to_numpy(), properties
+
+
+def _bus_stop_layer(config, stops=None):
+    """From a stops DataFrame (BusNet4 gStops: stop_lat/stop_lon/stop_name) if given, else the config's bus_data GeoJSON."""
+    if stops is not None and len(stops):
+        names = stops["stop_name"].fillna("").astype(str) if "stop_name" in stops.columns else [""] * len(stops)
+        return stops["stop_lat"].to_numpy(dtype=float), stops["stop_lon"].to_numpy(dtype=float), {"name": names}
+
+    path = config.get("bus_data")
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        features = [f_ for f_ in json.load(f).get("features", []) if (f_.get("geometry") or {}).get("type") == "Point"]
+    if not features:
+        return None
+    coords = np.array([f_["geometry"]["coordinates"][:2] for f_ in features], dtype=float)
+    names = [str((f_.get("properties") or {}).get("name", "")) for f_ in features]
+    return coords[:, 1], coords[:, 0], {"name": names}
+
+
+def get_tiles_path(config):
+    """Tiles live in the city's data folder (next to config.py)."""
+    folder = os.path.dirname(config.source_path) if config.source_path else os.path.dirname(config.postcodes_path)
+    return os.path.join(folder, TILES_FILENAME)
+
+
+def _stops_fingerprint(stops):
+    """Content hash of a BusNet4 stops frame (positions and names)."""
+    digest = hashlib.sha1(stops["stop_lat"].to_numpy(dtype=float).tobytes() + stops["stop_lon"].to_numpy(dtype=float).tobytes())
+    if "stop_name" in stops.columns:
+        digest.update("\n".join(stops["stop_name"].fillna("").astype(str)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _tile_sources(config, stops=None):
+    """
+    {path: "size-mtime"} for every input file, plus {"stops": fingerprint} when built from a BusNet4 stops frame;
+    the tiles are rebuilt if any change.
+    """
+    paths = [config.postcodes_path, config.get("business_data_path"), config.get("bus_data"), *config.boundaries.values()]
+    sources = {path: road_network.network_version(path) for path in sorted({p for p in paths if p and os.path.exists(p)})}
+    if stops is not None and len(stops):
+        sources["stops"] = _stops_fingerprint(stops)
+    return sources
+
+
+def build_city_tiles(config, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, stops=None):
+    """
+    Builds the city's vector tiles and writes them to get_tiles_path(config).
+    Layers: "postcodes", "businesses", "bus_stops" (from POINT_MIN_ZOOM) and one layer per boundary setting.
+    - stops: optional BusNet4 stops DataFrame (otherwise the config's bus_data GeoJSON is used)
+    Returns the path, or None if nothing could be tiled.
+    """
+    point_layers = {
+        name: layer for name, layer in [
+            ("postcodes", _postcode_layer(config)),
+            ("businesses", _business_layer(config)),
+            ("bus_stops", _bus_stop_layer(config, stops)),
+        ] if layer is not None
+    }
+    boundaries = boundary_registry.city_boundaries(config)
+    if not point_layers and not boundaries:
+        print(f"No data to tile for {config.city_name}.")
+        return None
+
+    tiles = {}  # (z, x, y) -> {layer: features}
+    for zoom in range(min_zoom, max_zoom + 1):
+        for name, boundary in boundaries.items():
+            properties = [{"name": label, "id": fid} for label, fid in zip(boundary.labels, boundary.feature_ids)]
+            for (x, y), features in tile_geometries(boundary.geometries, properties, zoom).items():
+                tiles.setdefault((zoom, x, y), {})[name] = features
+        if zoom < POINT_MIN_ZOOM:
+            continue
+        for name, (lats, lons, properties) in point_layers.items():
+            for (x, y), features in tile_points(lats, lons, properties, zoom).items():
+                tiles.setdefault((zoom, x, y), {})[name] = features
+
+    path = get_tiles_path(config)
+    layer_names = list(point_layers) + list(boundaries)
+    _write_mbtiles(path, tiles, {
+        "name": f"{config.city_name} city layers",
+        "format": "pbf",
+        "minzoom": str(min_zoom),
+        "maxzoom": str(max_zoom),
+        "center": f"{config.centre[1]},{config.centre[0]},{max(min_zoom, 12)}",
+        "json": json.dumps({"vector_layers": [{"id": name} for name in layer_names]}),
+        "sources": json.dumps(_tile_sources(config, stops)),
+    })
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+    print(f"Saved {len(tiles)} vector tiles ({size_mb:.1f} MB, zoom {min_zoom}-{max_zoom}) for {config.city_name} to {path}")
+    return path
+
+
+def _write_mbtiles(path, tiles, metadata):
+    """Writes tiles to a fresh MBTiles file (gzip'd pbf, TMS row numbering as the spec requires)."""
+    tmp = f"{path}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.execute("CREATE TABLE metadata (name TEXT, value TEXT)")
+        conn.execute("CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)")
+        conn.execute("CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)")
+        conn.executemany("INSERT INTO metadata VALUES (?, ?)", list(metadata.items()))
+        conn.executemany(
+            "INSERT INTO tiles VALUES (?, ?, ?, ?)",
+            (
+                (z, x, (1 << z) - 1 - y, sqlite3.Binary(gzip.compress(encode_tile(layers), 6)))
+                for (z, x, y), layers in sorted(tiles.items())
+            ),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp, path)
+
+
+def tiles_are_current(config, stops=None):
+    """True if the city's tiles exist and were built from the current input files (and the same `stops`, if given)."""
+    path = get_tiles_path(config)
+    if not os.path.exists(path):
+        return False
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            row = conn.execute("SELECT value FROM metadata WHERE name = 'sources'").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+    return row is not None and json.loads(row[0]) == _tile_sources(config, stops)
+
+
+def ensure_city_tiles(config, stops=None):
+    """Returns the city's tile path, building the tiles first if they're missing or out of date."""
+    if tiles_are_current(config, stops):
+        return get_tiles_path(config)
+    return build_city_tiles(config, stops=stops)
+
+
+def read_tile(path, z, x, y):
+    """gzip'd pbf bytes for XYZ tile (z, x, y), or None."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        row = conn.execute(
+            "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (z, x, (1 << z) - 1 - y),
+        ).fetchone()
+    finally:
+        conn.close()
+    return bytes(row[0]) if row else None
+
+
+# -------------------------------
+# Local tile server
+# -------------------------------
+_tilesets = {}  # city -> mbtiles path
+_server = None
+
+
+class _TileHandler(BaseHTTPRequestHandler):
+    """Serves /<city>/<z>/<x>/<y>.pbf from the registered MBTiles files."""
+    def do_GET(self):
+        parts = self.path.split("?")[0].strip("/").split("/")
+        try:
+            city, z, x, y = parts[0], int(parts[1]), int(parts[2]), int(parts[3].split(".")[0])
+        except (IndexError, ValueError):
+            self.send_error(404)
+            return
+
+        path = _tilesets.get(city)
+        tile = read_tile(path, z, x, y) if path else None
+        if tile is None:
+            self.send_response(204)  # empty tile
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-protobuf")
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(tile)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Cache-Control", "max-age=3600")
+        self.end_headers()
+        self.wfile.write(tile)
+
+    def log_message(self, format, *args):
+        pass  # keep the notebook output clean
+
+
+def start_tile_server(port=DEFAULT_PORT, host="127.0.0.1"):
+    """Starts the local tile server in a background thread (once per session). Returns the server."""
+    global _server
+    if _server is not None:
+        return _server
+    try:
+        _server = ThreadingHTTPServer((host, port), _TileHandler)
+    except OSError as e:
+        print(f"Could not start tile server on port {port}: {e}")
+        return None
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
+    print(f"Tile server running at http://{host}:{port}/")
+    return _server
+
+
+def stop_tile_server():
+    global _server
+    if _server is not None:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
+
+
+def serve_city_tiles(config, port=DEFAULT_PORT, stops=None):
+    """
+    Makes sure the city's tiles are built and being served.
+    Returns the XYZ URL template for map layers, or None if the tiles or server aren't available.
+    """
+    path = ensure_city_tiles(config, stops=stops)
+    if path is None:
+        return None
+    server = start_tile_server(port)
+    if server is None:
+        return None
+    _tilesets[config.city] = path
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/{config.city}/{{z}}/{{x}}/{{y}}.pbf"
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the notebook's modules as the notebook does: `from pythonScripts import ...` from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pythonScripts.postcode_index import PostcodeIndex, lookup_postcode, normalize_postcode, normalize_postcodes
+
+POSTCODES = ["DD1 1AA", "DD1 4HN", "DD2 1AB", "DD3 0BN", "DD3 0BP", "DD30 1AA", "DD4 7QU", "DD5 9ZZ"]
+
+
+@pytest.fixture
+def index():
+    lats = np.linspace(56.40, 56.50, len(POSTCODES))
+    lons = np.linspace(-3.05, -2.85, len(POSTCODES))
+    return PostcodeIndex(POSTCODES, lats, lons)
+
+
+@pytest.mark.parametrize("value", ["DD3 0BN", "dd30bn", " DD3  0BN ", "dd3 0bn", "Dd3\t0Bn"])
+def test_normalize_spacing_and_case(value):
+    assert normalize_postcode(value) == "DD3 0BN"
+
+
+@pytest.mark.parametrize("value", ["W1A0AX", "m11ae", "EC1A 1BB", "GIR 0AA"])
+def test_normalize_other_shapes(value):
+    assert normalize_postcode(value).replace(" ", "") == value.replace(" ", "").upper()
+
+
+@pytest.mark.parametrize("value", [None, np.nan, "", "   ", "x", "DUNDEE", "DD3", "DD3 0B", "12345", "DD3 0BNN"])
+def test_normalize_invalid(value):
+    assert normalize_postcode(value) == ""
+
+
+def test_normalize_postcodes_matches_scalar():
+    values = ["dd30bn", " DD1  1AA", None, "DUNDEE", "w1a0ax"]
+    assert normalize_postcodes(values).tolist() == [normalize_postcode(value) for value in values]
+
+
+def test_lookup(index):
+    assert len(index) == len(POSTCODES)
+    assert index.lookup("dd3 0bn") == index.lookup("DD30BN")
+    assert index.lookup("DD9 9ZZ") is None
+    assert index.lookup("DUNDEE") is None
+    assert "dd1 4hn" in index
+    assert "" not in index
+
+
+def test_invalid_rows_are_skipped():
+    index = PostcodeIndex(["DD1 1AA", "DUNDEE", None, "dd1 1aa"], [1.0, 2.0, 3.0, 4.0], [1.0, 2.0, 3.0, 4.0])
+    assert len(index) == 1
+    assert index.lookup("DD1 1AA") == (1.0, 1.0)
+
+
+def test_lookup_many(index):
+    lats, lons, found = index.lookup_many(["dd11aa", "nope", "DD5 9ZZ"])
+    assert found.tolist() == [True, False, True]
+    assert np.isnan(lats[1]) and np.isnan(lons[1])
+    assert (lats[0], lons[0]) == index.lookup("DD1 1AA")
+
+
+def test_prefix_search_boundaries(index):
+    # First and last sorted keys
+    assert index.prefix_search("DD1 1") == ["DD1 1AA"]
+    assert index.prefix_search("dd59zz") == ["DD5 9ZZ"]
+    # Before the first and after the last key
+    assert index.prefix_search("AB") == []
+    assert index.prefix_search("DD6") == []
+    assert index.prefix_search("ZZ") == []
+    # "DD3" also matches "DD30" when spaces are ignored; order is by the compact key ("DD301AA" < "DD30BN")
+    assert index.prefix_search("DD3") == ["DD30 1AA", "DD3 0BN", "DD3 0BP"]
+    assert index.prefix_search("dd3 0b") == ["DD3 0BN", "DD3 0BP"]
+    assert index.prefix_search("DD", limit=3) == ["DD1 1AA", "DD1 4HN", "DD2 1AB"]
+    assert index.prefix_search("") == []
+    assert index.prefix_search(None) == []
+
+
+def test_lookup_postcode_accepts_dataframe(index):
+    df = pd.DataFrame({"Postcode": POSTCODES, "Latitude": index.lats, "Longitude": index.lons})
+    assert lookup_postcode("dd3 0bn", df) == index.lookup("DD3 0BN")
+    assert lookup_postcode("dd3 0bn", index) == index.lookup("DD3 0BN")
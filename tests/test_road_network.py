@@ -0,0 +1,87 @@
+import heapq
+import math
+
+import numpy as np
+import pytest
+
+from pythonScripts import road_network
+
+
+def random_graph(n=120, edges_per_node=3, seed=0):
+    """Random directed graph with positive costs; lengths are the costs scaled, so the two weights differ."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for u in range(n):
+        targets = rng.choice(n, size=edges_per_node, replace=False)
+        rows.append(sorted((int(w), float(rng.uniform(1, 10))) for w in targets if w != u))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum([len(row) for row in rows], out=indptr[1:])
+    indices = np.array([w for row in rows for w, _ in row], dtype=np.int64)
+    costs = np.array([c for row in rows for _, c in row])
+    lats = 56.45 + rng.random(n) * 0.05
+    lons = -3.0 + rng.random(n) * 0.05
+    return road_network.RoadGraph(np.arange(1000, 1000 + n), lats, lons, indptr, indices, costs, costs / 7)
+
+
+def dijkstra(graph, source, weights):
+    dist = [math.inf] * graph.node_count
+    dist[source] = 0.0
+    heap = [(0.0, source)]
+    while heap:
+        d, node = heapq.heappop(heap)
+        if d > dist[node]:
+            continue
+        for k in range(graph.indptr[node], graph.indptr[node + 1]):
+            neighbour, new_cost = int(graph.indices[k]), d + weights[k]
+            if new_cost < dist[neighbour]:
+                dist[neighbour] = new_cost
+                heapq.heappush(heap, (new_cost, neighbour))
+    return dist
+
+
+def path_cost(graph, path):
+    """Cost of a node path using the cheapest edge between each pair (raises if an edge is missing)."""
+    total = 0.0
+    for a, b in zip(path[:-1], path[1:]):
+        edges = range(graph.indptr[a], graph.indptr[a + 1])
+        total += min(graph.costs[k] for k in edges if graph.indices[k] == b)
+    return total
+
+
+@pytest.fixture(scope="module")
+def graph():
+    return random_graph()
+
+
+@pytest.fixture(scope="module")
+def hierarchy(graph):
+    return road_network.build_contraction_hierarchy(graph, version="test", progress=False)
+
+
+def test_query_many_matches_dijkstra(graph, hierarchy):
+    targets = list(range(graph.node_count))
+    for source in [0, 7, 42, 99]:
+        expected = dijkstra(graph, source, graph.costs)
+        for target, (cost, path) in zip(targets, hierarchy.query_many(source, targets)):
+            if math.isinf(expected[target]):
+                assert math.isinf(cost) and path == []
+                continue
+            assert cost == pytest.approx(expected[target])
+            assert path[0] == source and path[-1] == target
+            assert path_cost(graph, path) == pytest.approx(expected[target])
+
+
+def test_save_load_round_trip(graph, hierarchy, tmp_path):
+    path = tmp_path / "ch" / "foot.npz"
+    hierarchy.save(str(path))
+    loaded = road_network.ContractionHierarchy.load(str(path))
+
+    assert loaded.version == "test"
+    np.testing.assert_array_equal(loaded.rank, hierarchy.rank)
+    for name, values in graph.arrays().items():
+        np.testing.assert_array_equal(loaded.graph.arrays()[name], values)
+
+    targets = list(range(0, graph.node_count, 5))
+    for (cost, path), (loaded_cost, loaded_path) in zip(hierarchy.query_many(3, targets), loaded.query_many(3, targets)):
+        assert loaded_cost == cost
+        assert loaded_path == path
@@ -0,0 +1,72 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from pythonScripts import data_manager
+
+ROUTE = [(56.4620, -2.9707), (56.4625, -2.9712), (56.4631, -2.9720), (56.4640, -2.9731), (56.4652, -2.9735)]
+
+
+def test_encode_decode_round_trip():
+    encoded = data_manager.encode_route(ROUTE, tolerance_m=0)
+    decoded = data_manager.decode_routes([encoded])[0]
+    np.testing.assert_allclose(decoded, np.array(ROUTE), rtol=0, atol=1e-6)
+    assert np.allclose(data_manager.decode_route(encoded), ROUTE, rtol=0, atol=1e-6)
+
+
+def test_simplified_route_keeps_ends():
+    decoded = data_manager.decode_routes([data_manager.encode_route(ROUTE)])[0]
+    np.testing.assert_allclose(decoded[[0, -1]], np.array(ROUTE)[[0, -1]], rtol=0, atol=1e-6)
+
+
+def test_decode_many_routes_at_once():
+    routes = [ROUTE, ROUTE[:2], ROUTE[::-1]]
+    decoded = data_manager.decode_routes([data_manager.encode_route(route, tolerance_m=0) for route in routes])
+    assert len(decoded) == len(routes)
+    for route, coords in zip(routes, decoded):
+        np.testing.assert_allclose(coords, np.array(route), rtol=0, atol=1e-6)
+
+
+def test_empty_routes():
+    assert data_manager.encode_route([]) == ""
+    decoded = data_manager.decode_routes(["", data_manager.encode_route(ROUTE, tolerance_m=0), np.nan])
+    assert decoded[0].shape == (0, 2)
+    assert len(decoded[1]) == len(ROUTE)
+    assert decoded[2].shape == (0, 2)
+    assert data_manager.decode_routes([]) == []
+    assert data_manager.decode_route("") == []
+
+
+def write_legacy_csv(path):
+    pd.DataFrame({
+        "Start Postcode": ["DD1 1AA", "DD2 2BB"],
+        "Mode": ["foot", "foot"],
+        "Distance (miles)": [0.4, 0.0],
+        "Route Coordinates": [json.dumps([list(point) for point in ROUTE]), "[]"],
+    }).to_csv(path, index=False)
+
+
+def test_load_legacy_csv(tmp_path):
+    path = tmp_path / "legacy_routes.csv"
+    write_legacy_csv(path)
+    df = data_manager.load_routes_csv(path)
+    assert [tuple(point) for point in df["Route Coordinates"][0]] == ROUTE
+    assert df["Route Coordinates"][1] == []
+
+
+def test_migrate_legacy_csv(tmp_path):
+    path = tmp_path / "legacy_routes.csv"
+    write_legacy_csv(path)
+    data_manager.migrate_route_csv(path, tolerance_m=0)
+
+    migrated = pd.read_csv(path)
+    assert list(migrated.columns) == data_manager.ROUTE_FIELDNAMES
+    df = data_manager.load_routes_csv(path)
+    np.testing.assert_allclose(df["Route Coordinates"][0], np.array(ROUTE), rtol=0, atol=1e-6)
+    assert df["Route Coordinates"][1] == []
+
+    # Already migrated: running again leaves the file alone
+    before = path.read_text()
+    data_manager.migrate_route_csv(path, tolerance_m=0)
+    assert path.read_text() == before